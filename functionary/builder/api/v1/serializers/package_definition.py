@@ -1,6 +1,8 @@
 """ Serializers for defining a package """
 from rest_framework import serializers
 
+from core.models import Environment
+
 LANGUAGES = [("python", "Python"), ("javascript", "JavaScript")]
 PARAMETER_TYPES = [
     ("integer", "Integer"),
@@ -52,6 +54,7 @@ class FunctionSerializer(serializers.Serializer):
     )
     parameters = ParameterSerializer(many=True)
     return_type = serializers.ChoiceField(choices=RETURN_TYPES, required=False)
+    timeout = serializers.IntegerField(min_value=1, required=False)
 
 
 class PackageDefinitionSerializer(serializers.Serializer):
@@ -62,6 +65,10 @@ class PackageDefinitionSerializer(serializers.Serializer):
     summary = serializers.CharField(max_length=128, required=False)
     description = serializers.CharField(required=False)
     language = serializers.ChoiceField(choices=LANGUAGES, required=False)
+    runner_label = serializers.RegexField(r"^[\w-]+$", max_length=64, required=False)
+    executor = serializers.ChoiceField(
+        choices=Environment.EXECUTOR_CHOICES, required=False
+    )
     filename = serializers.CharField(required=False)
     environment = serializers.DictField(child=serializers.CharField(), required=False)
     functions = FunctionSerializer(many=True)
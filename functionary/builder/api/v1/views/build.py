@@ -1,4 +1,5 @@
 from builder.models import Build
+from core.api.pagination import CreatedAtCursorPagination
 from core.api.permissions import HasEnvironmentPermissionForAction
 from core.api.viewsets import EnvironmentReadOnlyModelViewSet
 
@@ -12,3 +13,4 @@ class BuildViewSet(EnvironmentReadOnlyModelViewSet):
     serializer_class = BuildSerializer
     permission_classes = [HasEnvironmentPermissionForAction]
     permissioned_model = "Package"
+    pagination_class = CreatedAtCursorPagination
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("builder", "0002_buildlog"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(
+                fields=["environment", "created_at"],
+                name="build_environment_created_at",
+            ),
+        ),
+    ]
@@ -51,6 +51,10 @@ class Build(ModelSaveHookMixin, models.Model):
             models.Index(
                 fields=["status", "updated_at"], name="build_status_updated_at"
             ),
+            models.Index(
+                fields=["environment", "created_at"],
+                name="build_environment_created_at",
+            ),
         ]
 
     def __str__(self):
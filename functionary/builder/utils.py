@@ -18,6 +18,8 @@ from docker.errors import APIError, BuildError, DockerException
 from pydantic import Field, Json, create_model
 
 from core.models import Environment, Function, Package, User
+from core.utils.artifacts import get_artifact_store
+from core.utils.messaging import broadcast_image
 
 from .celery import app
 from .exceptions import InvalidPackage
@@ -226,11 +228,15 @@ def build_package(build_id: UUID):
             for func in db_functions:
                 func.save()
             package.image_name = image_name
+            package.source_digest = _store_package_contents(package_contents)
             package.save()
 
         BuildLog.objects.create(build=build, log=build_log)
         build.save()
 
+    if build.status == Build.COMPLETE:
+        broadcast_image(package)
+
     logger.debug(f"Cleaning up remnants of build {build_id}")
     shutil.rmtree(workdir)
 
@@ -251,6 +257,18 @@ def _extract_package_contents(package_contents: bytes, workdir: str) -> None:
     package_contents_io.close()
 
 
+def _store_package_contents(package_contents: bytes) -> str:
+    """Store the package tarball in the artifact store, for executors that run the
+    package outside of its image
+
+    Returns:
+        The digest of the stored tarball
+    """
+    digest, _ = get_artifact_store().put(io.BytesIO(package_contents))
+
+    return digest
+
+
 def _load_dockerfile_template(dockerfile_template: str, workdir: str) -> None:
     """Render the dockfile template and write it to the working directory"""
     template = get_template(dockerfile_template)
@@ -280,6 +298,8 @@ def _create_package_from_definition(
     package_obj.summary = package_definition.get("summary")
     package_obj.description = package_definition.get("description")
     package_obj.language = package_definition.get("language")
+    package_obj.runner_label = package_definition.get("runner_label")
+    package_obj.executor = package_definition.get("executor")
     package_obj.save()
 
     return package_obj
@@ -300,6 +320,7 @@ def _create_functions_from_definition(definitions, package: Package):
         function_obj.return_type = function_def.get("return_type")
         function_obj.description = function_def.get("description")
         function_obj.variables = function_def.get("variables", [])
+        function_obj.timeout = function_def.get("timeout")
         function_obj.schema = _generate_function_schema(
             name, function_def.get("parameters")
         )
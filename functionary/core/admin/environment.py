@@ -29,7 +29,7 @@ class EnvironmentForm(forms.ModelForm):
 
     class Meta:
         model = Environment
-        fields = ["name"]
+        fields = ["name", "executor"]
 
     def __init__(self, *args, **kwargs):
         super(EnvironmentForm, self).__init__(*args, **kwargs)
@@ -39,9 +39,9 @@ class EnvironmentForm(forms.ModelForm):
 
 class EnvironmentAdmin(admin.ModelAdmin):
     form = EnvironmentForm
-    fields = ["name", "team"]
+    fields = ["name", "team", "executor"]
     ordering = ["name", "team"]
-    list_display = ("name", "team")
+    list_display = ("name", "team", "executor")
     inlines = (UserRoleInline,)
 
     def get_readonly_fields(self, request, obj=None):
@@ -0,0 +1,28 @@
+from django.contrib import admin
+
+
+class RunnerAdmin(admin.ModelAdmin):
+    """Read only view of the registered runners, which are managed by the runners
+    themselves through their heartbeats"""
+
+    ordering = ["name"]
+    list_display = ("name", "concurrency", "free_slots", "last_heartbeat", "alive")
+    readonly_fields = [
+        "name",
+        "concurrency",
+        "free_slots",
+        "images",
+        "labels",
+        "registered_at",
+        "last_heartbeat",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(boolean=True)
+    def alive(self, obj):
+        return obj.is_alive
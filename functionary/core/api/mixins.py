@@ -1,4 +1,3 @@
-from functools import cache
 from typing import Union
 
 from django.core.exceptions import ValidationError
@@ -14,11 +13,13 @@ class EnvironmentViewMixin:
     """Provides handling of the X-Environment-Id header to determine
     the environment context of the request."""
 
-    @cache
     def get_environment(self) -> Environment:
         """Retrieve the Environment object that corresponds to the environment
         with id X-Environment-Id
 
+        The environment is looked up once per request, as a new view instance is
+        created for each request.
+
         Returns:
             The appropriate Environment object based on the request headers
 
@@ -27,6 +28,10 @@ class EnvironmentViewMixin:
                            determined based on the header values
         """
         environment_id = self.request.headers.get("X-Environment-Id")
+        cached = getattr(self, "_environment", None)
+
+        if cached is not None and cached[0] == environment_id:
+            return cached[1]
 
         if environment_id:
             try:
@@ -38,6 +43,8 @@ class EnvironmentViewMixin:
         else:
             raise MissingEnvironmentHeader("X-Environment-Id header must be set")
 
+        self._environment = (environment_id, environment_obj)
+
         return environment_obj
 
     def verify_user_permission(self, permission: Union[Permission, str]) -> None:
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+from core.utils.pagination import ORDERING, estimated_count
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Cursor pagination for large, append mostly listings such as tasks and builds
+
+    Pages are fetched by keyset on (created_at, id), newest first, rather than by
+    offset, so deep pages are as fast as the first. The total count is not included
+    by default. Passing count=estimate includes the query planner's estimate of it.
+    """
+
+    ordering = ORDERING
+    page_size_query_param = "limit"
+    max_page_size = 1000
+    count_query_param = "count"
+    count_query_description = (
+        "Set to 'estimate' to include an estimate of the total number of results"
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) == "estimate":
+            self.count = estimated_count(queryset)
+
+        # A cursor whose position is not a valid created_at fails once it is used to
+        # filter the queryset
+        try:
+            return super().paginate_queryset(queryset, request, view)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+
+        if self.count is not None:
+            response.data = OrderedDict([("count", self.count), *response.data.items()])
+
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"] = {
+            "count": {"type": "integer", "example": 123},
+            **response_schema["properties"],
+        }
+
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.count_query_description,
+                "schema": {"type": "string", "enum": ["estimate"]},
+            }
+        ]
@@ -7,6 +7,11 @@ from .task import (  # noqa
     TaskResultSerializer,
     TaskSerializer,
 )
+from .task_artifact import TaskArtifactSerializer  # noqa
 from .task_log import TaskLogSerializer  # noqa
+from .task_resource_usage import (  # noqa
+    ResourceProfileSerializer,
+    TaskResourceUsageSerializer,
+)
 from .team import TeamEnvironmentSerializer, TeamSerializer  # noqa
 from .user import UserSerializer  # noqa
@@ -0,0 +1,12 @@
+""" TaskArtifact serializers """
+from rest_framework import serializers
+
+from core.models import TaskArtifact
+
+
+class TaskArtifactSerializer(serializers.ModelSerializer):
+    """Basic serializer for the TaskArtifact model"""
+
+    class Meta:
+        model = TaskArtifact
+        fields = ["id", "name", "size", "created_at"]
@@ -0,0 +1,33 @@
+""" TaskResourceUsage serializers """
+from rest_framework import serializers
+
+from core.models import TaskResourceUsage
+
+
+class TaskResourceUsageSerializer(serializers.ModelSerializer):
+    """Basic serializer for the TaskResourceUsage model"""
+
+    class Meta:
+        model = TaskResourceUsage
+        fields = [
+            "cpu_seconds",
+            "memory_peak_bytes",
+            "network_rx_bytes",
+            "network_tx_bytes",
+            "block_read_bytes",
+            "block_write_bytes",
+        ]
+
+
+class ResourceProfileSerializer(serializers.Serializer):
+    """Serializer for the summary of the resources used by a function's tasks"""
+
+    task_count = serializers.IntegerField()
+    cpu_seconds_avg = serializers.FloatField(allow_null=True)
+    cpu_seconds_max = serializers.FloatField(allow_null=True)
+    memory_peak_bytes_avg = serializers.FloatField(allow_null=True)
+    memory_peak_bytes_max = serializers.IntegerField(allow_null=True)
+    network_rx_bytes_total = serializers.IntegerField(allow_null=True)
+    network_tx_bytes_total = serializers.IntegerField(allow_null=True)
+    block_read_bytes_total = serializers.IntegerField(allow_null=True)
+    block_write_bytes_total = serializers.IntegerField(allow_null=True)
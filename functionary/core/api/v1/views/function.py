@@ -1,8 +1,14 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.api import HEADER_PARAMETERS
 from core.api.permissions import HasEnvironmentPermissionForAction
 from core.api.viewsets import EnvironmentReadOnlyModelViewSet
-from core.models import Function
+from core.models import Function, TaskResourceUsage
 
-from ..serializers import FunctionSerializer
+from ..serializers import FunctionSerializer, ResourceProfileSerializer
 
 
 class FunctionViewSet(EnvironmentReadOnlyModelViewSet):
@@ -12,3 +18,20 @@ class FunctionViewSet(EnvironmentReadOnlyModelViewSet):
     serializer_class = FunctionSerializer
     permission_classes = [HasEnvironmentPermissionForAction]
     environment_through_field = "package"
+
+    @extend_schema(
+        description=(
+            "Summarize the resources used by the function's tasks, to help find the "
+            "functions that are expensive to run"
+        ),
+        parameters=HEADER_PARAMETERS,
+        responses={status.HTTP_200_OK: ResourceProfileSerializer},
+    )
+    @action(methods=["get"], detail=True)
+    def resource_profile(self, request, pk=None):
+        function = self.get_object()
+        profile = TaskResourceUsage.objects.filter(task__function=function).profile()
+
+        return Response(
+            ResourceProfileSerializer(profile).data, status=status.HTTP_200_OK
+        )
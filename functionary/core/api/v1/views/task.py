@@ -1,5 +1,10 @@
-from django.core.exceptions import ObjectDoesNotExist
+import os
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import HttpResponse
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
+    OpenApiParameter,
     PolymorphicProxySerializer,
     extend_schema,
     extend_schema_view,
@@ -10,17 +15,28 @@ from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
 from core.api import HEADER_PARAMETERS
+from core.api.pagination import CreatedAtCursorPagination
 from core.api.permissions import HasEnvironmentPermissionForAction
 from core.api.v1.serializers import (
+    TaskArtifactSerializer,
     TaskCreateByIdSerializer,
     TaskCreateByNameSerializer,
     TaskCreateResponseSerializer,
     TaskLogSerializer,
+    TaskResourceUsageSerializer,
     TaskResultSerializer,
     TaskSerializer,
 )
 from core.api.viewsets import EnvironmentGenericViewSet
 from core.models import Task, TaskResult
+from core.utils.artifacts import ArtifactNotFound, artifact_response
+
+RANGE_PARAMETER = OpenApiParameter(
+    name="Range",
+    type=str,
+    location=OpenApiParameter.HEADER,
+    description="Single byte range of the content to retrieve, e.g. bytes=0-1023",
+)
 
 
 @extend_schema_view(
@@ -38,6 +54,7 @@ class TaskViewSet(
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [HasEnvironmentPermissionForAction]
+    pagination_class = CreatedAtCursorPagination
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -114,3 +131,98 @@ class TaskViewSet(
             raise NotFound(f"No log found for task {pk}.")
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Retrieve the resources used by the task, as measured by the runner. "
+            "Measurements the runner was unable to take are null."
+        ),
+        parameters=HEADER_PARAMETERS,
+        responses={status.HTTP_200_OK: TaskResourceUsageSerializer},
+    )
+    @action(methods=["get"], detail=True)
+    def resources(self, request, pk=None):
+        task = self.get_object()
+
+        try:
+            serializer = TaskResourceUsageSerializer(task.resource_usage)
+        except ObjectDoesNotExist:
+            raise NotFound(f"No resource usage found for task {pk}.")
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Download the task result. Results are stored as artifacts when they "
+            "are large, so prefer this to the result endpoint when the result may be "
+            "large. Supports retrieving a single byte range via the Range header."
+        ),
+        parameters=HEADER_PARAMETERS + [RANGE_PARAMETER],
+        responses={
+            (status.HTTP_200_OK, "application/json"): OpenApiTypes.BINARY,
+            (status.HTTP_206_PARTIAL_CONTENT, "application/json"): OpenApiTypes.BINARY,
+        },
+    )
+    @action(methods=["get"], detail=True, url_path="result/download")
+    def download_result(self, request, pk=None):
+        task = self.get_object()
+
+        try:
+            task_result = task.taskresult
+        except ObjectDoesNotExist:
+            raise NotFound(f"No result found for task {pk}.")
+
+        if not task_result.is_artifact:
+            response = HttpResponse(task_result.result, content_type="application/json")
+            response["Content-Disposition"] = f'attachment; filename="{task.id}.json"'
+            return response
+
+        try:
+            return artifact_response(
+                request, task_result.digest, f"{task.id}.json", "application/json"
+            )
+        except ArtifactNotFound:
+            raise NotFound(f"Result for task {pk} is no longer available.")
+
+    @extend_schema(
+        description="List the files output by the task",
+        parameters=HEADER_PARAMETERS,
+        responses={status.HTTP_200_OK: TaskArtifactSerializer(many=True)},
+    )
+    @action(methods=["get"], detail=True)
+    def artifacts(self, request, pk=None):
+        task = self.get_object()
+        serializer = TaskArtifactSerializer(task.artifacts.order_by("name"), many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Download a file output by the task. Supports retrieving a single byte "
+            "range via the Range header."
+        ),
+        parameters=HEADER_PARAMETERS + [RANGE_PARAMETER],
+        responses={
+            status.HTTP_200_OK: OpenApiTypes.BINARY,
+            status.HTTP_206_PARTIAL_CONTENT: OpenApiTypes.BINARY,
+        },
+    )
+    @action(
+        methods=["get"],
+        detail=True,
+        url_path=r"artifacts/(?P<artifact_id>[0-9a-f-]+)",
+    )
+    def download_artifact(self, request, pk=None, artifact_id=None):
+        task = self.get_object()
+
+        try:
+            artifact = task.artifacts.get(id=artifact_id)
+        except (ObjectDoesNotExist, ValidationError):
+            raise NotFound(f"No artifact {artifact_id} found for task {pk}.")
+
+        try:
+            return artifact_response(
+                request, artifact.digest, os.path.basename(artifact.name)
+            )
+        except ArtifactNotFound:
+            raise NotFound(f"Artifact {artifact_id} is no longer available.")
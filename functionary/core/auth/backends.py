@@ -1,6 +1,7 @@
 from django.contrib.auth.backends import BaseBackend
 
 from core.auth import Permission
+from core.auth.cache import environment_permissions, team_permissions
 from core.models import Environment, Team
 
 
@@ -8,11 +9,14 @@ class CoreBackend(BaseBackend):
     """Custom auth backend"""
 
     def _user_permissions_for_object(self, user, obj) -> set:
-        """For a given Team or Environment, returns the user's assigned permissions."""
+        """For a given Team or Environment, returns the user's assigned permissions.
+
+        The permissions are cached, see core.auth.cache.
+        """
         if isinstance(obj, Team):
-            return user.team_permissions(obj)
+            return team_permissions(user, obj)
         elif isinstance(obj, Environment):
-            return user.environment_permissions(obj, inherited=True)
+            return environment_permissions(user, obj)
         else:
             return set()
 
@@ -0,0 +1,84 @@
+"""Caching of resolved permissions
+
+Resolving a user's permissions for an environment queries both their environment and
+team roles, and most requests check permissions several times. Resolved permissions
+are memoized on the user object for the rest of the request, and, when the cache is
+shared between processes (see SHARED_CACHE), kept in the cache across requests.
+Without a shared cache, a change to a user's roles would only invalidate the cache
+of the process that made it, so permissions are then resolved for every request.
+
+Cached permissions are keyed by a version per user, which is replaced whenever one of
+the user's roles changes, so that all of their cached permissions are invalidated at
+once. Permissions memoized for a request are not invalidated, in the same way as
+Django's own permission cache.
+"""
+from time import time_ns
+from typing import TYPE_CHECKING, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+if TYPE_CHECKING:
+    from core.models import Environment, Team, User
+
+
+def _version_key(user_id) -> str:
+    return f"permissions_version:{user_id}"
+
+
+def _version(user_id) -> int:
+    key = _version_key(user_id)
+
+    if (version := cache.get(key)) is None:
+        version = time_ns()
+
+        # Another process may have set the version in the meantime
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+
+    return version
+
+
+def _resolve(user: "User", scope: str, obj_id, resolve: Callable[[], set]) -> set:
+    memo = user.__dict__.setdefault("_core_permission_cache", {})
+
+    if (permissions := memo.get((scope, obj_id))) is None:
+        if settings.SHARED_CACHE:
+            permissions = _cached(user, scope, obj_id, resolve)
+        else:
+            permissions = frozenset(resolve())
+
+        memo[(scope, obj_id)] = permissions
+
+    return permissions
+
+
+def _cached(user: "User", scope: str, obj_id, resolve: Callable[[], set]) -> set:
+    key = f"permissions:{user.pk}:{_version(user.pk)}:{scope}:{obj_id}"
+
+    if (permissions := cache.get(key)) is None:
+        permissions = frozenset(resolve())
+        cache.set(key, permissions, settings.PERMISSIONS_CACHE_TIMEOUT)
+
+    return permissions
+
+
+def environment_permissions(user: "User", environment: "Environment") -> set:
+    """Returns the user's permissions for the environment, including those inherited
+    from their role on its team"""
+    return _resolve(
+        user,
+        "environment",
+        environment.pk,
+        lambda: user.environment_permissions(environment, inherited=True),
+    )
+
+
+def team_permissions(user: "User", team: "Team") -> set:
+    """Returns the user's permissions for the team"""
+    return _resolve(user, "team", team.pk, lambda: user.team_permissions(team))
+
+
+def invalidate_permissions(user_id) -> None:
+    """Invalidate the cached permissions of the user"""
+    cache.set(_version_key(user_id), time_ns(), timeout=None)
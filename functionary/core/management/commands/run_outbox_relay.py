@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.messaging import wait_for_connection
+from core.utils.outbox import start_relay
+
+
+class Command(BaseCommand):
+    help = "Publish the tasking messages in the outbox to the runners"
+
+    def handle(self, *args, **kwargs):
+        wait_for_connection()
+        start_relay()
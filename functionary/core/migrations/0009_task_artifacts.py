@@ -0,0 +1,62 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_workflowparameter_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="taskresult",
+            name="digest",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="taskresult",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="taskresult",
+            name="result",
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name="TaskArtifact",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("name", models.CharField(max_length=1024)),
+                ("digest", models.CharField(max_length=64)),
+                ("size", models.BigIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="artifacts",
+                        to="core.task",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="taskartifact",
+            constraint=models.UniqueConstraint(
+                fields=("task", "name"), name="task_artifact_unique_task_name"
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_task_artifacts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="function",
+            name="timeout",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("IN_PROGRESS", "In Progress"),
+                    ("COMPLETE", "Complete"),
+                    ("ERROR", "Error"),
+                    ("TIMEOUT", "Timed Out"),
+                ],
+                default="PENDING",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="workflowrun",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("IN_PROGRESS", "In Progress"),
+                    ("COMPLETE", "Complete"),
+                    ("ERROR", "Error"),
+                    ("TIMEOUT", "Timed Out"),
+                ],
+                default="PENDING",
+                max_length=16,
+            ),
+        ),
+    ]
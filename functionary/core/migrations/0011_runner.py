@@ -0,0 +1,44 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:13
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_function_timeout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Runner",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("name", models.CharField(max_length=256, unique=True)),
+                ("concurrency", models.PositiveIntegerField(default=0)),
+                ("free_slots", models.PositiveIntegerField(default=0)),
+                ("images", models.JSONField(blank=True, default=list)),
+                ("labels", models.JSONField(blank=True, default=list)),
+                (
+                    "registered_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "last_heartbeat",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_runner"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="runner_label",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="runner",
+            name="pools",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
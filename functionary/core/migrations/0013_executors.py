@@ -0,0 +1,43 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_runner_pools"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="environment",
+            name="executor",
+            field=models.CharField(
+                choices=[
+                    ("docker", "Docker container"),
+                    ("process", "Process in a cached virtualenv"),
+                ],
+                default="docker",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="executor",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("docker", "Docker container"),
+                    ("process", "Process in a cached virtualenv"),
+                ],
+                max_length=16,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="source_digest",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
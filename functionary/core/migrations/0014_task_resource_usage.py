@@ -0,0 +1,36 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_executors"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskResourceUsage",
+            fields=[
+                (
+                    "task",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="resource_usage",
+                        serialize=False,
+                        to="core.task",
+                    ),
+                ),
+                ("cpu_seconds", models.FloatField(blank=True, null=True)),
+                ("memory_peak_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("network_rx_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("network_tx_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("block_read_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("block_write_bytes", models.BigIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.4 on 2026-10-17 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_outbox_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tasklog",
+            name="sequence",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,10 +1,14 @@
 from .environment import Environment  # noqa
 from .function import Function  # noqa
 from .mixins import ModelSaveHookMixin  # noqa
+from .outbox_message import OutboxMessage  # noqa
 from .package import Package  # noqa
+from .runner import Runner  # noqa
 from .scheduled_task import ScheduledTask  # noqa
 from .task import Task  # noqa
+from .task_artifact import TaskArtifact  # noqa
 from .task_log import TaskLog  # noqa
+from .task_resource_usage import TaskResourceUsage  # noqa
 from .task_result import TaskResult  # noqa
 from .team import Team  # noqa
 from .user import User  # noqa
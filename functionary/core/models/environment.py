@@ -1,6 +1,9 @@
 """ Environment model """
 import uuid
+from typing import Iterable
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 
@@ -12,13 +15,24 @@ class Environment(models.Model):
         id: unique identifier (UUID)
         name: the name of the environment
         team: the Team that this environment belongs to
+        executor: how the runners execute tasks for the environment's packages.
+                  Packages may override this.
     """
 
+    DOCKER = "docker"
+    PROCESS = "process"
+
+    EXECUTOR_CHOICES = [
+        (DOCKER, "Docker container"),
+        (PROCESS, "Process in a cached virtualenv"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=64)
     team = models.ForeignKey(
         to="Team", related_name="environments", on_delete=models.CASCADE, db_index=True
     )
+    executor = models.CharField(max_length=16, choices=EXECUTOR_CHOICES, default=DOCKER)
 
     class Meta:
         constraints = [
@@ -40,3 +54,43 @@ class Environment(models.Model):
         """
         env_vars = self.vars.all()
         return env_vars | self.team.vars.exclude(name__in=env_vars.values("name"))
+
+    @property
+    def resolved_variables(self) -> dict[str, dict]:
+        """The variables visible in this environment, resolved from the cache.
+
+        Maps the name of each variable to its value and whether it is protected. The
+        map is built from variables and cached on first use, and is invalidated
+        whenever a variable, the environment or its team changes. The map is only
+        cached when the cache is shared between processes (see SHARED_CACHE), since
+        the other processes would not see it invalidated otherwise.
+        """
+        if not settings.SHARED_CACHE:
+            return self._resolve_variables()
+
+        key = _variables_cache_key(self.id)
+
+        if (resolved := cache.get(key)) is None:
+            resolved = self._resolve_variables()
+            cache.set(key, resolved, settings.VARIABLES_CACHE_TIMEOUT)
+
+        return resolved
+
+    def _resolve_variables(self) -> dict[str, dict]:
+        return {
+            name: {"value": value, "protect": protect}
+            for name, value, protect in self.variables.values_list(
+                "name", "value", "protect"
+            )
+        }
+
+    @staticmethod
+    def invalidate_variables(environment_ids: Iterable) -> None:
+        """Remove the cached resolved variables of the given environments"""
+        cache.delete_many(
+            [_variables_cache_key(environment_id) for environment_id in environment_ids]
+        )
+
+
+def _variables_cache_key(environment_id) -> str:
+    return f"environment_variables:{environment_id}"
@@ -27,6 +27,8 @@ class Function(models.Model):
         variables: list of variable names to set before execution
         return_type: the type of the object being returned
         schema: the function's OpenAPI definition
+        timeout: seconds the function may run for before it is stopped. The
+                 TASK_DEFAULT_TIMEOUT setting applies if this is not set.
     """
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -43,6 +45,7 @@ class Function(models.Model):
     variables = models.JSONField(default=list, validators=[list_of_strings])
     return_type = models.CharField(max_length=64, null=True)
     schema = models.JSONField()
+    timeout = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         constraints = [
@@ -0,0 +1,27 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class OutboxMessage(models.Model):
+    """A tasking message waiting to be published to the runners
+
+    The message is written in the same transaction that creates its Task, so that it
+    only becomes visible to the outbox relay once the task has been committed. The
+    relay publishes the messages in the order they were created and deletes each one
+    once the broker has confirmed it. While a relay is publishing a message, the
+    message is claimed for it until claimed_until.
+
+    Attributes:
+        id: auto incrementing id, giving the order the messages were created in
+        task: the task the message is for
+        message: the pre-rendered TASK_PACKAGE message
+        created_at: creation timestamp
+        claimed_until: when the claim of the relay publishing the message expires,
+                       or None if the message is not claimed
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    task = models.ForeignKey(to="Task", on_delete=models.CASCADE)
+    message = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
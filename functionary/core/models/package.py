@@ -17,6 +17,11 @@ class Package(models.Model):
         display_name: optional display name
         summary: summary of the package
         description: more details about the package
+        runner_label: label of the runner pool that the package's tasks must run in
+        executor: how the runners execute the package's tasks, overriding the
+                  environment's executor if set
+        source_digest: digest of the package contents in the artifact store, for
+                       executors that run the package outside of its image
     """
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -33,6 +38,11 @@ class Package(models.Model):
     language = models.CharField(max_length=64)
 
     image_name = models.CharField(max_length=256)
+    runner_label = models.CharField(max_length=64, null=True, blank=True)
+    executor = models.CharField(
+        max_length=16, choices=Environment.EXECUTOR_CHOICES, null=True, blank=True
+    )
+    source_digest = models.CharField(max_length=64, null=True, blank=True)
 
     class Meta:
         constraints = [
@@ -47,3 +57,8 @@ class Package(models.Model):
     @property
     def full_image_name(self):
         return f"{settings.REGISTRY}/{self.image_name}"
+
+    @property
+    def resolved_executor(self) -> str:
+        """The executor for the package's tasks"""
+        return self.executor or self.environment.executor
@@ -0,0 +1,59 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class RunnerQuerySet(models.QuerySet):
+    def alive(self):
+        """Runners that have sent a heartbeat within RUNNER_HEARTBEAT_EXPIRY"""
+        return self.filter(last_heartbeat__gte=_expiry_cutoff())
+
+    def expired(self):
+        """Runners that have not sent a heartbeat within RUNNER_HEARTBEAT_EXPIRY"""
+        return self.filter(last_heartbeat__lt=_expiry_cutoff())
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(seconds=settings.RUNNER_HEARTBEAT_EXPIRY)
+
+
+class Runner(models.Model):
+    """A runner that has registered with the core and the capacity it last reported
+
+    Runners register when they start and then send a heartbeat periodically. A runner
+    that has not sent a heartbeat within RUNNER_HEARTBEAT_EXPIRY is considered gone.
+
+    Attributes:
+        id: unique identifier (UUID)
+        name: name the runner identifies itself with
+        concurrency: number of tasks the runner can execute at once
+        free_slots: number of execution slots that were free at the last heartbeat
+        images: package images present on the runner
+        labels: labels the runner was configured with
+        pools: runner pools whose queues the runner consumes
+        registered_at: time of the runner's most recent registration
+        last_heartbeat: time of the most recent heartbeat
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=256, unique=True)
+    concurrency = models.PositiveIntegerField(default=0)
+    free_slots = models.PositiveIntegerField(default=0)
+    images = models.JSONField(default=list, blank=True)
+    labels = models.JSONField(default=list, blank=True)
+    pools = models.JSONField(default=list, blank=True)
+    registered_at = models.DateTimeField(default=timezone.now)
+    last_heartbeat = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = RunnerQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def is_alive(self) -> bool:
+        """Whether the runner has sent a heartbeat within RUNNER_HEARTBEAT_EXPIRY"""
+        return self.last_heartbeat >= _expiry_cutoff()
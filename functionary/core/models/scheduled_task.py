@@ -1,6 +1,5 @@
 """ Scheduled Task model """
 import uuid
-from json import JSONDecodeError
 
 import jsonschema
 from django.conf import settings
@@ -10,7 +9,7 @@ from django.db import models
 from django_celery_beat.models import CrontabSchedule, PeriodicTask
 
 from core.models import ModelSaveHookMixin
-from core.utils.serialization import serialize_parameters
+from core.utils.serialization import get_validator
 
 
 class ScheduledTask(ModelSaveHookMixin, models.Model):
@@ -93,16 +92,12 @@ class ScheduledTask(ModelSaveHookMixin, models.Model):
 
     def _clean_parameters(self):
         """Validate that the parameters conform to the function's schema"""
+        validator = get_validator(self.function.id, self.function.schema)
+
         try:
-            parameters = serialize_parameters(self.parameters, self.function.schema)
-            jsonschema.validate(
-                instance=parameters,
-                schema=self.function.schema,
-            )
+            validator.validate(self.parameters)
         except jsonschema.ValidationError as exc:
             raise ValidationError(exc.message)
-        except JSONDecodeError as err:
-            raise ValidationError(err.msg)
 
     def clean(self):
         """Model instance validation and attribute cleanup"""
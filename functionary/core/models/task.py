@@ -10,7 +10,7 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from core.models import ModelSaveHookMixin, ScheduledTask
-from core.utils.serialization import serialize_parameters
+from core.utils.serialization import get_validator
 
 
 class Task(ModelSaveHookMixin, models.Model):
@@ -36,14 +36,18 @@ class Task(ModelSaveHookMixin, models.Model):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETE = "COMPLETE"
     ERROR = "ERROR"
+    TIMEOUT = "TIMEOUT"
 
     STATUS_CHOICES = [
         (PENDING, "Pending"),
         (IN_PROGRESS, "In Progress"),
         (COMPLETE, "Complete"),
         (ERROR, "Error"),
+        (TIMEOUT, "Timed Out"),
     ]
 
+    FINISHED_STATUSES = [COMPLETE, ERROR, TIMEOUT]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     function = models.ForeignKey(to="Function", on_delete=models.CASCADE)
     environment = models.ForeignKey(to="Environment", on_delete=models.CASCADE)
@@ -90,16 +94,12 @@ class Task(ModelSaveHookMixin, models.Model):
 
     def _clean_parameters(self):
         """Validate that the parameters conform to the function's schema"""
+        validator = get_validator(self.function.id, self.function.schema)
+
         try:
-            parameters = serialize_parameters(self.parameters, self.function.schema)
-            jsonschema.validate(
-                instance=parameters,
-                schema=self.function.schema,
-            )
+            validator.validate(self.parameters)
         except jsonschema.ValidationError as exc:
             raise ValidationError(exc.message)
-        except JSONDecodeError as err:
-            raise ValidationError(err.msg)
 
     def clean(self):
         """Model instance validation and attribute cleanup"""
@@ -108,15 +108,15 @@ class Task(ModelSaveHookMixin, models.Model):
 
     def post_create(self):
         """Post create hooks"""
-        from core.utils.tasking import publish_task
+        from core.utils.tasking import queue_task
 
-        publish_task.delay(self.id)
+        queue_task(self)
 
     @property
     def raw_result(self) -> Optional[str]:
         """Convenience property for accessing the result output"""
         try:
-            return self.taskresult.result
+            return self.taskresult.raw
         except ObjectDoesNotExist:
             return None
 
@@ -128,7 +128,7 @@ class Task(ModelSaveHookMixin, models.Model):
         except ObjectDoesNotExist:
             return None
         except JSONDecodeError:
-            return self.taskresult.result
+            return self.taskresult.raw
 
     @property
     def log(self) -> Optional[str]:
@@ -142,3 +142,15 @@ class Task(ModelSaveHookMixin, models.Model):
     def variables(self):
         """Returns the variables required by the function being tasked."""
         return self.environment.variables.filter(name__in=self.function.variables)
+
+    @property
+    def resolved_variables(self) -> dict[str, dict]:
+        """Returns the resolved variables required by the function being tasked,
+        keyed by name. See Environment.resolved_variables."""
+        variables = self.environment.resolved_variables
+
+        return {
+            name: variables[name]
+            for name in self.function.variables
+            if name in variables
+        }
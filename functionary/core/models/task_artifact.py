@@ -0,0 +1,37 @@
+import uuid
+
+from django.db import models
+
+
+class TaskArtifact(models.Model):
+    """A file written by a Task to its output directory
+
+    The content of the file is held in the artifact store under its digest.
+
+    Attributes:
+        id: unique identifier (UUID)
+        task: the task that produced the file
+        name: path of the file, relative to the output directory
+        digest: sha256 digest of the content, used to retrieve it from the store
+        size: size of the content in bytes
+        created_at: artifact creation timestamp
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(
+        to="Task", related_name="artifacts", on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=1024)
+    digest = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["task", "name"], name="task_artifact_unique_task_name"
+            )
+        ]
+
+    def __str__(self):
+        return self.name
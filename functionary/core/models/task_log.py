@@ -2,8 +2,17 @@ from django.db import models
 
 
 class TaskLog(models.Model):
-    """Log output from the execution of a Task"""
+    """Log output from the execution of a Task
+
+    Attributes:
+        task: the task the output is from
+        log: the output of the task
+        sequence: sequence number of the last chunk of streamed output appended to
+                  the log
+        created_at: log creation timestamp
+    """
 
     task = models.OneToOneField(primary_key=True, to="Task", on_delete=models.CASCADE)
     log = models.TextField()
+    sequence = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,47 @@
+from django.db import models
+from django.db.models import Avg, Count, Max, Sum
+
+
+class TaskResourceUsageQuerySet(models.QuerySet):
+    def profile(self) -> dict:
+        """Summarize the resources used by the tasks, such as those of one function
+
+        Returns:
+            A dict with the number of tasks, the average and maximum CPU time and peak
+            memory, and the total network and block I/O
+        """
+        return self.aggregate(
+            task_count=Count("task"),
+            cpu_seconds_avg=Avg("cpu_seconds"),
+            cpu_seconds_max=Max("cpu_seconds"),
+            memory_peak_bytes_avg=Avg("memory_peak_bytes"),
+            memory_peak_bytes_max=Max("memory_peak_bytes"),
+            network_rx_bytes_total=Sum("network_rx_bytes"),
+            network_tx_bytes_total=Sum("network_tx_bytes"),
+            block_read_bytes_total=Sum("block_read_bytes"),
+            block_write_bytes_total=Sum("block_write_bytes"),
+        )
+
+
+class TaskResourceUsage(models.Model):
+    """Resources used during the execution of a Task, as measured by the runner
+
+    Any measurement the runner was unable to take is left empty. Container stats are
+    sampled by the runner at intervals, so the usage of short tasks is approximate.
+    """
+
+    task = models.OneToOneField(
+        primary_key=True,
+        to="Task",
+        on_delete=models.CASCADE,
+        related_name="resource_usage",
+    )
+    cpu_seconds = models.FloatField(null=True, blank=True)
+    memory_peak_bytes = models.BigIntegerField(null=True, blank=True)
+    network_rx_bytes = models.BigIntegerField(null=True, blank=True)
+    network_tx_bytes = models.BigIntegerField(null=True, blank=True)
+    block_read_bytes = models.BigIntegerField(null=True, blank=True)
+    block_write_bytes = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskResourceUsageQuerySet.as_manager()
@@ -4,13 +4,35 @@ from django.db import models
 
 
 class TaskResult(models.Model):
-    """Results from the execution of a Task"""
+    """Results from the execution of a Task
+
+    Results larger than the runner's artifact threshold are held in the artifact
+    store rather than in the result field, in which case digest and size are set.
+    """
 
     task = models.OneToOneField(primary_key=True, to="Task", on_delete=models.CASCADE)
-    result = models.TextField()
+    result = models.TextField(blank=True)
+    digest = models.CharField(max_length=64, null=True, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def is_artifact(self) -> bool:
+        """Whether the result is held in the artifact store"""
+        return self.digest is not None
+
+    @property
+    def raw(self) -> str:
+        """Return the raw result string, reading it from the artifact store if
+        necessary"""
+        if not self.is_artifact:
+            return self.result
+
+        from core.utils.artifacts import get_artifact_store
+
+        return b"".join(get_artifact_store().stream(self.digest)).decode()
+
     @property
     def json(self):
         """Return the result as loaded JSON rather than the raw string"""
-        return json.loads(self.result)
+        return json.loads(self.raw)
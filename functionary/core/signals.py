@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.auth.cache import invalidate_permissions
+from core.models import Environment, EnvironmentUserRole, TeamUserRole, Variable
+
+
+@receiver([post_save, post_delete], sender=Variable)
+def variable_changed(sender, instance, **kwargs):
+    """Invalidate the resolved variables of the environments the variable is
+    visible in"""
+    if instance.environment_id is not None:
+        Environment.invalidate_variables([instance.environment_id])
+    elif instance.team_id is not None:
+        Environment.invalidate_variables(
+            Environment.objects.filter(team_id=instance.team_id).values_list(
+                "id", flat=True
+            )
+        )
+
+
+@receiver([post_save, post_delete], sender=Environment)
+def environment_changed(sender, instance, **kwargs):
+    """Invalidate the resolved variables of the environment. Deleting a team deletes
+    its environments, so this covers the team's variables too."""
+    Environment.invalidate_variables([instance.id])
+
+
+@receiver([post_save, post_delete], sender=EnvironmentUserRole)
+@receiver([post_save, post_delete], sender=TeamUserRole)
+def role_changed(sender, instance, **kwargs):
+    """Invalidate the cached permissions of the user the role belongs to"""
+    invalidate_permissions(instance.user_id)
@@ -1,9 +1,12 @@
+import io
 import json
+from base64 import b64encode
 
 import pytest
 from django.urls import reverse
 
 from core.models import Function, Package, Task, TaskResult, Team
+from core.utils.artifacts import get_artifact_store
 
 
 @pytest.fixture
@@ -125,3 +128,92 @@ def test_result_type_is_preserved(admin_client, task, request_headers):
     task_result.save()
     response = admin_client.get(url, **request_headers)
     assert type(response.data["result"]) is bool
+
+
+@pytest.fixture
+def artifact_store(settings, tmp_path):
+    settings.ARTIFACT_STORE = {
+        "BACKEND": "core.utils.artifacts.LocalArtifactStore",
+        "OPTIONS": {"root": str(tmp_path)},
+    }
+
+    return get_artifact_store()
+
+
+def test_result_stored_as_artifact(admin_client, task, request_headers, artifact_store):
+    """Results held in the artifact store are returned by the result endpoint and can
+    be downloaded in ranges"""
+    content = json.dumps({"data": "x" * 1000}).encode()
+    digest, size = artifact_store.put(io.BytesIO(content))
+    TaskResult.objects.create(task=task, digest=digest, size=size)
+
+    url = f"{reverse('task-list')}{task.id}/result/"
+    response = admin_client.get(url, **request_headers)
+    assert response.data["result"] == json.loads(content)
+
+    url = f"{reverse('task-list')}{task.id}/result/download/"
+    response = admin_client.get(url, HTTP_RANGE="bytes=2-5", **request_headers)
+    assert response.status_code == 206
+    assert response["Content-Range"] == f"bytes 2-5/{size}"
+    assert b"".join(response.streaming_content) == content[2:6]
+
+    response = admin_client.get(url, HTTP_RANGE=f"bytes={size}-", **request_headers)
+    assert response.status_code == 416
+
+
+def test_artifact_download(admin_client, task, request_headers, artifact_store):
+    """Output files are listed and downloadable"""
+    digest, size = artifact_store.put(io.BytesIO(b"a,b\n1,2\n"))
+    artifact = task.artifacts.create(
+        name="reports/report.csv", digest=digest, size=size
+    )
+
+    url = f"{reverse('task-list')}{task.id}/artifacts/"
+    response = admin_client.get(url, **request_headers)
+    assert response.data[0]["name"] == "reports/report.csv"
+
+    url = f"{reverse('task-list')}{task.id}/artifacts/{artifact.id}/"
+    response = admin_client.get(url, **request_headers)
+    assert response.status_code == 200
+    assert 'filename="report.csv"' in response["Content-Disposition"]
+    assert b"".join(response.streaming_content) == b"a,b\n1,2\n"
+
+
+def test_list_pages_by_cursor(admin_client, function, admin_user, request_headers):
+    """Tasks are listed newest first, a page at a time, with an estimated count
+    available on request"""
+    tasks = [
+        Task.objects.create(
+            function=function,
+            environment=function.package.environment,
+            parameters={"prop1": 1},
+            creator=admin_user,
+        )
+        for _ in range(3)
+    ]
+    url = reverse("task-list")
+
+    response = admin_client.get(
+        url, {"limit": 2, "count": "estimate"}, **request_headers
+    )
+
+    assert response.data["count"] == 3
+    assert [task["id"] for task in response.data["results"]] == [
+        str(task.id) for task in tasks[:0:-1]
+    ]
+
+    response = admin_client.get(response.data["next"], **request_headers)
+
+    assert [task["id"] for task in response.data["results"]] == [str(tasks[0].id)]
+    assert response.data["next"] is None
+
+
+def test_list_with_invalid_cursor_position(admin_client, request_headers):
+    """A cursor with a position that is not a timestamp is reported as invalid"""
+    cursor = b64encode(b"p=not-a-timestamp").decode()
+
+    response = admin_client.get(
+        reverse("task-list"), {"cursor": cursor}, **request_headers
+    )
+
+    assert response.status_code == 404
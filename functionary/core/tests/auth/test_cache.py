@@ -0,0 +1,67 @@
+import pytest
+
+from core.auth import Permission, Role
+from core.models import EnvironmentUserRole, Team, TeamUserRole, User
+
+
+@pytest.fixture
+def environment():
+    return Team.objects.create(name="team").environments.get()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(username="user")
+
+
+@pytest.mark.django_db
+def test_permissions_are_cached(settings, environment, user, django_assert_num_queries):
+    """Permissions are resolved once and reused for later checks"""
+    settings.SHARED_CACHE = True
+    EnvironmentUserRole.objects.create(
+        user=user, environment=environment, role=Role.READ_ONLY.name
+    )
+
+    assert user.has_perm(Permission.TASK_READ, environment)
+
+    with django_assert_num_queries(0):
+        assert user.has_perm(Permission.TASK_READ, environment)
+        assert not user.has_perm(Permission.TASK_CREATE, environment)
+
+    # A new request has a new user object, which uses the cached permissions
+    with django_assert_num_queries(0):
+        assert User(pk=user.pk).has_perm(Permission.TASK_READ, environment)
+
+
+@pytest.mark.django_db
+def test_role_changes_invalidate_permissions(settings, environment, user):
+    """Cached permissions are invalidated when the user's roles change"""
+    settings.SHARED_CACHE = True
+    assert not user.has_perm(Permission.TASK_CREATE, environment)
+
+    TeamUserRole.objects.create(
+        user=user, team=environment.team, role=Role.OPERATOR.name
+    )
+
+    assert User.objects.get(pk=user.pk).has_perm(Permission.TASK_CREATE, environment)
+
+
+@pytest.mark.django_db
+def test_permissions_not_cached_without_shared_cache(
+    settings, environment, user, django_assert_num_queries
+):
+    """Without a cache shared between processes, permissions are only memoized for
+    the request, as role changes made by other processes would not invalidate them"""
+    settings.SHARED_CACHE = False
+    EnvironmentUserRole.objects.create(
+        user=user, environment=environment, role=Role.READ_ONLY.name
+    )
+
+    assert user.has_perm(Permission.TASK_READ, environment)
+
+    with django_assert_num_queries(0):
+        assert user.has_perm(Permission.TASK_READ, environment)
+
+    EnvironmentUserRole.objects.filter(user=user).update(role=Role.OPERATOR.name)
+
+    assert User(pk=user.pk).has_perm(Permission.TASK_CREATE, environment)
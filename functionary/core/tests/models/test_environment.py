@@ -51,3 +51,34 @@ def test_variable_override_inherited(environment, env_shared_var1, team_shared_v
     """Environment variables override inherited team variables"""
     shared_var = environment.variables.get(name=team_shared_var1.name)
     assert shared_var.value == env_shared_var1.value
+
+
+@pytest.mark.django_db
+def test_resolved_variables_are_invalidated(settings, environment, env_shared_var1):
+    """The cached resolved variables are invalidated when a variable changes"""
+    settings.SHARED_CACHE = True
+    assert environment.resolved_variables == {
+        "var1": {"value": "env", "protect": False}
+    }
+
+    Variable.objects.create(name="team_var1", team=environment.team, protect=True)
+    env_shared_var1.delete()
+
+    assert environment.resolved_variables == {
+        "team_var1": {"value": "", "protect": True}
+    }
+
+
+@pytest.mark.django_db
+def test_resolved_variables_not_cached_without_shared_cache(
+    settings, environment, env_shared_var1
+):
+    """Without a cache shared between processes, the variables are resolved each
+    time, so that changes made by other processes are seen straight away"""
+    settings.SHARED_CACHE = False
+
+    assert environment.resolved_variables["var1"]["value"] == "env"
+
+    Variable.objects.filter(id=env_shared_var1.id).update(value="changed")
+
+    assert environment.resolved_variables["var1"]["value"] == "changed"
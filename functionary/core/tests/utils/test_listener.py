@@ -0,0 +1,102 @@
+from unittest.mock import Mock
+
+import pytest
+from django.db import OperationalError
+
+from core.utils import listener
+from core.utils.listener import Requeues, ResultBatcher
+from core.utils.tasking import OutOfOrderLog
+
+
+@pytest.fixture
+def channel():
+    return Mock()
+
+
+def test_batch_is_recorded_once_full(channel, mocker):
+    """Results are recorded together once the batch is full, and only acknowledged
+    after they have been recorded"""
+    record = mocker.patch.object(listener, "record_task_results")
+    batcher = ResultBatcher(channel, batch_size=2, linger=1)
+
+    batcher.add(1, {"task_id": "a"})
+
+    record.assert_not_called()
+    channel.connection.ioloop.call_later.assert_called_once()
+
+    batcher.add(2, {"task_id": "b"})
+
+    record.assert_called_once_with([{"task_id": "a"}, {"task_id": "b"}])
+    assert [call.args for call in channel.basic_ack.call_args_list] == [(1,), (2,)]
+    channel.connection.ioloop.remove_timeout.assert_called_once()
+
+
+def test_failed_batch_is_recorded_individually(channel, mocker):
+    """When a batch can not be recorded, its results are recorded one at a time and
+    those that still fail are requeued"""
+
+    def record_task_results(messages):
+        if len(messages) > 1 or messages[0]["task_id"] == "bad":
+            raise ValueError("bad result")
+
+    mocker.patch.object(listener, "record_task_results", record_task_results)
+    batcher = ResultBatcher(channel, batch_size=10, linger=1)
+
+    batcher.add(1, {"task_id": "good"}, "good")
+    batcher.add(2, {"task_id": "bad"}, "bad")
+    batcher.flush()
+
+    channel.basic_ack.assert_called_once_with(1)
+    delay, requeue = channel.connection.ioloop.call_later.call_args.args
+    requeue()
+    channel.basic_nack.assert_called_once_with(2, requeue=True)
+
+
+def test_result_dead_lettered_after_max_requeues(channel, mocker):
+    mocker.patch.object(
+        listener, "record_task_results", side_effect=ValueError("bad result")
+    )
+    batcher = ResultBatcher(
+        channel, batch_size=1, linger=1, requeues=Requeues(max_requeues=1)
+    )
+
+    batcher.add(1, {"task_id": "bad"}, "bad")
+    batcher.add(2, {"task_id": "bad"}, "bad")
+
+    assert channel.connection.ioloop.call_later.call_count == 1
+    channel.basic_nack.assert_called_once_with(2, requeue=False)
+
+
+def test_result_requeued_while_database_unavailable(channel, mocker):
+    mocker.patch.object(
+        listener, "record_task_results", side_effect=OperationalError("down")
+    )
+    batcher = ResultBatcher(
+        channel, batch_size=1, linger=1, requeues=Requeues(max_requeues=1)
+    )
+
+    for delivery_tag in range(1, 4):
+        batcher.add(delivery_tag, {"task_id": "a"}, "a")
+
+    assert channel.connection.ioloop.call_later.call_count == 3
+    channel.basic_nack.assert_not_called()
+
+
+def test_out_of_order_log_requeue_not_counted(channel, mocker):
+    mocker.patch.object(
+        listener, "record_task_log", side_effect=OutOfOrderLog("task a is missing 0")
+    )
+    requeues = Requeues(max_requeues=2)
+    properties = Mock(headers={"x-msg-type": "TASK_LOG"}, message_id="log")
+
+    for delivery_tag in range(1, 4):
+        listener._handle_delivery(
+            channel,
+            Mock(delivery_tag=delivery_tag),
+            properties,
+            b'{"task_id": "a", "sequence": 1, "output": ""}',
+            requeues=requeues,
+        )
+
+    assert channel.connection.ioloop.call_later.call_count == 3
+    channel.basic_nack.assert_not_called()
@@ -0,0 +1,23 @@
+from core.utils.masking import MASK, Masker
+
+
+def test_masker_masks_all_values_in_one_pass():
+    """Every value is masked, preferring the longest where values overlap, and
+    values too short to be worth masking are left alone"""
+    masker = Masker(["secret", "secret-token", "abc"])
+
+    assert masker.mask("secret-token secret abc") == f"{MASK} {MASK} abc"
+
+
+def test_masker_masks_multiline_values_by_line():
+    """Values spanning several lines are masked in output chunks split on line
+    boundaries"""
+    masker = Masker(["first line\nsecond line"])
+
+    assert masker.mask("first line\n") == f"{MASK}\n"
+    assert masker.mask("second line\n") == f"{MASK}\n"
+
+
+def test_masker_without_values():
+    """Text is returned unchanged when there is nothing to mask"""
+    assert Masker([]).mask("nothing to hide") == "nothing to hide"
@@ -0,0 +1,210 @@
+from unittest.mock import Mock
+
+import pika
+import pytest
+from pika.exceptions import (
+    AMQPConnectionError,
+    ChannelClosedByBroker,
+    NackError,
+    UnroutableError,
+)
+from pika.spec import Basic
+
+from core.models import Function, Package, Runner, Task, Team
+from core.utils.messaging import (
+    RUNNERS_EXCHANGE,
+    TASK_RESULTS_QUEUE,
+    Publisher,
+    declare_results_queue,
+    environment_pool,
+    get_route,
+    send_messages,
+)
+
+
+@pytest.fixture(autouse=True)
+def declared_pools(mocker):
+    return mocker.patch("core.utils.messaging._ensure_pool")
+
+
+@pytest.fixture
+def environment():
+    return Team.objects.create(name="team").environments.get()
+
+
+@pytest.fixture
+def package(environment):
+    return Package.objects.create(
+        name="testpackage", environment=environment, image_name="testpackage:1"
+    )
+
+
+@pytest.fixture
+def task(package, environment, admin_user):
+    function = Function.objects.create(name="testfunction", package=package, schema={})
+
+    return Task.objects.create(
+        function=function, environment=environment, parameters={}, creator=admin_user
+    )
+
+
+def _runner(name, pools=("public",), images=(), free_slots=2):
+    return Runner.objects.create(
+        name=name,
+        concurrency=2,
+        free_slots=free_slots,
+        images=list(images),
+        pools=list(pools),
+    )
+
+
+@pytest.mark.django_db
+def test_route_to_public_pool(task):
+    _runner("runner1")
+
+    assert get_route(task) == (RUNNERS_EXCHANGE, "pool.public")
+
+
+@pytest.mark.django_db
+def test_route_to_environment_pool(task, environment):
+    pool = environment_pool(environment.id)
+    _runner("runner1", pools=[pool])
+
+    assert get_route(task) == (RUNNERS_EXCHANGE, f"pool.{pool}")
+
+
+@pytest.mark.django_db
+def test_route_to_label_pool(task, package):
+    package.runner_label = "gpu"
+    package.save()
+
+    assert get_route(task) == (RUNNERS_EXCHANGE, "pool.label.gpu")
+
+
+@pytest.mark.django_db
+def test_route_to_runner_with_cached_image(task, package):
+    image = package.full_image_name
+    _runner("runner1", free_slots=2)
+    _runner("runner.2", images=[image], free_slots=1)
+
+    assert get_route(task) == (RUNNERS_EXCHANGE, "runner.runner-2.public")
+    assert Runner.objects.get(name="runner.2").free_slots == 0
+
+    # With its slot claimed, the runner is no longer a candidate
+    assert get_route(task) == (RUNNERS_EXCHANGE, "pool.public")
+
+
+@pytest.fixture
+def publisher(mocker) -> Publisher:
+    mocker.patch.object(Publisher, "_ensure_started")
+
+    publisher = Publisher(batch_size=2)
+    publisher._connection = Mock()
+    publisher._channel = Mock()
+
+    return publisher
+
+
+def _publish(publisher: Publisher, count: int) -> list:
+    futures = [
+        publisher.publish("", "tasking.results", b"{}", pika.BasicProperties())
+        for _ in range(count)
+    ]
+    publisher._drain()
+
+    return futures
+
+
+def _confirm(publisher: Publisher, method) -> None:
+    publisher._on_delivery_confirmation(Mock(method=method))
+
+
+def test_publish_in_batches(publisher):
+    _publish(publisher, 3)
+
+    assert publisher._channel.basic_publish.call_count == 2
+    publisher._connection.ioloop.call_later.assert_called_with(0, publisher._drain)
+
+    publisher._drain()
+
+    assert publisher._channel.basic_publish.call_count == 3
+
+
+def test_multiple_ack_resolves_all_confirmed(publisher):
+    publisher.batch_size = 3
+    futures = _publish(publisher, 3)
+
+    _confirm(publisher, Basic.Ack(delivery_tag=2, multiple=True))
+
+    assert [future.done() for future in futures] == [True, True, False]
+    assert futures[0].result() is None
+
+
+def test_returned_and_nacked_messages_fail(publisher):
+    futures = _publish(publisher, 2)
+    properties = publisher._channel.basic_publish.call_args_list[0].args[3]
+
+    publisher._on_message_returned(None, None, properties, b"{}")
+    _confirm(publisher, Basic.Ack(delivery_tag=1))
+    _confirm(publisher, Basic.Nack(delivery_tag=2))
+
+    with pytest.raises(UnroutableError):
+        futures[0].result()
+    with pytest.raises(NackError):
+        futures[1].result()
+
+
+def test_connection_loss_fails_unconfirmed(publisher):
+    futures = _publish(publisher, 1)
+
+    publisher._on_connection_closed(Mock(), "closed")
+
+    with pytest.raises(AMQPConnectionError):
+        futures[0].result()
+
+
+def test_timeout_cancels_queued_messages(mocker, settings, publisher):
+    """Messages that are still queued when sending times out are not published"""
+    mocker.patch("core.utils.messaging.get_publisher", return_value=publisher)
+    settings.RABBITMQ_PUBLISH_TIMEOUT = 0
+
+    with pytest.raises(TimeoutError):
+        send_messages("", [("tasking.results", "TASK_RESULT", {})] * 2)
+
+    publisher._drain()
+
+    publisher._channel.basic_publish.assert_not_called()
+
+
+def test_results_queue_declared_with_dead_lettering():
+    connection = Mock()
+    channel = Mock()
+
+    assert declare_results_queue(connection, channel) is channel
+    assert (
+        "x-dead-letter-exchange" in channel.queue_declare.call_args.kwargs["arguments"]
+    )
+    connection.channel.assert_not_called()
+
+
+def test_existing_results_queue_used_as_is():
+    """A results queue declared without dead lettering is used rather than failing
+    to start"""
+    connection = Mock()
+    channel = Mock()
+    channel.queue_declare.side_effect = ChannelClosedByBroker(
+        406, "PRECONDITION_FAILED"
+    )
+
+    reopened = declare_results_queue(connection, channel)
+
+    assert reopened is connection.channel.return_value
+    reopened.queue_declare.assert_called_once_with(TASK_RESULTS_QUEUE, passive=True)
+
+
+def test_results_queue_declaration_errors_raised():
+    channel = Mock()
+    channel.queue_declare.side_effect = ChannelClosedByBroker(403, "ACCESS_REFUSED")
+
+    with pytest.raises(ChannelClosedByBroker):
+        declare_results_queue(Mock(), channel)
@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from pika.exceptions import AMQPConnectionError
+
+from core.models import Function, OutboxMessage, Package, Task, Team
+from core.utils.outbox import relay_outbox
+
+
+@pytest.fixture
+def environment():
+    return Team.objects.create(name="team").environments.get()
+
+
+@pytest.fixture
+def function(environment):
+    package = Package.objects.create(name="testpackage", environment=environment)
+
+    return Function.objects.create(
+        name="testfunction",
+        package=package,
+        schema={"title": "test", "type": "object", "properties": {}},
+    )
+
+
+def _create_task(function, environment, user) -> Task:
+    return Task.objects.create(
+        function=function, environment=environment, parameters={}, creator=user
+    )
+
+
+def _future(exception=None) -> Future:
+    future = Future()
+
+    if exception:
+        future.set_exception(exception)
+    else:
+        future.set_result(None)
+
+    return future
+
+
+@pytest.mark.django_db
+def test_task_creation_writes_outbox_message(function, environment, admin_user):
+    task = _create_task(function, environment, admin_user)
+    outbox_message = OutboxMessage.objects.get(task=task)
+
+    assert outbox_message.message["id"] == str(task.id)
+    assert outbox_message.message["function"] == "testfunction"
+
+
+@pytest.mark.django_db
+def test_relay_deletes_confirmed_messages(mocker, function, environment, admin_user):
+    """Only the messages confirmed by the broker are removed from the outbox"""
+    first = _create_task(function, environment, admin_user)
+    second = _create_task(function, environment, admin_user)
+    mocker.patch(
+        "core.utils.outbox.get_route", return_value=("runners.pools", "pool.public")
+    )
+    publish_messages = mocker.patch(
+        "core.utils.outbox.publish_messages",
+        side_effect=lambda messages: [
+            _future(),
+            _future(AMQPConnectionError("connection lost")),
+        ][: len(list(messages))],
+    )
+
+    assert relay_outbox() == 1
+    assert publish_messages.call_count == 1
+    assert not OutboxMessage.objects.filter(task=first).exists()
+    assert OutboxMessage.objects.get(task=second).claimed_until is None
+
+
+@pytest.mark.django_db
+def test_relay_publishes_nothing_if_routing_fails(
+    mocker, function, environment, admin_user
+):
+    """Every route is resolved before any message is published, and the claim on the
+    batch is released should one of them fail"""
+    _create_task(function, environment, admin_user)
+    _create_task(function, environment, admin_user)
+    mocker.patch(
+        "core.utils.outbox.get_route",
+        side_effect=[("runners.pools", "pool.public"), RuntimeError("no route")],
+    )
+    publish_messages = mocker.patch("core.utils.outbox.publish_messages")
+
+    with pytest.raises(RuntimeError):
+        relay_outbox()
+
+    publish_messages.assert_not_called()
+    assert not OutboxMessage.objects.filter(claimed_until__isnull=False).exists()
+
+
+@pytest.mark.django_db
+def test_relay_skips_claimed_messages(mocker, function, environment, admin_user):
+    claimed = _create_task(function, environment, admin_user)
+    unclaimed = _create_task(function, environment, admin_user)
+    OutboxMessage.objects.filter(task=claimed).update(
+        claimed_until=timezone.now() + timedelta(minutes=5)
+    )
+    mocker.patch(
+        "core.utils.outbox.get_route", return_value=("runners.pools", "pool.public")
+    )
+    mocker.patch(
+        "core.utils.outbox.publish_messages",
+        side_effect=lambda messages: [_future() for _ in messages],
+    )
+
+    assert relay_outbox() == 1
+    assert OutboxMessage.objects.filter(task=claimed).exists()
+    assert not OutboxMessage.objects.filter(task=unclaimed).exists()
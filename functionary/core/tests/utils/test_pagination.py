@@ -0,0 +1,83 @@
+from unittest.mock import Mock
+
+import pytest
+
+from core.models import Function, Package, Task, Team
+from core.utils.pagination import CursorPage, encode_cursor
+
+
+@pytest.fixture
+def tasks(admin_user):
+    environment = Team.objects.create(name="team").environments.get()
+    package = Package.objects.create(name="testpackage", environment=environment)
+    function = Function.objects.create(
+        name="testfunction",
+        package=package,
+        schema={"title": "test", "type": "object", "properties": {}},
+    )
+
+    return [
+        Task.objects.create(
+            function=function,
+            environment=environment,
+            parameters={},
+            creator=admin_user,
+        )
+        for _ in range(5)
+    ]
+
+
+@pytest.mark.django_db
+def test_cursor_page_navigation(tasks):
+    """Pages can be followed forwards and backwards by their cursors"""
+    newest_first = tasks[::-1]
+
+    first = CursorPage(Task.objects.all(), 2)
+
+    assert first.object_list == newest_first[:2]
+    assert first.count == 5
+    assert first.has_next and not first.has_previous
+
+    second = CursorPage(Task.objects.all(), 2, after_cursor=first.next_cursor)
+
+    assert second.object_list == newest_first[2:4]
+    assert second.has_next and second.has_previous
+
+    last = CursorPage(Task.objects.all(), 2, after_cursor=second.next_cursor)
+
+    assert last.object_list == newest_first[4:]
+    assert not last.has_next
+
+    back = CursorPage(Task.objects.all(), 2, before_cursor=second.previous_cursor)
+
+    assert back.object_list == first.object_list
+    assert not back.has_previous
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_returns_first_page(tasks):
+    """An invalid cursor is treated as no cursor"""
+    page = CursorPage(Task.objects.all(), 2, after_cursor="not-a-cursor")
+
+    assert page.object_list == tasks[:2:-1][:2]
+
+
+@pytest.mark.django_db
+def test_cursor_with_invalid_id_returns_first_page(tasks):
+    """A cursor whose id is not valid for the model is treated as no cursor"""
+    cursor = encode_cursor(Mock(created_at=tasks[0].created_at, pk="not-a-uuid"))
+
+    page = CursorPage(Task.objects.all(), 2, after_cursor=cursor)
+
+    assert page.object_list == tasks[:2:-1][:2]
+    assert not page.has_previous
+
+
+@pytest.mark.django_db
+def test_count_estimated_on_first_use(tasks, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        page = CursorPage(Task.objects.all(), 2)
+
+    with django_assert_num_queries(1):
+        assert page.count == 5
+        assert page.count == 5
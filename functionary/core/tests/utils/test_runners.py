@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from core.models import Runner
+from core.utils.runners import (
+    record_runner_heartbeat,
+    record_runner_registration,
+    record_runner_unregistration,
+)
+
+
+@pytest.fixture
+def status():
+    return {
+        "name": "runner1",
+        "concurrency": 4,
+        "free_slots": 4,
+        "images": ["localhost:5000/package:1"],
+        "labels": ["gpu"],
+    }
+
+
+@pytest.mark.django_db
+def test_registration_and_heartbeat(status):
+    registered = record_runner_registration(status)
+
+    status["free_slots"] = 1
+    runner = record_runner_heartbeat(status)
+
+    assert runner.id == registered.id
+    assert runner.free_slots == 1
+    assert runner.images == ["localhost:5000/package:1"]
+    assert runner.labels == ["gpu"]
+    assert list(Runner.objects.alive()) == [runner]
+
+
+@pytest.mark.django_db
+def test_heartbeat_expiry(status, settings):
+    settings.RUNNER_HEARTBEAT_EXPIRY = 30
+    runner = record_runner_heartbeat(status)
+
+    Runner.objects.filter(id=runner.id).update(
+        last_heartbeat=timezone.now() - timedelta(seconds=31)
+    )
+    runner.refresh_from_db()
+
+    assert not runner.is_alive
+    assert not Runner.objects.alive().exists()
+    assert Runner.objects.expired().get() == runner
+
+
+@pytest.mark.django_db
+def test_unregistration(status):
+    record_runner_registration(status)
+    record_runner_unregistration({"name": "runner1"})
+
+    assert not Runner.objects.exists()
@@ -0,0 +1,56 @@
+import jsonschema
+import pytest
+
+from core.utils import serialization
+from core.utils.serialization import get_validator, serialize_parameters
+
+SCHEMA = {
+    "title": "test",
+    "type": "object",
+    "properties": {
+        "count": {"type": "integer"},
+        "data": {"type": "string", "format": "json-string"},
+        "either": {
+            "anyOf": [{"type": "integer"}, {"type": "string", "format": "json-string"}]
+        },
+    },
+    "required": ["count"],
+}
+
+
+def test_serialize_parameters_dumps_json_strings():
+    """Only the JSON formatted string arguments are dumped, without modifying the
+    original parameters"""
+    parameters = {"count": 1, "data": {"a": [1, 2]}, "either": [3]}
+
+    serialized = serialize_parameters(parameters, SCHEMA)
+
+    assert serialized == {"count": 1, "data": '{"a": [1, 2]}', "either": "[3]"}
+    assert parameters["data"] == {"a": [1, 2]}
+
+
+def test_validator_validates_serialized_parameters():
+    """The validator serializes the JSON formatted string arguments before
+    validating the parameters"""
+    validator = get_validator("function", SCHEMA)
+
+    validator.validate({"count": 1, "data": {"a": 1}})
+
+    with pytest.raises(jsonschema.ValidationError):
+        validator.validate({"data": {"a": 1}})
+
+
+def test_validators_are_cached_by_function_and_schema(mocker):
+    """A validator is compiled once per function and schema, and the least recently
+    used validators are evicted"""
+    mocker.patch.object(
+        serialization, "_validators", serialization._ValidatorCache(maxsize=2)
+    )
+    validator = get_validator("function", SCHEMA)
+
+    assert get_validator("function", dict(SCHEMA)) is validator
+    assert get_validator("function", {**SCHEMA, "required": []}) is not validator
+
+    get_validator("other", SCHEMA)
+
+    assert get_validator("function", SCHEMA) is not validator
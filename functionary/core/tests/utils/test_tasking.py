@@ -1,7 +1,12 @@
 import pytest
 
-from core.models import Function, Package, Task, Team, Variable
-from core.utils.tasking import record_task_result
+from core.models import Function, Package, Task, TaskResourceUsage, Team, Variable
+from core.utils.tasking import (
+    OutOfOrderLog,
+    record_task_log,
+    record_task_result,
+    record_task_results,
+)
 
 
 @pytest.fixture
@@ -83,3 +88,126 @@ def test_output_masking(task):
     assert task_log.count("hi") == 2
     assert task_log.count("hide me") == 0
     assert task_log.count("Hide me") == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var1", "var2", "var3")
+def test_streamed_output_is_appended(task):
+    """Streamed output is appended to the TaskLog ahead of the final output and the
+    task is marked as in progress"""
+    record_task_log({"task_id": task.id, "sequence": 0, "output": "hide me\n"})
+    task.refresh_from_db()
+
+    assert task.status == Task.IN_PROGRESS
+    assert task.tasklog.log == "********\n"
+
+    record_task_log({"task_id": task.id, "sequence": 1, "output": "second\n"})
+    record_task_result(
+        {"task_id": task.id, "status": 0, "output": "last", "result": "null"}
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.tasklog.log == "********\nsecond\nlast"
+
+
+@pytest.mark.django_db
+def test_timed_out_task(task):
+    """Tasks stopped by the runner for exceeding their timeout get a distinct
+    status"""
+    record_task_result(
+        {"task_id": task.id, "status": "TIMEOUT", "output": "", "result": "null"}
+    )
+    task.refresh_from_db()
+
+    assert task.status == Task.TIMEOUT
+
+
+@pytest.mark.django_db
+def test_resource_usage_is_recorded(task):
+    """Resource usage reported by the runner is stored against the task and
+    summarized for the function"""
+    record_task_result(
+        {
+            "task_id": task.id,
+            "status": 0,
+            "output": "",
+            "result": "null",
+            "resources": {
+                "cpu_seconds": 1.5,
+                "memory_peak_bytes": 2048,
+                "network_rx_bytes": None,
+                "unknown": 1,
+            },
+        }
+    )
+
+    assert task.resource_usage.cpu_seconds == 1.5
+    assert task.resource_usage.network_rx_bytes is None
+
+    profile = TaskResourceUsage.objects.filter(task__function=task.function).profile()
+
+    assert profile["task_count"] == 1
+    assert profile["memory_peak_bytes_max"] == 2048
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("var1", "var2", "var3")
+def test_results_are_recorded_in_batches(task, function, environment, admin_user):
+    """A batch of results is recorded together, appending to any streamed output
+    and masking each task's protected variables"""
+    other_task = Task.objects.create(
+        function=function,
+        environment=environment,
+        parameters={"prop1": "value1"},
+        creator=admin_user,
+    )
+    record_task_log({"task_id": task.id, "sequence": 0, "output": "first\n"})
+
+    record_task_results(
+        [
+            {"task_id": str(task.id), "status": 0, "output": "hide me", "result": "1"},
+            {"task_id": other_task.id, "status": 1, "output": "other", "result": "2"},
+            {"task_id": "00000000-0000-0000-0000-000000000000", "status": 0},
+        ]
+    )
+    task.refresh_from_db()
+    other_task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.tasklog.log == "first\n********"
+    assert task.taskresult.result == "1"
+    assert other_task.status == Task.ERROR
+    assert other_task.tasklog.log == "other"
+
+
+@pytest.mark.django_db
+def test_redelivered_messages_are_recorded_once(task):
+    """Output and results that are delivered more than once are only recorded
+    once"""
+    log_message = {"task_id": task.id, "sequence": 0, "output": "first\n"}
+    result_message = {"task_id": task.id, "status": 0, "output": "last", "result": "1"}
+
+    record_task_log(log_message)
+    record_task_log(log_message)
+    record_task_result(result_message)
+    record_task_results([result_message, result_message])
+    task.refresh_from_db()
+
+    assert task.status == Task.COMPLETE
+    assert task.tasklog.log == "first\nlast"
+
+
+@pytest.mark.django_db
+def test_out_of_order_output_is_refused_until_finished(task):
+    """Output received ahead of an earlier chunk is refused while the task is
+    running, and appended once it has finished"""
+    with pytest.raises(OutOfOrderLog):
+        record_task_log({"task_id": task.id, "sequence": 1, "output": "second\n"})
+
+    record_task_log({"task_id": task.id, "sequence": 0, "output": "first\n"})
+    record_task_log({"task_id": task.id, "sequence": 1, "output": "second\n"})
+    record_task_result({"task_id": task.id, "status": 0, "output": "", "result": "1"})
+    record_task_log({"task_id": task.id, "sequence": 3, "output": "late\n"})
+
+    assert task.tasklog.log == "first\nsecond\nlate\n"
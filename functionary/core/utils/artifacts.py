@@ -0,0 +1,253 @@
+"""Content-addressed storage for task artifacts
+
+Large task results and the files that functions write to their output directory are
+stored outside of the database and the message broker. The runner writes them to the
+artifact store and only passes their digest along in the TASK_RESULT message. Each
+artifact is stored once under the sha256 digest of its content, so identical outputs
+across tasks share the same storage.
+
+The store used is configured through the ARTIFACT_STORE setting. LocalArtifactStore,
+which keeps the artifacts on a filesystem shared with the runners, is the default.
+Other backends can be provided by subclassing ArtifactStore.
+"""
+import hashlib
+import os
+import re
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class ArtifactNotFound(Exception):
+    """No artifact exists for the requested digest"""
+
+    pass
+
+
+class ArtifactStore:
+    """Interface for the artifact store backends"""
+
+    def put(self, stream: BinaryIO) -> Tuple[str, int]:
+        """Store the content read from the stream
+
+        Returns:
+            A tuple of the sha256 digest and the size of the content
+        """
+        raise NotImplementedError
+
+    def exists(self, digest: str) -> bool:
+        """Whether an artifact with the digest is stored"""
+        raise NotImplementedError
+
+    def size(self, digest: str) -> int:
+        """Returns the size of the artifact in bytes
+
+        Raises:
+            ArtifactNotFound: No artifact exists for the digest
+        """
+        raise NotImplementedError
+
+    def stream(
+        self, digest: str, start: int = 0, length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """Read the artifact content in chunks
+
+        Args:
+            digest: Digest of the artifact to read
+            start: Offset to start reading from
+            length: Number of bytes to read. Reads to the end if not provided.
+
+        Raises:
+            ArtifactNotFound: No artifact exists for the digest
+        """
+        raise NotImplementedError
+
+    def delete(self, digest: str) -> None:
+        """Remove the artifact, if it exists"""
+        raise NotImplementedError
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Stores artifacts as files in a local directory, fanned out into
+    subdirectories by the leading characters of the digest
+
+    Attributes:
+        root: Directory in which the artifacts are stored
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", digest):
+            raise ArtifactNotFound(f"Invalid artifact digest {digest}")
+
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, stream: BinaryIO) -> Tuple[str, int]:
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+
+        # Write to a temporary file first so that partially written content is never
+        # visible under a digest
+        with NamedTemporaryFile(dir=self.root, delete=False) as temp_file:
+            try:
+                while chunk := stream.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temp_file.name)
+                raise
+
+        digest = sha256.hexdigest()
+        path = self._path(digest)
+
+        if os.path.exists(path):
+            os.remove(temp_file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_file.name, path)
+
+        return digest, size
+
+    def exists(self, digest: str) -> bool:
+        try:
+            return os.path.exists(self._path(digest))
+        except ArtifactNotFound:
+            return False
+
+    def size(self, digest: str) -> int:
+        try:
+            return os.path.getsize(self._path(digest))
+        except FileNotFoundError:
+            raise ArtifactNotFound(f"No artifact found for {digest}")
+
+    def stream(
+        self, digest: str, start: int = 0, length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        try:
+            artifact = open(self._path(digest), "rb")
+        except FileNotFoundError:
+            raise ArtifactNotFound(f"No artifact found for {digest}")
+
+        return _read_chunks(artifact, start, length)
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.remove(self._path(digest))
+        except (ArtifactNotFound, FileNotFoundError):
+            pass
+
+
+def _read_chunks(
+    artifact: BinaryIO, start: int, length: Optional[int]
+) -> Iterator[bytes]:
+    with artifact:
+        artifact.seek(start)
+
+        while length is None or length > 0:
+            read_size = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length)
+
+            if not (chunk := artifact.read(read_size)):
+                break
+
+            if length is not None:
+                length -= len(chunk)
+
+            yield chunk
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Returns an instance of the configured artifact store backend"""
+    backend = import_string(settings.ARTIFACT_STORE["BACKEND"])
+
+    return backend(**settings.ARTIFACT_STORE.get("OPTIONS", {}))
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single byte range from a Range header
+
+    Args:
+        header: The value of the Range header, if any
+        size: Size of the content being requested
+
+    Returns:
+        A tuple of the first and last byte positions, inclusive, or None if the
+        header is absent or not a single byte range, in which case the whole content
+        should be returned.
+
+    Raises:
+        ValueError: The range can not be satisfied
+    """
+    if not header or not (match := _RANGE_PATTERN.match(header.strip())):
+        return None
+
+    first, last = match.groups()
+
+    if not first and not last:
+        return None
+    elif not first:
+        # A suffix range, requesting the final bytes of the content
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+
+    if first >= size or first > last:
+        raise ValueError(f"Range {header} not satisfiable for size {size}")
+
+    return first, last
+
+
+def artifact_response(
+    request: HttpRequest,
+    digest: str,
+    filename: str,
+    content_type: str = "application/octet-stream",
+) -> HttpResponse:
+    """Build a streaming response for downloading the artifact, honoring any single
+    byte range requested in the Range header
+
+    Raises:
+        ArtifactNotFound: No artifact exists for the digest
+    """
+    store = get_artifact_store()
+    size = store.size(digest)
+
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+
+        return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(
+            store.stream(digest), content_type=content_type
+        )
+        response["Content-Length"] = str(size)
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            store.stream(digest, first, last - first + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(last - first + 1)
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["ETag"] = f'"{digest}"'
+
+    return response
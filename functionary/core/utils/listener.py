@@ -1,11 +1,210 @@
 import json
 import logging
+from collections import OrderedDict
+from functools import partial
+from typing import Hashable, Optional
 
-from core.utils.messaging import build_connection
-from core.utils.tasking import record_task_result
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+
+from core.utils.messaging import (
+    RUNNER_STATUS_QUEUE,
+    TASK_RESULTS_QUEUE,
+    build_connection,
+)
+from core.utils.runners import (
+    record_runner_heartbeat,
+    record_runner_registration,
+    record_runner_unregistration,
+)
+from core.utils.tasking import (
+    OutOfOrderLog,
+    record_task_log,
+    record_task_result,
+    record_task_results,
+)
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before requeueing output that was received out of order
+REQUEUE_DELAY = 0.1
+
+# Seconds to wait before requeueing a message that could not be recorded
+RETRY_DELAY = 1
+
+# Errors that are caused by the database being unavailable, rather than by the
+# message. Messages that fail with these are requeued however many times they fail.
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+
+class Requeues:
+    """Counts the times that each message has been requeued by the listener
+
+    Messages are identified by their message_id, or by their body should they not
+    have one. Only the most recently requeued
+    messages are counted, so that messages that are handled by another listener
+    once requeued do not build up.
+
+    Attributes:
+        max_requeues: The number of times a message may be requeued
+        size: The number of messages to keep count of
+    """
+
+    def __init__(
+        self, max_requeues: int = settings.LISTENER_MAX_REQUEUES, size: int = 10000
+    ) -> None:
+        self.max_requeues = max_requeues
+        self.size = size
+        self._counts: OrderedDict[Hashable, int] = OrderedDict()
+
+    def requeue(self, key: Hashable) -> bool:
+        """Count a requeue of the message
+
+        Returns:
+            True if the message may be requeued, False if it has been requeued too
+            many times and should be dead lettered instead
+        """
+        count = self._counts.pop(key, 0) + 1
+
+        if count > self.max_requeues:
+            return False
+
+        self._counts[key] = count
+
+        while len(self._counts) > self.size:
+            self._counts.popitem(last=False)
+
+        return True
+
+    def forget(self, key: Hashable) -> None:
+        """Stop counting the requeues of a message once it has been handled"""
+        self._counts.pop(key, None)
+
+
+def _requeue(
+    channel,
+    delivery_tag: int,
+    key: Hashable,
+    requeues: Requeues,
+    delay: float = RETRY_DELAY,
+    counted: bool = True,
+) -> None:
+    """Requeue the message after delay seconds, or dead letter it once it has been
+    requeued max_requeues times. Requeues that are not counted do not count towards
+    that."""
+    if counted and not requeues.requeue(key):
+        logger.error("Dead lettering message after %s requeues", requeues.max_requeues)
+        channel.basic_nack(delivery_tag, requeue=False)
+        return
+
+    channel.connection.ioloop.call_later(
+        delay, partial(channel.basic_nack, delivery_tag, requeue=True)
+    )
+
+
+class ResultBatcher:
+    """Groups TASK_RESULT messages into batches that are recorded together
+
+    A batch is recorded once it holds batch_size results, or once linger seconds
+    have passed since its first result arrived. The messages of a batch are only
+    acknowledged once the batch has been committed. Should recording the batch fail,
+    its results are recorded one at a time, so that a single bad result does not hold
+    back the rest. Results that still can not be recorded are requeued, and are dead
+    lettered once they have been requeued too many times, unless the database was
+    unavailable.
+
+    Attributes:
+        channel: The channel the results are received on
+        batch_size: The maximum number of results to record at once
+        linger: Seconds to wait for a batch to fill before recording it
+        requeues: The count of the times each result has been requeued
+    """
+
+    def __init__(
+        self,
+        channel,
+        batch_size: int = settings.RESULT_BATCH_SIZE,
+        linger: float = settings.RESULT_BATCH_LINGER,
+        requeues: Optional[Requeues] = None,
+    ):
+        self.channel = channel
+        self.batch_size = batch_size
+        self.linger = linger
+        self.requeues = requeues or Requeues()
+        self._pending = []
+        self._timer = None
+
+    def add(self, delivery_tag: int, message: dict, key: Hashable = None) -> None:
+        """Add a result to the current batch, recording the batch if it is full
+
+        Args:
+            delivery_tag: The delivery tag of the result's message
+            message: The body of the TASK_RESULT message
+            key: Identifies the message when counting its requeues
+        """
+        self._pending.append((delivery_tag, message, key))
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.channel.connection.ioloop.call_later(
+                self.linger, self._on_linger
+            )
+
+    def _on_linger(self) -> None:
+        self._timer = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Record and acknowledge the results in the current batch"""
+        if self._timer is not None:
+            self.channel.connection.ioloop.remove_timeout(self._timer)
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+
+        if not pending:
+            return
+
+        try:
+            record_task_results([message for _, message, _ in pending])
+        except Exception as exc:
+            logger.warning(
+                "Unable to record batch of %s results: %s. Recording individually.",
+                len(pending),
+                exc,
+            )
+            self._record_individually(pending)
+            return
+
+        logger.debug("Recorded batch of %s results", len(pending))
+
+        for delivery_tag, _, key in pending:
+            self.requeues.forget(key)
+            self.channel.basic_ack(delivery_tag)
+
+    def _record_individually(self, pending: list[tuple[int, dict, Hashable]]) -> None:
+        for delivery_tag, message, key in pending:
+            try:
+                record_task_results([message])
+            except Exception as exc:
+                logger.error(
+                    "Error recording result for task %s: %s",
+                    message.get("task_id"),
+                    exc,
+                )
+                _requeue(
+                    self.channel,
+                    delivery_tag,
+                    key,
+                    self.requeues,
+                    counted=not isinstance(exc, UNAVAILABLE_ERRORS),
+                )
+                continue
+
+            self.requeues.forget(key)
+            self.channel.basic_ack(delivery_tag)
+
 
 def start_listening():
     logger.info("Starting listener")
@@ -30,12 +229,32 @@ def _on_channel_open(new_channel):
     """Called when our channel has opened"""
     logger.debug("Channel opened")
 
-    # TODO: Generalize this to support consuming of more than just tasking results
-    new_channel.basic_consume("tasking.results", _handle_delivery)
+    requeues = Requeues()
 
+    if settings.RESULT_BATCH_SIZE > 0:
+        batcher = ResultBatcher(new_channel, requeues=requeues)
+        new_channel.basic_qos(
+            prefetch_count=max(settings.RESULT_PREFETCH, settings.RESULT_BATCH_SIZE)
+        )
+    else:
+        batcher = None
 
-def _handle_delivery(channel, deliver, properties, body):
-    """Called when we receive a message from RabbitMQ"""
+    handler = partial(_handle_delivery, batcher=batcher, requeues=requeues)
+    new_channel.basic_consume(TASK_RESULTS_QUEUE, handler)
+    new_channel.basic_consume(RUNNER_STATUS_QUEUE, handler)
+
+
+def _handle_delivery(channel, deliver, properties, body, requeues, batcher=None):
+    """Called when we receive a message from RabbitMQ
+
+    TASK_RESULT messages are added to the batcher, when there is one, which
+    acknowledges them once they have been recorded. Otherwise they are handed off to
+    the celery workers.
+
+    Messages that can not be handled are requeued, and are dead lettered once they
+    have been requeued too many times.
+    """
+    key = properties.message_id or body
 
     # TODO: Implement handling of specific exceptions
     try:
@@ -45,11 +264,44 @@ def _handle_delivery(channel, deliver, properties, body):
         logger.info("Received message %s", msg_type)
 
         match msg_type:
+            case "TASK_LOG":
+                record_task_log(msg_body)
+            case "TASK_RESULT" if batcher is not None:
+                batcher.add(deliver.delivery_tag, msg_body, key)
+                return
             case "TASK_RESULT":
                 record_task_result.delay(msg_body)
+            case "RUNNER_REGISTER":
+                record_runner_registration(msg_body)
+            case "RUNNER_HEARTBEAT":
+                record_runner_heartbeat(msg_body)
+            case "RUNNER_UNREGISTER":
+                record_runner_unregistration(msg_body)
             case _:
                 logger.error("Unrecognized message type: %s", msg_type)
 
+        requeues.forget(key)
         channel.basic_ack(deliver.delivery_tag)
+    except OutOfOrderLog as exc:
+        # Give the earlier output a moment to be recorded before trying again. This
+        # is requeued far more often than the earlier output is retried, so it does
+        # not count towards dead lettering the message.
+        logger.debug("Requeueing message: %s", exc)
+
+        _requeue(
+            channel,
+            deliver.delivery_tag,
+            key,
+            requeues,
+            delay=REQUEUE_DELAY,
+            counted=False,
+        )
     except Exception as exc:
         logger.error("Error handling received message: %s", exc)
+        _requeue(
+            channel,
+            deliver.delivery_tag,
+            key,
+            requeues,
+            counted=not isinstance(exc, UNAVAILABLE_ERRORS),
+        )
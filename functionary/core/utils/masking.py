@@ -0,0 +1,72 @@
+"""Masking of protected variable values in task output
+
+The values to mask are taken from the environment's cached resolved variables, so
+that masking the output of a task does not need to query them.
+
+Each set of values to be masked is compiled into a single regular expression, which
+masks all of them in one pass over the output. Values are masked line by line, so
+that output can be masked a chunk at a time as it is streamed from the runner, which
+always splits the output on line boundaries.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable
+
+from core.models import Task
+
+MASK = "********"
+
+# Values this short are not masked. This is arbitrary, but masking them would be
+# easily reversed anyway.
+MIN_MASKED_LENGTH = 5
+
+MASKER_CACHE_SIZE = 256
+
+
+class Masker:
+    """Masks a set of values in text in a single pass
+
+    Values that span several lines are masked line by line. Where one value
+    contains another, the longer value is masked.
+    """
+
+    def __init__(self, values: Iterable[str]) -> None:
+        fragments = {
+            line
+            for value in values
+            for line in value.splitlines()
+            if len(line) >= MIN_MASKED_LENGTH
+        }
+
+        if fragments:
+            self._pattern = re.compile(
+                "|".join(
+                    re.escape(fragment)
+                    for fragment in sorted(fragments, key=len, reverse=True)
+                )
+            )
+        else:
+            self._pattern = None
+
+    def mask(self, text: str) -> str:
+        """Returns the text with the values masked"""
+        if self._pattern is None:
+            return text
+
+        return self._pattern.sub(MASK, text)
+
+
+@lru_cache(maxsize=MASKER_CACHE_SIZE)
+def _compile_masker(values: frozenset[str]) -> Masker:
+    return Masker(values)
+
+
+def get_masker(task: Task) -> Masker:
+    """Returns the masker for the protected variables of the task's function"""
+    return _compile_masker(
+        frozenset(
+            variable["value"]
+            for variable in task.resolved_variables.values()
+            if variable["protect"]
+        )
+    )
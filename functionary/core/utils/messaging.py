@@ -1,13 +1,30 @@
 import json
 import logging
+import re
 import ssl
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+from itertools import takewhile
+from os import getpid
+from queue import Empty, Queue
+from threading import Lock, Thread
 from time import sleep
-from typing import Tuple
+from typing import Iterable, Optional, Tuple
+from uuid import uuid4
 
 import pika
 from django.conf import settings
-from pika.exceptions import AMQPConnectionError, UnroutableError
+from django.db.models import F
+from pika.exceptions import (
+    AMQPConnectionError,
+    ChannelClosedByBroker,
+    NackError,
+    UnroutableError,
+)
 from pika.exchange_type import ExchangeType
+from pika.spec import PRECONDITION_FAILED, Basic
+
+from core.models import Environment, Package, Runner
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +32,24 @@ PUBLIC_EXCHANGE = "runners.public"
 PUBLIC_QUEUE = "public"
 TASK_RESULTS_QUEUE = "tasking.results"
 
+# Task results and output that the listener is unable to record are dead lettered to
+# TASK_RESULTS_DEAD_LETTER_EXCHANGE, where they are kept for inspection
+TASK_RESULTS_DEAD_LETTER_EXCHANGE = "tasking.results.dead-letter"
+TASK_RESULTS_DEAD_LETTER_QUEUE = "tasking.results.dead"
+RUNNER_STATUS_QUEUE = "runners.status"
+
+# Tasks are routed to the runner pools, and directly to individual runners, through
+# RUNNERS_EXCHANGE. Tasks sent directly to a runner that it does not pick up in time
+# are dead lettered to RUNNERS_FALLBACK_EXCHANGE, which routes them back to the pool.
+RUNNERS_EXCHANGE = "runners.pools"
+RUNNERS_FALLBACK_EXCHANGE = "runners.fallback"
+
+# Messages for every runner, such as requests to pre-warm an image, are published to
+# RUNNERS_BROADCAST_EXCHANGE, which each runner binds a queue of its own to
+RUNNERS_BROADCAST_EXCHANGE = "runners.broadcast"
+
+_declared_pools = set()
+
 
 def build_connection(ca=None, cert=None, key=None, open_callback=None):
     """Creates a connection to RabbitMQ.
@@ -57,25 +92,153 @@ def build_connection(ca=None, cert=None, key=None, open_callback=None):
         return pika.BlockingConnection(pika.ConnectionParameters(**connection_params))
 
 
-def get_route(task) -> Tuple[str, str]:
+def get_route(task, runners: Optional[list[Runner]] = None) -> Tuple[str, str]:
     """Determine the correct exchange and routing key for provided task
 
+    Tasks for a package with a runner_label must run in the pool for that label.
+    Otherwise they run in the pool for the task's environment, if a live runner is
+    serving it, or else in the public pool. Within the pool, the task is sent
+    directly to a runner that has a free slot and already has the package image, so
+    that the image does not need to be pulled. Failing that, the task is sent to the
+    pool's queue to be picked up by whichever runner is free first.
+
     Args:
         task: Task instance to determine routing information for
+        runners: The live runners, when routing several tasks at once. They are
+                 looked up if not provided.
 
     Returns:
         A tuple of strings: (exchange, routing_key)
     """
-    # TODO: Implement actual routing determination logic. For now, this always returns
-    #       the public runner pool exchange and routing key
-    return (PUBLIC_EXCHANGE, PUBLIC_QUEUE)
+    if runners is None:
+        runners = list(Runner.objects.alive())
+
+    package = task.function.package
+
+    if package.runner_label:
+        pool = label_pool(package.runner_label)
+    elif any(environment_pool(task.environment_id) in r.pools for r in runners):
+        pool = environment_pool(task.environment_id)
+    else:
+        pool = PUBLIC_QUEUE
+
+    _ensure_pool(pool)
+
+    if runner := _claim_cached_runner(runners, pool, package.full_image_name):
+        return (RUNNERS_EXCHANGE, f"runner.{routing_word(runner.name)}.{pool}")
+
+    return (RUNNERS_EXCHANGE, f"pool.{pool}")
+
+
+def _claim_cached_runner(
+    runners: list[Runner], pool: str, image: str
+) -> Optional[Runner]:
+    """Claim a free slot on the runner in the pool with the most free slots that
+    already has the image
+
+    The free slots reported in the runner's last heartbeat are decremented as tasks
+    are routed to it, so that tasks published between heartbeats are not all sent to
+    the same runner.
+    """
+    candidates = sorted(
+        (
+            runner
+            for runner in runners
+            if pool in runner.pools and image in runner.images and runner.free_slots
+        ),
+        key=lambda runner: runner.free_slots,
+        reverse=True,
+    )
+
+    for runner in candidates:
+        claimed = Runner.objects.filter(id=runner.id, free_slots__gt=0).update(
+            free_slots=F("free_slots") - 1
+        )
+
+        if claimed:
+            return runner
+
+    return None
+
+
+def routing_word(value: str) -> str:
+    """Make the value safe to use as a single word of a topic routing key"""
+    return re.sub(r"[^\w-]", "-", value)
+
+
+def environment_pool(environment_id) -> str:
+    """Name of the queue for the runner pool dedicated to the environment"""
+    return f"environment.{environment_id}"
+
+
+def label_pool(label: str) -> str:
+    """Name of the queue for the pool of runners with the label"""
+    return f"label.{routing_word(label)}"
+
+
+def declare_pool(channel, pool: str) -> None:
+    """Declare the queue for the runner pool and bind it to the runner exchanges"""
+    channel.queue_declare(pool, durable=True, auto_delete=False)
+    channel.queue_bind(pool, RUNNERS_EXCHANGE, routing_key=f"pool.{pool}")
+    channel.queue_bind(pool, RUNNERS_FALLBACK_EXCHANGE, routing_key=f"runner.*.{pool}")
+    _declared_pools.add(pool)
+
+
+def _ensure_pool(pool: str) -> None:
+    """Declare the pool if it was created after messaging was initialized, such as
+    for a new environment or runner label"""
+    if pool in _declared_pools:
+        return
+
+    connection = build_connection()
+
+    try:
+        declare_pool(connection.channel(), pool)
+    finally:
+        connection.close()
+
+
+def broadcast_image(package: Package) -> None:
+    """Ask the runners that serve the package's tasks to pull its image ahead of the
+    first task, so that the pull is not part of that task's run time
+
+    The PULL_IMAGE message is sent to every runner. Those that do not serve the
+    package's environment or runner label ignore it.
+
+    Args:
+        package: The package whose image was just built
+    """
+    message = {
+        "package": package.full_image_name,
+        "environment": str(package.environment_id),
+        "runner_label": package.runner_label,
+    }
+
+    try:
+        send_message(RUNNERS_BROADCAST_EXCHANGE, "", "PULL_IMAGE", message)
+    except UnroutableError:
+        logger.debug("No runners to pre-warm %s on", package.full_image_name)
+    except Exception as exc:
+        logger.warning("Unable to broadcast %s: %s", package.full_image_name, exc)
+
+
+def _publish_properties(msg_type: Optional[str]) -> pika.BasicProperties:
+    headers = {"x-msg-type": msg_type} if msg_type else {}
+
+    return pika.BasicProperties(
+        content_type="application/json",
+        content_encoding="utf-8",
+        headers=headers,
+        delivery_mode=1,
+    )
 
 
 def send_message(exchange, routing_key, msg_type, message):
     """Sends a JSON message to the specified queue.
 
     Sends the given message to the queue. If msg_type is populated, it
-    sets the x-msg-type header to that value.
+    sets the x-msg-type header to that value. This blocks until the broker has
+    confirmed the message.
 
     Args:
         exchange: The message broker exchange to send the message to
@@ -86,35 +249,106 @@ def send_message(exchange, routing_key, msg_type, message):
     Raises:
         pika.exceptions.UnroutableError: if unable to publish the message
     """
+    send_messages(exchange, [(routing_key, msg_type, message)])
 
-    headers = {"x-msg-type": msg_type} if msg_type else {}
 
-    # TODO Update this to use a persistent connection to the queue
-    publish_props = pika.BasicProperties(
-        content_type="application/json",
-        content_encoding="utf-8",
-        headers=headers,
-        delivery_mode=1,
-    )
+def publish_messages(
+    messages: Iterable[Tuple[str, str, Optional[str], dict]]
+) -> list[Future]:
+    """Queues a batch of JSON messages to be published, without waiting on the
+    broker to confirm them.
 
-    connection = build_connection()
-    channel = connection.channel()
-    channel.confirm_delivery()
+    Args:
+        messages: Iterable of (exchange, routing_key, msg_type, message) tuples
 
+    Returns:
+        A Future for each message, as returned by Publisher.publish
+    """
+    publisher = get_publisher()
+
+    return [
+        publisher.publish(
+            exchange,
+            routing_key,
+            json.dumps(message).encode(),
+            _publish_properties(msg_type),
+        )
+        for exchange, routing_key, msg_type, message in messages
+    ]
+
+
+def send_messages(exchange, messages: Iterable[Tuple[str, Optional[str], dict]]):
+    """Sends a batch of JSON messages to the specified exchange.
+
+    All of the messages are published before waiting on any of the confirms, so
+    the cost of a batch is close to that of a single message.
+
+    Args:
+        exchange: The message broker exchange to send the messages to
+        messages: Iterable of (routing_key, msg_type, message) tuples
+
+    Raises:
+        pika.exceptions.UnroutableError: if unable to publish any of the messages
+        pika.exceptions.NackError: if the broker rejected any of the messages
+        pika.exceptions.AMQPConnectionError: if the connection was lost before all
+            of the messages were confirmed
+        concurrent.futures.TimeoutError: if a message was not confirmed within
+            RABBITMQ_PUBLISH_TIMEOUT seconds. Any of the messages that were still
+            queued are not published.
+    """
+    messages = list(messages)
+    futures = publish_messages(
+        (exchange, routing_key, msg_type, message)
+        for routing_key, msg_type, message in messages
+    )
+
+    for (routing_key, _, _), future in zip(messages, futures):
+        try:
+            future.result(timeout=settings.RABBITMQ_PUBLISH_TIMEOUT)
+        except UnroutableError as ue:
+            # TODO revisit this and handle exceptions better. Currently used for retry
+            #      logic
+            logger.error("Failed to send message to %s using %s", exchange, routing_key)
+            raise ue
+        except TimeoutError:
+            cancel_pending(futures)
+            raise
+
+
+def declare_results_queue(connection, channel):
+    """Declare the task results queue, dead lettering to the results dead letter
+    exchange
+
+    A queue declared before dead lettering was added keeps its original arguments,
+    which the broker refuses to redeclare with the new ones. Such a queue is used as
+    is, until it has been drained and deleted so that it can be redeclared. The broker
+    closes the channel when refusing the declaration, so the channel to carry on with
+    is returned.
+    """
     try:
-        channel.basic_publish(
-            exchange=exchange,
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=publish_props,
-            mandatory=True,
+        channel.queue_declare(
+            TASK_RESULTS_QUEUE,
+            durable=True,
+            auto_delete=False,
+            arguments={"x-dead-letter-exchange": TASK_RESULTS_DEAD_LETTER_EXCHANGE},
         )
-    except UnroutableError as ue:
-        # TODO revisit this and handle exceptions better. Currently used for retry logic
-        logger.error("Failed to send message to %s using %s", exchange, routing_key)
-        raise ue
-    finally:
-        connection.close()
+    except ChannelClosedByBroker as exc:
+        if exc.reply_code != PRECONDITION_FAILED:
+            raise
+
+        logger.warning(
+            "Queue %s was declared without dead lettering, so results that cannot be "
+            "recorded will be discarded. Delete the queue once it has been drained, "
+            "or apply a policy setting its dead-letter-exchange to %s: %s",
+            TASK_RESULTS_QUEUE,
+            TASK_RESULTS_DEAD_LETTER_EXCHANGE,
+            exc.reply_text,
+        )
+
+        channel = connection.channel()
+        channel.queue_declare(TASK_RESULTS_QUEUE, passive=True)
+
+    return channel
 
 
 def initialize_messaging():
@@ -133,13 +367,276 @@ def initialize_messaging():
     channel.queue_declare(PUBLIC_QUEUE, durable=True, auto_delete=False)
     channel.queue_bind(PUBLIC_QUEUE, PUBLIC_EXCHANGE)
 
+    for exchange in [RUNNERS_EXCHANGE, RUNNERS_FALLBACK_EXCHANGE]:
+        logger.debug("Configuring rabbitmq exchange: %s", exchange)
+        channel.exchange_declare(
+            exchange,
+            exchange_type=ExchangeType.topic,
+            durable=True,
+            auto_delete=False,
+        )
+
+    logger.debug("Configuring rabbitmq exchange: %s", RUNNERS_BROADCAST_EXCHANGE)
+    channel.exchange_declare(
+        RUNNERS_BROADCAST_EXCHANGE,
+        exchange_type=ExchangeType.fanout,
+        durable=True,
+        auto_delete=False,
+    )
+
+    pools = [PUBLIC_QUEUE]
+    environments = Environment.objects.values_list("id", flat=True)
+    labels = (
+        Package.objects.exclude(runner_label__isnull=True)
+        .exclude(runner_label="")
+        .values_list("runner_label", flat=True)
+        .distinct()
+    )
+    pools += [environment_pool(environment) for environment in environments]
+    pools += [label_pool(label) for label in labels]
+
+    for pool in pools:
+        logger.debug("Configuring rabbitmq runner pool: %s", pool)
+        declare_pool(channel, pool)
+
+    logger.debug("Configuring rabbitmq exchange: %s", TASK_RESULTS_DEAD_LETTER_EXCHANGE)
+    channel.exchange_declare(
+        TASK_RESULTS_DEAD_LETTER_EXCHANGE,
+        exchange_type=ExchangeType.fanout,
+        durable=True,
+        auto_delete=False,
+    )
+    channel.queue_declare(
+        TASK_RESULTS_DEAD_LETTER_QUEUE, durable=True, auto_delete=False
+    )
+    channel.queue_bind(
+        TASK_RESULTS_DEAD_LETTER_QUEUE, TASK_RESULTS_DEAD_LETTER_EXCHANGE
+    )
+
     logger.debug("Configuring rabbitmq queue: %s", TASK_RESULTS_QUEUE)
-    channel.queue_declare(TASK_RESULTS_QUEUE, durable=True, auto_delete=False)
+    channel = declare_results_queue(connection, channel)
+
+    # Runner status messages are only of use until the runner's next heartbeat, so
+    # they are discarded rather than left to build up while the listener is down
+    logger.debug("Configuring rabbitmq queue: %s", RUNNER_STATUS_QUEUE)
+    channel.queue_declare(
+        RUNNER_STATUS_QUEUE,
+        durable=True,
+        auto_delete=False,
+        arguments={"x-message-ttl": settings.RUNNER_HEARTBEAT_EXPIRY * 1000},
+    )
 
     channel.close()
     connection.close()
 
 
+def cancel_pending(futures: Iterable[Future]) -> None:
+    """Cancel the publishing of any of the messages that are still queued. Messages
+    that have already been published are unaffected."""
+    for future in futures:
+        future.cancel()
+
+
+class Publisher:
+    """Publishes messages over a long-lived connection to the message broker
+
+    The connection is owned by a background thread, which publishes any queued
+    messages in batches and collects the publisher confirms for them asynchronously.
+    Each call to publish() returns a Future that is resolved once the broker confirms
+    the message, allowing callers to publish a burst of messages and then wait on the
+    confirms for all of them together. If the connection is lost, any unconfirmed
+    messages are failed and the connection is re-established for the messages that
+    remain queued.
+
+    Use get_publisher() rather than instantiating this directly, so that there is one
+    Publisher per process.
+
+    The runner and the core are packaged separately, so this class is duplicated in
+    runner/messaging.py and core/utils/messaging.py. Keep the two in step.
+
+    Attributes:
+        batch_size: The maximum number of messages to publish per batch
+        linger: Seconds to wait for more messages to arrive before publishing a batch
+    """
+
+    def __init__(self, batch_size: int = 100, linger: float = 0) -> None:
+        self.batch_size = batch_size
+        self.linger = linger
+        self._messages: Queue = Queue()
+        self._connection = None
+        self._channel = None
+        self._drain_scheduled = False
+        self._unconfirmed: OrderedDict[int, Tuple[str, Future]] = OrderedDict()
+        self._returned: set[str] = set()
+        self._delivery_tag = 0
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: pika.BasicProperties,
+        mandatory: bool = True,
+    ) -> Future:
+        """Queue a message to be published
+
+        Returns:
+            A Future that resolves to None once the broker has confirmed the message.
+            The Future raises UnroutableError if the message could not be routed,
+            NackError if the broker rejected it, or AMQPConnectionError if the
+            connection was lost before it was confirmed.
+        """
+        self._ensure_started()
+
+        future = Future()
+        properties.message_id = properties.message_id or str(uuid4())
+        self._messages.put(
+            (future, (exchange, routing_key, body, properties, mandatory))
+        )
+
+        if (connection := self._connection) is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._schedule_drain)
+            except Exception:
+                # The connection is closing. The message will be published once
+                # it has been re-established.
+                pass
+
+        return future
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(
+                    target=self._run, name="message publisher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Maintain the connection to the broker, reconnecting whenever it is lost"""
+        while True:
+            connection = build_connection(open_callback=self._on_connection_open)
+            connection.add_on_open_error_callback(self._on_connection_closed)
+            connection.add_on_close_callback(self._on_connection_closed)
+            self._connection = connection
+
+            connection.ioloop.start()
+
+            logger.info("Publisher connection lost. Reconnecting in 5s.")
+            sleep(5)
+
+    def _on_connection_open(self, connection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel) -> None:
+        channel.add_on_return_callback(self._on_message_returned)
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_delivery_confirmation)
+
+        self._delivery_tag = 0
+        self._channel = channel
+        self._schedule_drain()
+
+    def _on_channel_closed(self, channel, reason) -> None:
+        logger.warning("Publisher channel closed: %s", reason)
+        self._channel = None
+
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_connection_closed(self, connection, reason) -> None:
+        self._connection = None
+        self._channel = None
+        self._drain_scheduled = False
+
+        for _, future in self._unconfirmed.values():
+            future.set_exception(AMQPConnectionError(reason))
+
+        self._unconfirmed.clear()
+        self._returned.clear()
+        connection.ioloop.stop()
+
+    def _schedule_drain(self) -> None:
+        """Publish the queued messages, after waiting linger seconds for more to
+        arrive"""
+        if self._drain_scheduled:
+            return
+
+        self._drain_scheduled = True
+        self._connection.ioloop.call_later(self.linger, self._drain)
+
+    def _drain(self) -> None:
+        self._drain_scheduled = False
+
+        if self._channel is None:
+            return
+
+        for _ in range(self.batch_size):
+            try:
+                future, message = self._messages.get_nowait()
+            except Empty:
+                return
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self._channel.basic_publish(*message)
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = (message[3].message_id, future)
+
+        # Batch size was reached with messages still queued
+        self._schedule_drain()
+
+    def _on_message_returned(self, channel, method, properties, body) -> None:
+        """Called for mandatory messages that could not be routed. The confirm for
+        the message follows, at which point its Future is failed."""
+        self._returned.add(properties.message_id)
+
+    def _on_delivery_confirmation(self, frame) -> None:
+        """Resolve the Futures of the messages covered by the confirm"""
+        method = frame.method
+        confirmed = (
+            list(takewhile(lambda tag: tag <= method.delivery_tag, self._unconfirmed))
+            if method.multiple
+            else [method.delivery_tag]
+        )
+
+        for tag in confirmed:
+            if (unconfirmed := self._unconfirmed.pop(tag, None)) is None:
+                continue
+
+            message_id, future = unconfirmed
+
+            if isinstance(method, Basic.Nack):
+                future.set_exception(NackError([message_id]))
+            elif message_id in self._returned:
+                self._returned.discard(message_id)
+                future.set_exception(UnroutableError([message_id]))
+            else:
+                future.set_result(None)
+
+
+def get_publisher() -> Publisher:
+    """Returns the Publisher for the current process"""
+    global _publisher, _publisher_pid
+
+    # Connections can not be shared with forked processes, such as celery workers
+    if _publisher is None or _publisher_pid != getpid():
+        _publisher = Publisher(
+            batch_size=settings.RABBITMQ_PUBLISH_BATCH_SIZE,
+            linger=settings.RABBITMQ_PUBLISH_LINGER_MS / 1000,
+        )
+        _publisher_pid = getpid()
+
+    return _publisher
+
+
+_publisher: Optional[Publisher] = None
+_publisher_pid: Optional[int] = None
+
+
 def connection_ready() -> bool:
     """Determine if we are able to connect to the message broker
 
@@ -0,0 +1,135 @@
+"""Outbox relay
+
+Tasking messages are not published by the request that creates the task. Instead,
+queue_task writes the message to the OutboxMessage table in the transaction that
+creates the task, and the outbox relay publishes the committed messages to the runners
+in batches. This guarantees that a runner never receives a task before it has been
+committed, and that a task is never committed without its message being published.
+
+Several relays may run at once. Each batch is claimed with SELECT ... FOR UPDATE SKIP
+LOCKED, on databases that support it, and marked as claimed for OUTBOX_CLAIM_TIMEOUT
+seconds, so that no message is published by more than one relay. The messages are
+then published outside of that transaction, so that the rows are not held locked
+while waiting on the broker. Should a relay stop before it has published its batch,
+the messages are claimed by another relay once its claim has expired.
+"""
+import logging
+from datetime import timedelta
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import OutboxMessage, Runner
+from core.utils.messaging import cancel_pending, get_route, publish_messages
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 30
+
+
+def relay_outbox(batch_size: int = settings.OUTBOX_BATCH_SIZE) -> int:
+    """Publish a batch of the oldest messages in the outbox
+
+    The routes of all of the messages in the batch are resolved before any of them
+    are published. Messages are deleted once the broker has confirmed them. Any that
+    were not confirmed are released, to be retried with the next batch.
+
+    Args:
+        batch_size: The maximum number of messages to publish
+
+    Returns:
+        The number of messages that were published
+    """
+    entries = _claim(batch_size)
+
+    if not entries:
+        return 0
+
+    try:
+        runners = list(Runner.objects.alive())
+        routes = [get_route(entry.task, runners) for entry in entries]
+    except Exception:
+        _release(entries)
+        raise
+
+    futures = publish_messages(
+        (*route, "TASK_PACKAGE", entry.message) for entry, route in zip(entries, routes)
+    )
+    deadline = monotonic() + settings.RABBITMQ_PUBLISH_TIMEOUT
+    published = []
+    unpublished = []
+
+    for entry, future in zip(entries, futures):
+        try:
+            future.result(timeout=max(deadline - monotonic(), 0))
+            published.append(entry)
+        except Exception as exc:
+            logger.warning("Unable to publish task %s: %s", entry.task_id, exc)
+            unpublished.append(entry)
+
+    cancel_pending(futures)
+    OutboxMessage.objects.filter(id__in=[entry.id for entry in published]).delete()
+    _release(unpublished)
+
+    logger.debug("Published %s of %s tasks", len(published), len(entries))
+
+    if not published:
+        raise RuntimeError(f"None of the {len(entries)} tasks could be published")
+
+    return len(published)
+
+
+def _claim(batch_size: int) -> list[OutboxMessage]:
+    """Claim the oldest messages that are not claimed by another relay"""
+    now = timezone.now()
+
+    with transaction.atomic():
+        entries = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .select_related("task__function__package")
+            .order_by("id")[:batch_size]
+        )
+
+        OutboxMessage.objects.filter(id__in=[entry.id for entry in entries]).update(
+            claimed_until=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+        )
+
+    return entries
+
+
+def _release(entries: list[OutboxMessage]) -> None:
+    """Release the claim on the messages, so that they are published again"""
+    OutboxMessage.objects.filter(id__in=[entry.id for entry in entries]).update(
+        claimed_until=None
+    )
+
+
+def start_relay(
+    batch_size: int = settings.OUTBOX_BATCH_SIZE,
+    interval: float = settings.OUTBOX_POLL_INTERVAL,
+) -> None:
+    """Relay the outbox until interrupted
+
+    Batches are published back to back while the outbox is backed up. Once it is
+    empty, the relay polls it every interval seconds. Should publishing fail, the
+    relay backs off before trying again, up to MAX_BACKOFF seconds.
+    """
+    logger.info("Starting outbox relay")
+    backoff = 0
+
+    while True:
+        try:
+            published = relay_outbox(batch_size)
+            backoff = 0
+        except Exception as exc:
+            backoff = min(backoff * 2 or 1, MAX_BACKOFF)
+            logger.warning("Outbox relay failed: %s. Retrying in %ss.", exc, backoff)
+            sleep(backoff)
+            continue
+
+        if published < batch_size:
+            sleep(interval)
@@ -0,0 +1,153 @@
+"""Keyset pagination helpers
+
+Listings of tasks, builds and workflow runs grow without bound, so rather than paging
+through them with OFFSET, which scans every skipped row, they are paged by keyset on
+(created_at, id), newest first. Within an environment, this is served by the
+(environment, created_at) indexes on those models.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from functools import cached_property
+from typing import Any, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+
+ORDERING = ("-created_at", "-id")
+
+
+def encode_cursor(obj: Model) -> str:
+    """Returns the cursor positioned at the given object"""
+    position = json.dumps([obj.created_at.isoformat(), str(obj.pk)])
+
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[datetime, str]]:
+    """Returns the created_at and id of the cursor's position, or None if the cursor
+    is invalid"""
+    try:
+        created_at, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), pk
+    except (BinasciiError, TypeError, ValueError):
+        return None
+
+
+def after(queryset: QuerySet, created_at: datetime, pk: str) -> QuerySet:
+    """Filters the queryset to the objects that come after the position, newest
+    first"""
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+    ).order_by(*ORDERING)
+
+
+def before(queryset: QuerySet, created_at: datetime, pk: str) -> QuerySet:
+    """Filters the queryset to the objects that come before the position, nearest
+    first"""
+    return queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+    ).order_by("created_at", "id")
+
+
+def estimated_count(queryset: QuerySet) -> int:
+    """Returns the number of rows the query planner estimates the queryset holds
+
+    This avoids the full scan of a COUNT(*). On databases other than PostgreSQL, the
+    rows are counted.
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CursorPage:
+    """A page of a queryset, fetched by keyset rather than by page number
+
+    Attributes:
+        object_list: The objects on the page, newest first
+        has_next: Whether there are older objects after the page
+        has_previous: Whether there are newer objects before the page
+        next_cursor: Cursor for the page after this one
+        previous_cursor: Cursor for the page before this one
+        count: Estimated number of objects in the queryset, see estimated_count. This
+               is only estimated when it is first used.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        page_size: int,
+        after_cursor: Optional[str] = None,
+        before_cursor: Optional[str] = None,
+    ) -> None:
+        self._queryset = queryset
+
+        if position := self._position(before_cursor):
+            objects = list(before(queryset, *position)[: page_size + 1])
+            self.has_previous = len(objects) > page_size
+            self.has_next = True
+            self.object_list = objects[:page_size][::-1]
+        else:
+            position = self._position(after_cursor)
+
+            if position:
+                queryset = after(queryset, *position)
+            else:
+                queryset = queryset.order_by(*ORDERING)
+
+            objects = list(queryset[: page_size + 1])
+            self.has_previous = position is not None
+            self.has_next = len(objects) > page_size
+            self.object_list = objects[:page_size]
+
+        self.next_cursor = (
+            encode_cursor(self.object_list[-1])
+            if self.has_next and self.object_list
+            else None
+        )
+        self.previous_cursor = (
+            encode_cursor(self.object_list[0])
+            if self.has_previous and self.object_list
+            else None
+        )
+
+    @cached_property
+    def count(self) -> int:
+        return estimated_count(self._queryset)
+
+    def _position(self, cursor: Optional[str]) -> Optional[tuple[datetime, Any]]:
+        """Returns the position of the cursor, or None if there is no cursor or it
+        is invalid, including when its id is not valid for the queryset's model"""
+        if not cursor or (position := decode_cursor(cursor)) is None:
+            return None
+
+        created_at, pk = position
+
+        try:
+            return created_at, self._queryset.model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
@@ -0,0 +1,57 @@
+import logging
+
+from django.utils import timezone
+
+from core.models import Runner
+
+logger = logging.getLogger(__name__)
+
+
+def record_runner_registration(message: dict) -> Runner:
+    """Register the runner described in the RUNNER_REGISTER message, replacing any
+    previous registration under the same name"""
+    now = timezone.now()
+    runner, created = Runner.objects.update_or_create(
+        name=message["name"],
+        defaults={
+            **_runner_status(message),
+            "registered_at": now,
+            "last_heartbeat": now,
+        },
+    )
+
+    logger.info("%s runner %s", "Registered" if created else "Re-registered", runner)
+
+    return runner
+
+
+def record_runner_heartbeat(message: dict) -> Runner:
+    """Update the status of the runner from the RUNNER_HEARTBEAT message. A heartbeat
+    from a runner that is not registered, such as after the core has removed it,
+    registers it."""
+    runner, created = Runner.objects.update_or_create(
+        name=message["name"],
+        defaults={**_runner_status(message), "last_heartbeat": timezone.now()},
+    )
+
+    if created:
+        logger.info("Registered runner %s from heartbeat", runner)
+
+    return runner
+
+
+def record_runner_unregistration(message: dict) -> None:
+    """Remove the runner, which has shut down"""
+    Runner.objects.filter(name=message["name"]).delete()
+
+    logger.info("Unregistered runner %s", message["name"])
+
+
+def _runner_status(message: dict) -> dict:
+    return {
+        "concurrency": message.get("concurrency", 0),
+        "free_slots": message.get("free_slots", 0),
+        "images": message.get("images", []),
+        "labels": message.get("labels", []),
+        "pools": message.get("pools", []),
+    }
@@ -1,5 +1,11 @@
-from copy import deepcopy
-from json import JSONDecodeError, dumps
+import hashlib
+from collections import OrderedDict
+from json import dumps
+from threading import Lock
+from typing import Any
+
+import jsonschema
+from django.conf import settings
 
 # Place helper methods for serializing data that is used by the models in here
 # Don't import any models to prevent cyclic module dependencies
@@ -8,14 +14,9 @@ from json import JSONDecodeError, dumps
 def serialize_parameters(parameters: dict, schema: dict) -> dict:
     """JSON stringify parameters which are supposed to be JSON formatted strings
 
-    Iterate throw the given schema to find any function arguments that
-    could be JSON formatted strings. If so, dump the value of that argument
-    into a JSON string, and overwrite that value in a deep copy of the
-    given parameters dictionary.
-    Perform the same logic if the function argument can be multiple different
-    types, as indicated by 'anyOf'.
-    Returns a deep copy of the parameters that contains all of the serialized
-    JSON fields.
+    Use the given schema to find any function arguments that could be JSON formatted
+    strings, including those that can be one of multiple types, as indicated by
+    'anyOf'. The values of those arguments are dumped into JSON strings.
 
     NOTE: This function does not handle nested schemas past the function
     argument->anyOf[{}, {}, ...]. If the function schemas need to include more
@@ -29,35 +30,118 @@ def serialize_parameters(parameters: dict, schema: dict) -> dict:
     Returns:
         parameters: A new dictionary that contains all of the serialized
             function arguments.
-
-    Raises:
-        JSONDecodeError: If a parameter is not valid JSON, a JSONDecodeError will
-            be raised.
     """
+    return _serialize(parameters, _json_fields(schema))
+
+
+def _serialize(parameters: dict, json_fields: tuple[str, ...]) -> dict:
+    """Returns a shallow copy of the parameters with the json_fields dumped to JSON
+    strings. The parameters themselves are left untouched."""
     if not parameters:
         return {}
 
-    parameters_copy = deepcopy(parameters)
-    try:
-        for arg, param_type in schema["properties"].items():
-            if union_type_param := param_type.get("anyOf"):
-                _serialize_union_parameters(arg, union_type_param, parameters_copy)
-            else:
-                if _is_json_field(param_type):
-                    parameters_copy[arg] = dumps(parameters_copy[arg])
-        return parameters_copy
-    except JSONDecodeError as err:
-        raise err
+    serialized = dict(parameters)
+
+    for arg in json_fields:
+        if arg in serialized:
+            serialized[arg] = dumps(serialized[arg])
 
+    return serialized
 
-def _serialize_union_parameters(
-    arg: str, union_type_param: dict, parameters: dict
-) -> None:
-    """Mutate given parameters dictionary to json stringify the parameters"""
-    for param_type in union_type_param:
-        if _is_json_field(param_type):
-            parameters[arg] = dumps(parameters[arg])
+
+def _json_fields(schema: dict) -> tuple[str, ...]:
+    """Returns the names of the function arguments that are JSON formatted strings"""
+    json_fields = []
+
+    for arg, param_type in schema.get("properties", {}).items():
+        param_types = param_type.get("anyOf") or [param_type]
+
+        if any(_is_json_field(union_type) for union_type in param_types):
+            json_fields.append(arg)
+
+    return tuple(json_fields)
 
 
 def _is_json_field(param: dict) -> bool:
     return "json-string" == param.get("format")
+
+
+class ParameterValidator:
+    """A function schema, compiled for validating the parameters of its tasks
+
+    The schema is checked against its metaschema once, when the validator is built,
+    and the arguments that need to be serialized to JSON strings before validation
+    are found up front.
+
+    Attributes:
+        json_fields: The arguments that are JSON formatted strings
+    """
+
+    def __init__(self, schema: dict) -> None:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+
+        self.json_fields = _json_fields(schema)
+        self._validator = validator_class(schema)
+
+    def validate(self, parameters: dict) -> None:
+        """Validate the parameters against the schema, after serializing any JSON
+        formatted string arguments
+
+        Raises:
+            jsonschema.ValidationError: The parameters do not conform to the schema
+        """
+        error = jsonschema.exceptions.best_match(
+            self._validator.iter_errors(_serialize(parameters, self.json_fields))
+        )
+
+        if error is not None:
+            raise error
+
+
+class _ValidatorCache:
+    """A thread safe, least recently used cache of compiled validators"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._validators: OrderedDict[Any, ParameterValidator] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Any, schema: dict) -> ParameterValidator:
+        with self._lock:
+            if (validator := self._validators.get(key)) is not None:
+                self._validators.move_to_end(key)
+                return validator
+
+        # Compile outside of the lock, as it is the slow part. Should two threads
+        # compile the same schema at once, the second result simply replaces the first.
+        validator = ParameterValidator(schema)
+
+        with self._lock:
+            self._validators[key] = validator
+
+            while len(self._validators) > self.maxsize:
+                self._validators.popitem(last=False)
+
+        return validator
+
+
+_validators = _ValidatorCache(settings.PARAMETER_VALIDATOR_CACHE_SIZE)
+
+
+def get_validator(function_id: Any, schema: dict) -> ParameterValidator:
+    """Returns the compiled validator for a function's schema
+
+    Validators are cached by the function id and a hash of the schema, so a function
+    whose schema has changed gets a new validator.
+
+    Args:
+        function_id: The id of the function the schema belongs to
+        schema: The function's schema
+
+    Returns:
+        The validator for the schema
+    """
+    schema_hash = hashlib.sha256(dumps(schema, sort_keys=True).encode()).hexdigest()
+
+    return _validators.get((function_id, schema_hash), schema)
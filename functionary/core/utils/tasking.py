@@ -1,99 +1,277 @@
 import logging
-from uuid import UUID
+from typing import Union
 
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
 
 from core.celery import app
-from core.models import ScheduledTask, Task, TaskLog, TaskResult, WorkflowRunStep
-from core.utils.messaging import get_route, send_message
+from core.models import (
+    OutboxMessage,
+    ScheduledTask,
+    Task,
+    TaskArtifact,
+    TaskLog,
+    TaskResourceUsage,
+    TaskResult,
+    WorkflowRunStep,
+)
+from core.utils.masking import get_masker
 
 logger = get_task_logger(__name__)
 logger.setLevel(getattr(logging, settings.LOG_LEVEL))
 
 
+class OutOfOrderLog(Exception):
+    """A chunk of a task's output was received ahead of an earlier chunk"""
+
+
 def _generate_task_message(task: Task) -> dict:
     """Generates tasking message from the provided Task"""
-    variables = {var.name: var.value for var in task.variables}
+    variables = {
+        name: variable["value"] for name, variable in task.resolved_variables.items()
+    }
     return {
         "id": str(task.id),
         "package": task.function.package.full_image_name,
         "function": task.function.name,
         "function_parameters": task.parameters,
         "variables": variables,
+        "timeout": task.function.timeout or settings.TASK_DEFAULT_TIMEOUT,
+        "executor": task.function.package.resolved_executor,
+        "language": task.function.package.language,
+        "source": task.function.package.source_digest,
     }
 
 
-def _protect_output(task, output):
-    """Mask the values of the tasks protected variables in the output.
+def queue_task(task: Task) -> None:
+    """Write the tasking message for the task to the outbox, from which the outbox
+    relay publishes it to the runners.
 
-    Does a simple protection for variable values over 4 characters
-    long. This is arbitrary, but the results are easily reversed if
-    its too short.
+    This must be called in the transaction that creates the task, so that the message
+    is only published once the task has been committed.
+
+    Args:
+        task: The task to be executed
     """
-    mask = list(task.variables.filter(protect=True).values_list("value", flat=True))
-    protected_output = output
-    for to_mask in mask:
-        if len(to_mask) > 4:
-            protected_output = protected_output.replace(to_mask, "********")
+    logger.debug(f"Queueing message for Task: {task.id}")
 
-    return protected_output
+    OutboxMessage.objects.create(task=task, message=_generate_task_message(task))
 
 
-@app.task(
-    default_retry_delay=30,
-    retry_kwargs={
-        "max_retries": 3,
-    },
-    autoretry_for=(Exception,),
-)
-def publish_task(task_id: UUID) -> None:
-    """Publish the tasking message to the message broker so that it can be received
-    and executed by a runner.
+@app.task()
+def record_task_result(task_result_message: dict) -> None:
+    """Parses the task result message and generates a TaskResult entry for it
 
     Args:
-        task_id: ID of the task to be executed
+        task_result_message: The message body from a TASK_RESULT message.
     """
-    logger.debug(f"Publishing message for Task: {task_id}")
+    record_task_results([task_result_message])
 
-    task = Task.objects.select_related(
-        "function", "function__package", "environment"
-    ).get(id=task_id)
 
-    exchange, routing_key = get_route(task)
-    send_message(exchange, routing_key, "TASK_PACKAGE", _generate_task_message(task))
+def record_task_results(task_result_messages: list[dict]) -> None:
+    """Records the results of a batch of tasks in a single transaction
 
+    Large results are not included in the messages. Instead, a message holds a
+    result_artifact reference to the result in the artifact store. Any files the
+    task wrote to its output directory are listed under artifacts, and the resources
+    the runner measured the task using are under resources.
 
-@app.task()
-def record_task_result(task_result_message: dict) -> None:
-    """Parses the task result message and generates a TaskResult entry for it
+    The logs, results, artifacts and statuses of the tasks are written with bulk
+    queries, so the number of queries does not grow with the size of the batch, other
+    than for tasks that are part of a WorkflowRun.
+
+    Recording is idempotent. The tasks are locked while their results are recorded,
+    and the results of any task that already has a TaskResult are skipped, so results
+    that are delivered more than once, or to several listeners, are only recorded
+    once.
 
     Args:
-        task_result_message: The message body from a TASK_RESULT message.
+        task_result_messages: The message bodies from TASK_RESULT messages.
     """
-    task_id = task_result_message["task_id"]
-    status = task_result_message["status"]
-    output = task_result_message["output"]
-    result = task_result_message["result"]
+    messages = {}
+
+    for message in task_result_messages:
+        messages.setdefault(str(message["task_id"]), message)
+
+    with transaction.atomic():
+        # Lock the tasks, in a consistent order, so that a result being recorded by
+        # another listener at the same time is seen as already recorded
+        tasks = {
+            str(task.id): task
+            for task in Task.objects.select_for_update(of=("self",))
+            .select_related("function", "environment", "scheduled_task")
+            .filter(id__in=list(messages))
+            .order_by("id")
+        }
+        already_recorded = set(
+            TaskResult.objects.filter(task__in=tasks.values()).values_list(
+                "task_id", flat=True
+            )
+        )
+
+        for task_id in list(tasks):
+            if tasks[task_id].id in already_recorded:
+                logger.info("Results for task %s already recorded", task_id)
+                del messages[task_id], tasks[task_id]
+
+        task_logs = TaskLog.objects.in_bulk([task.id for task in tasks.values()])
+        maskers = {}
+        new_logs, updated_logs, results, artifacts, usages = [], [], [], [], []
+        now = timezone.now()
+
+        for task_id, message in messages.items():
+            if (task := tasks.get(task_id)) is None:
+                logger.error(
+                    "Unable to record results for task %s: task not found", task_id
+                )
+                continue
+
+            key = (task.environment_id, task.function_id)
+            if key not in maskers:
+                maskers[key] = get_masker(task)
+            output = maskers[key].mask(message["output"])
+
+            if (task_log := task_logs.get(task.id)) is not None:
+                task_log.log = Concat(F("log"), Value(output))
+                updated_logs.append(task_log)
+            else:
+                new_logs.append(TaskLog(task=task, log=output))
+
+            if result_artifact := message.get("result_artifact"):
+                results.append(
+                    TaskResult(
+                        task=task,
+                        digest=result_artifact["digest"],
+                        size=result_artifact["size"],
+                    )
+                )
+            else:
+                results.append(TaskResult(task=task, result=message["result"]))
+
+            artifacts.extend(
+                TaskArtifact(
+                    task=task,
+                    name=artifact["name"],
+                    digest=artifact["digest"],
+                    size=artifact["size"],
+                )
+                for artifact in message.get("artifacts", [])
+            )
+
+            if resources := message.get("resources"):
+                usages.append(_resource_usage(task, resources))
+
+            # TODO: This status determination feels like it belongs in the runner.
+            #       This should be reworked so that there are explicitly known
+            #       statuses that could come back from the runner, rather than
+            #       passing through the command exit status as is happening now.
+            task.status = _task_status(message["status"])
+            task.updated_at = now
+
+        recorded = {task_id: tasks[task_id] for task_id in messages if task_id in tasks}
+
+        TaskLog.objects.bulk_create(new_logs)
+        TaskLog.objects.bulk_update(updated_logs, ["log"])
+        TaskResult.objects.bulk_create(results)
+        TaskArtifact.objects.bulk_create(artifacts)
+        TaskResourceUsage.objects.bulk_create(usages)
+        Task.objects.bulk_update(recorded.values(), ["status", "updated_at"])
+
+        for task_id, task in recorded.items():
+            if (
+                task.scheduled_task is not None
+                and messages[task_id]["status"] == "ERROR"
+            ):
+                task.scheduled_task.error()
+
+        # Continue or update the status of any WorkflowRuns the tasks are part of
+        for workflow_run_step in WorkflowRunStep.objects.filter(
+            task__in=recorded.values()
+        ).select_related("workflow_run", "workflow_step"):
+            _handle_workflow_run(
+                workflow_run_step, recorded[str(workflow_run_step.task_id)]
+            )
+
+
+def _resource_usage(task: Task, resources: dict) -> TaskResourceUsage:
+    """Build the resource usage reported for the task, ignoring any measurements
+    that are not known"""
+    fields = {
+        field.name: resources.get(field.name)
+        for field in TaskResourceUsage._meta.concrete_fields
+        if field.name in resources and field.editable and not field.primary_key
+    }
 
-    try:
-        task = Task.objects.select_related("function", "environment").get(id=task_id)
-    except Task.DoesNotExist:
-        logger.error("Unable to record results for task %s: task not found", task_id)
-        return
+    return TaskResourceUsage(task=task, **fields)
 
-    TaskLog.objects.create(task=task, log=_protect_output(task, output))
-    TaskResult.objects.create(task=task, result=result)
 
-    # TODO: This status determination feels like it belongs in the runner. This should
-    #       be reworked so that there are explicitly known statuses that could come
-    #       back from the runner, rather than passing through the command exit status
-    #       as is happening now.
-    _update_task_status(task, status)
+def record_task_log(task_log_message: dict) -> None:
+    """Appends a chunk of output streamed from a running task to its TaskLog
 
-    # If this task is part of a WorkflowRun continue it or update its status
-    if workflow_run_step := WorkflowRunStep.objects.filter(task=task):
-        _handle_workflow_run(workflow_run_step.get(), task)
+    The chunks for a task are sent in order and ahead of its TASK_RESULT, so this is
+    called directly by the listener rather than being handed off to a worker, which
+    could otherwise record them out of order.
+
+    Each chunk carries a sequence number, and the TaskLog records the last one that
+    was appended, so a chunk that is delivered more than once is only appended once.
+    When several listeners consume the results, a chunk can be received ahead of an
+    earlier one. Until the task has finished, such a chunk is refused with
+    OutOfOrderLog, so that it can be requeued until the earlier chunk has arrived.
+
+    Args:
+        task_log_message: The message body from a TASK_LOG message.
+
+    Raises:
+        OutOfOrderLog: An earlier chunk of the task's output has not been appended
+    """
+    task_id = task_log_message["task_id"]
+    output = task_log_message["output"]
+    sequence = task_log_message.get("sequence")
+
+    with transaction.atomic():
+        try:
+            task = (
+                Task.objects.select_for_update(of=("self",))
+                .select_related("function", "environment")
+                .get(id=task_id)
+            )
+        except Task.DoesNotExist:
+            logger.error("Unable to record output for task %s: task not found", task_id)
+            return
+
+        task_log = TaskLog.objects.filter(task=task).first()
+
+        if sequence is not None:
+            last = task_log.sequence if task_log is not None else None
+            expected = 0 if last is None else last + 1
+
+            if sequence < expected:
+                logger.debug("Skipping duplicate output %s for task %s", sequence, task)
+                return
+
+            if sequence > expected and task.status not in Task.FINISHED_STATUSES:
+                raise OutOfOrderLog(
+                    f"Output {sequence} for task {task_id} arrived before {expected}"
+                )
+
+        output = get_masker(task).mask(output)
+
+        if task_log is None:
+            TaskLog.objects.create(task=task, log=output, sequence=sequence)
+        else:
+            TaskLog.objects.filter(task=task).update(
+                log=Concat(F("log"), Value(output)),
+                sequence=F("sequence") if sequence is None else sequence,
+            )
+
+        if task.status == Task.PENDING:
+            Task.objects.filter(id=task.id).update(
+                status=Task.IN_PROGRESS, updated_at=timezone.now()
+            )
 
 
 @app.task
@@ -125,17 +303,15 @@ def run_scheduled_task(scheduled_task_id: str) -> None:
     scheduled_task.update_most_recent_task(task)
 
 
-def _update_task_status(task: Task, status: int) -> None:
+def _task_status(status: Union[int, str]) -> str:
+    """Returns the Task status for the exit status reported by the runner"""
     match status:
         case 0:
-            task.status = Task.COMPLETE
+            return Task.COMPLETE
+        case "TIMEOUT":
+            return Task.TIMEOUT
         case _:
-            task.status = Task.ERROR
-
-    task.save()
-
-    if task.scheduled_task is not None and status == "ERROR":
-        task.scheduled_task.error()
+            return Task.ERROR
 
 
 def _handle_workflow_run(workflow_run_step: WorkflowRunStep, task: Task) -> None:
@@ -148,5 +324,5 @@ def _handle_workflow_run(workflow_run_step: WorkflowRunStep, task: Task) -> None
                 next_step.execute(workflow_run=workflow_run)
             else:
                 workflow_run.complete()
-        case Task.ERROR:
+        case Task.ERROR | Task.TIMEOUT:
             workflow_run.error()
@@ -16,6 +16,7 @@ from django.core.exceptions import ImproperlyConfigured
 
 from .auth_ import *  # noqa
 from .builder_ import *  # noqa
+from .cache_ import *  # noqa
 from .celery_ import *  # noqa
 from .core_ import *  # noqa
 from .logging_ import *  # noqa
@@ -0,0 +1,23 @@
+"""Cache related settings"""
+import os
+
+# Without a Redis host, each process keeps its own in memory cache. Entries that are
+# invalidated in one process would then live on in the others until they expire, so
+# data that must be invalidated everywhere at once, such as the resolved variables of
+# an environment, is only cached across requests when SHARED_CACHE is set.
+SHARED_CACHE = bool(os.environ.get("REDIS_HOST"))
+
+if REDIS_HOST := os.environ.get("REDIS_HOST"):
+    REDIS_PORT = os.environ.get("REDIS_PORT", 6379)
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
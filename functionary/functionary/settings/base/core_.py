@@ -3,3 +3,54 @@ import os
 REGISTRY_HOST = os.environ.get("REGISTRY_HOST", "localhost")
 REGISTRY_PORT = os.environ.get("REGISTRY_PORT", "5000")
 REGISTRY = f"{REGISTRY_HOST}:{REGISTRY_PORT}"
+
+ARTIFACT_STORE = {
+    "BACKEND": "core.utils.artifacts.LocalArtifactStore",
+    "OPTIONS": {
+        "root": os.environ.get("ARTIFACT_STORE_ROOT", "/var/lib/functionary/artifacts")
+    },
+}
+# Results stored as artifacts that are larger than this are offered for download in
+# the UI rather than displayed
+ARTIFACT_INLINE_LIMIT = int(os.environ.get("ARTIFACT_INLINE_LIMIT", 1024 * 1024))
+
+# Seconds a task may run for before the runner stops it, for functions that do not
+# set their own timeout
+TASK_DEFAULT_TIMEOUT = int(os.environ.get("TASK_DEFAULT_TIMEOUT", 3600))
+
+# Seconds since its last heartbeat after which a runner is no longer considered alive
+RUNNER_HEARTBEAT_EXPIRY = int(os.environ.get("RUNNER_HEARTBEAT_EXPIRY", 60))
+
+# Maximum number of tasking messages the outbox relay publishes at once, and the
+# seconds it waits between checks of the outbox when it is empty
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 0.5))
+# Seconds after which messages claimed by an outbox relay that has not published
+# them can be claimed by another relay
+OUTBOX_CLAIM_TIMEOUT = int(os.environ.get("OUTBOX_CLAIM_TIMEOUT", 300))
+
+# Maximum number of task results the listener records at once, and the seconds it
+# waits for a batch to fill before recording what it has. Set RESULT_BATCH_SIZE to 0
+# to hand each result to the celery workers instead.
+RESULT_BATCH_SIZE = int(os.environ.get("RESULT_BATCH_SIZE", 100))
+RESULT_BATCH_LINGER = float(os.environ.get("RESULT_BATCH_LINGER", 0.1))
+# Maximum number of messages the listener receives ahead of acknowledging them
+RESULT_PREFETCH = int(os.environ.get("RESULT_PREFETCH", 500))
+# Number of times the listener requeues a message that it can not handle before it
+# dead letters the message
+LISTENER_MAX_REQUEUES = int(os.environ.get("LISTENER_MAX_REQUEUES", 50))
+
+# Maximum number of compiled function schemas kept for validating task parameters
+PARAMETER_VALIDATOR_CACHE_SIZE = int(
+    os.environ.get("PARAMETER_VALIDATOR_CACHE_SIZE", 256)
+)
+
+# Seconds the resolved variables of an environment are cached for, when the cache is
+# shared between processes (see SHARED_CACHE). Changes to variables invalidate the
+# cache.
+VARIABLES_CACHE_TIMEOUT = int(os.environ.get("VARIABLES_CACHE_TIMEOUT", 30))
+
+# Seconds a user's resolved permissions are cached for, when the cache is shared
+# between processes (see SHARED_CACHE). Changes to the user's roles invalidate the
+# cache.
+PERMISSIONS_CACHE_TIMEOUT = int(os.environ.get("PERMISSIONS_CACHE_TIMEOUT", 60))
@@ -5,3 +5,6 @@ RABBITMQ_PORT = os.getenv("RABBITMQ_PORT", 5672)
 RABBITMQ_MANAGEMENT_PORT = os.getenv("RABBITMQ_MANAGEMENT_PORT", 15672)
 RABBITMQ_USER = os.getenv("RABBITMQ_USER")
 RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD")
+RABBITMQ_PUBLISH_BATCH_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BATCH_SIZE", 100))
+RABBITMQ_PUBLISH_LINGER_MS = int(os.getenv("RABBITMQ_PUBLISH_LINGER_MS", 0))
+RABBITMQ_PUBLISH_TIMEOUT = int(os.getenv("RABBITMQ_PUBLISH_TIMEOUT", 30))
@@ -39,6 +39,10 @@ run_scheduler() {
     python manage.py run_scheduler
 }
 
+run_outbox_relay() {
+    python manage.py run_outbox_relay
+}
+
 run_build_worker() {
     python manage.py run_build_worker
 }
@@ -60,6 +64,7 @@ start() {
 # runserver         - Start django dev server
 # run_listener      - Start the message listener
 # run_worker        - Start the general task worker
+# run_outbox_relay  - Start the relay that publishes tasks to the runners
 # run_build_worker  - Start the package build worker
 # start             - Start application in Production mode
 ####
@@ -86,6 +91,9 @@ case $mode in
     run_scheduler)
     run_scheduler;;
 
+    run_outbox_relay)
+    run_outbox_relay;;
+
     run_build_worker)
     run_build_worker;;
 
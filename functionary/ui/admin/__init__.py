@@ -1,11 +1,13 @@
 from django.contrib import admin
 
 from core.admin.environment import EnvironmentAdmin
+from core.admin.runner import RunnerAdmin
 from core.admin.team import TeamAdmin
 from core.admin.user import UserAdmin
-from core.models import Environment, Team, User
+from core.models import Environment, Runner, Team, User
 
 admin.site.register(Environment, EnvironmentAdmin)
+admin.site.register(Runner, RunnerAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(User, UserAdmin)
 
@@ -77,7 +77,17 @@ urlpatterns = [
         (tasks.TaskDetailView.as_view()),
         name="task-detail",
     ),
+    path(
+        "task/<uuid:pk>/artifacts/<uuid:artifact_id>",
+        (tasks.download_task_artifact),
+        name="task-artifact-download",
+    ),
     path("task/<pk>/log", (tasks.get_task_log), name="task-log"),
+    path(
+        "task/<uuid:pk>/result/download",
+        (tasks.download_task_result),
+        name="task-result-download",
+    ),
     path(
         "task/<uuid:pk>/results",
         (tasks.TaskResultsView.as_view()),
@@ -2,12 +2,13 @@ from builder.models import Build
 
 from .tasks import FINISHED_STATUS
 from .view_base import (
+    CursorPaginationMixin,
     PermissionedEnvironmentDetailView,
     PermissionedEnvironmentListView,
 )
 
 
-class BuildListView(PermissionedEnvironmentListView):
+class BuildListView(CursorPaginationMixin, PermissionedEnvironmentListView):
     model = Build
     order_by_fields = ["-created_at"]
     queryset = Build.objects.select_related("creator", "package").all()
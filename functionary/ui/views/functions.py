@@ -12,7 +12,7 @@ from django.urls import reverse
 from django.views.decorators.http import require_GET, require_POST
 
 from core.auth import Permission
-from core.models import Environment, Function, Task
+from core.models import Environment, Function, Task, TaskResourceUsage
 
 from ..forms.tasks import TaskParameterForm, TaskParameterTemplateForm
 from .view_base import (
@@ -49,11 +49,14 @@ class FunctionDetailView(PermissionedEnvironmentDetailView):
 
         missing_variables = []
         if function.variables:
-            all_vars = list(env.variables.values_list("name", flat=True))
+            all_vars = env.resolved_variables
             missing_variables = [
                 var for var in function.variables if var not in all_vars
             ]
         context["missing_variables"] = missing_variables
+        context["resource_profile"] = TaskResourceUsage.objects.filter(
+            task__function=function
+        ).profile()
         if self.request.user.has_perm(Permission.TASK_CREATE, env):
             form = TaskParameterForm(function)
 
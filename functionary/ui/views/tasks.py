@@ -1,8 +1,16 @@
 import csv
+import os
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import BadRequest, ValidationError
+from django.core.exceptions import (
+    BadRequest,
+    ObjectDoesNotExist,
+    PermissionDenied,
+    ValidationError,
+)
 from django.http import (
+    Http404,
     HttpRequest,
     HttpResponse,
     HttpResponseForbidden,
@@ -14,13 +22,15 @@ from django_htmx import http
 
 from core.auth import Permission
 from core.models import Environment, Task
+from core.utils.artifacts import ArtifactNotFound, artifact_response
 
 from .view_base import (
+    CursorPaginationMixin,
     PermissionedEnvironmentDetailView,
     PermissionedEnvironmentListView,
 )
 
-FINISHED_STATUS = ["COMPLETE", "ERROR"]
+FINISHED_STATUS = ["COMPLETE", "ERROR", "TIMEOUT"]
 PAGINATION_AMOUNT = 8
 
 
@@ -121,11 +131,28 @@ def _format_result(result, format):
     return output_format, format_error, formatted_result
 
 
+def _is_download_only(task: Task) -> bool:
+    """Determines if the result is too large to be displayed, in which case it is only
+    offered for download"""
+    try:
+        task_result = task.taskresult
+    except ObjectDoesNotExist:
+        return False
+
+    return task_result.is_artifact and task_result.size > settings.ARTIFACT_INLINE_LIMIT
+
+
 def _get_result_context(context: dict, format: str) -> dict:
     task: Task = context["task"]
 
     completed = task.status in FINISHED_STATUS
 
+    if completed and _is_download_only(task):
+        context["completed"] = completed
+        context["show_output_selector"] = False
+        context["output_format"] = "download"
+        return context
+
     output_format, format_error, formatted_result = _format_result(task.result, format)
 
     context["completed"] = completed
@@ -138,7 +165,7 @@ def _get_result_context(context: dict, format: str) -> dict:
     return context
 
 
-class TaskListView(PermissionedEnvironmentListView):
+class TaskListView(CursorPaginationMixin, PermissionedEnvironmentListView):
     model = Task
     order_by_fields = ["-created_at"]
     queryset = Task.objects.select_related("environment", "function", "creator").all()
@@ -153,7 +180,12 @@ class TaskDetailView(PermissionedEnvironmentDetailView):
             super()
             .get_queryset()
             .select_related(
-                "environment", "creator", "function", "taskresult", "environment__team"
+                "environment",
+                "creator",
+                "function",
+                "taskresult",
+                "resource_usage",
+                "environment__team",
             )
         )
 
@@ -216,7 +248,9 @@ def get_task_log(request: HttpRequest, pk: str) -> HttpResponse:
 
     completed = task.status in FINISHED_STATUS
     show_output_selector = (
-        False if not completed else _show_output_selector(task.result)
+        False
+        if not completed or _is_download_only(task)
+        else _show_output_selector(task.result)
     )
 
     context = {
@@ -226,3 +260,50 @@ def get_task_log(request: HttpRequest, pk: str) -> HttpResponse:
         "output_format": "log",
     }
     return render(request, "partials/task_result_block.html", context)
+
+
+def _get_permitted_task(request: HttpRequest, pk: str) -> Task:
+    env = Environment.objects.get(id=request.session.get("environment_id"))
+    if not request.user.has_perm(Permission.TASK_READ, env):
+        raise PermissionDenied
+
+    return get_object_or_404(Task, id=pk, environment=env)
+
+
+@require_GET
+@login_required
+def download_task_result(request: HttpRequest, pk: str) -> HttpResponse:
+    task = _get_permitted_task(request, pk)
+
+    try:
+        task_result = task.taskresult
+    except ObjectDoesNotExist:
+        raise Http404("No result found for task.")
+
+    if not task_result.is_artifact:
+        response = HttpResponse(task_result.result, content_type="application/json")
+        response["Content-Disposition"] = f'attachment; filename="{task.id}.json"'
+        return response
+
+    try:
+        return artifact_response(
+            request, task_result.digest, f"{task.id}.json", "application/json"
+        )
+    except ArtifactNotFound:
+        raise Http404("Result is no longer available.")
+
+
+@require_GET
+@login_required
+def download_task_artifact(
+    request: HttpRequest, pk: str, artifact_id: str
+) -> HttpResponse:
+    task = _get_permitted_task(request, pk)
+    artifact = get_object_or_404(task.artifacts, id=artifact_id)
+
+    try:
+        return artifact_response(
+            request, artifact.digest, os.path.basename(artifact.name)
+        )
+    except ArtifactNotFound:
+        raise Http404("Artifact is no longer available.")
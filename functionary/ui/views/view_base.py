@@ -5,6 +5,7 @@ from django.views.generic.list import ListView
 
 from core.auth import Permission
 from core.models import Environment
+from core.utils.pagination import CursorPage
 
 
 class PermissionedEnvironmentListView(LoginRequiredMixin, ListView):
@@ -36,6 +37,27 @@ class PermissionedEnvironmentListView(LoginRequiredMixin, ListView):
         return super().get_queryset().none()
 
 
+class CursorPaginationMixin:
+    """Pages a ListView by keyset on (created_at, id), newest first, rather than by
+    page number. Use for listings too large to count or to skip through with OFFSET.
+
+    The page is in the context as page_obj, a CursorPage, and navigated with the
+    after and before query parameters.
+    """
+
+    paginate_by = 25
+
+    def paginate_queryset(self, queryset, page_size):
+        page = CursorPage(
+            queryset,
+            page_size,
+            after_cursor=self.request.GET.get("after"),
+            before_cursor=self.request.GET.get("before"),
+        )
+
+        return (None, page, page.object_list, page.has_other_pages())
+
+
 class PermissionedEnvironmentDetailView(
     LoginRequiredMixin, UserPassesTestMixin, DetailView
 ):
@@ -2,9 +2,10 @@ import logging
 import sys
 from os import getenv
 
-from runner import Listener, Worker
+from runner import Engine, Listener, Worker
 
 LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
+RUNNER_ENGINE = getenv("RUNNER_ENGINE", "celery").lower()
 logging.basicConfig(stream=sys.stdout, level=LOG_LEVEL)
 
 
@@ -22,7 +23,20 @@ def spawn_worker() -> Worker:
     return worker
 
 
-if __name__ == "__main__":
+def spawn_engine() -> Engine:
+    engine = Engine()
+    engine.start()
+
+    return engine
+
+
+if __name__ == "__main__" and RUNNER_ENGINE == "asyncio":
+    engine = spawn_engine()
+
+    logging.debug("Started engine process")
+
+    engine.join()
+elif __name__ == "__main__":
     listener = spawn_listener()
     worker = spawn_worker()
 
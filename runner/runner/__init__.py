@@ -6,6 +6,10 @@ from celery.apps.worker import Worker as CeleryWorker
 from setproctitle import setproctitle
 
 from runner.celery import WORKER_CONCURRENCY, WORKER_HOSTNAME, app
+from runner.concurrency import concurrency_limits
+from runner.containers import reap_containers
+from runner.engine import start_engine
+from runner.images import image_cache
 from runner.listener import start_listening
 from runner.messaging import wait_for_connection
 
@@ -51,8 +55,15 @@ class Worker(Process):
         setproctitle(self.name)
 
         wait_for_connection()
+        reap_containers()
+        image_cache.sync()
+
+        # The listener decides how many tasks run at once, so the worker needs enough
+        # processes for the most that the concurrency controller may allow
+        _, concurrency = concurrency_limits(WORKER_CONCURRENCY)
+
         worker = CeleryWorker(app=self.app, hostname=WORKER_HOSTNAME)
-        worker.setup_defaults(concurrency=WORKER_CONCURRENCY, loglevel=self.loglevel)
+        worker.setup_defaults(concurrency=concurrency, loglevel=self.loglevel)
         worker.start()
 
 
@@ -90,3 +101,33 @@ class Listener(Process):
         setproctitle(self.name)
         wait_for_connection()
         start_listening()
+
+
+class Engine(Process):
+    """Asyncio Engine Process
+
+    Consumes tasking messages, runs the tasks and publishes their results from a
+    single process. This replaces both the Listener and the Worker.
+
+    Attributes:
+        name: Identification name given to the process
+    """
+
+    def __init__(self, name: str = "functionary: runner engine") -> None:
+        super().__init__(name=name)
+
+    def run(self) -> None:
+        """Runs the Engine process
+
+        Invoked when the Engine class is started. Engine will connect to the
+        RabbitMQ message broker and run the tasks it receives on an asyncio event
+        loop.
+
+        Raises:
+            pika.exceptions.AMQPConnectionError: failed to connect to message broker
+        """
+        setproctitle(self.name)
+        wait_for_connection()
+        reap_containers()
+        image_cache.sync()
+        start_engine()
@@ -0,0 +1,194 @@
+"""Upload of large task results and output files to the artifact store
+
+Rather than sending large results and output files through the message broker, the
+runner writes them to the artifact store shared with the core and includes only their
+digest in the TASK_RESULT message. Artifacts are stored under the sha256 digest of
+their content, using the same layout as the core's LocalArtifactStore, so
+ARTIFACT_STORE_ROOT must point at the same filesystem on the runner and the core.
+"""
+import hashlib
+import io
+import logging
+import os
+import tarfile
+from abc import ABC, abstractmethod
+from os import getenv
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+from docker.errors import NotFound
+from docker.models.containers import Container
+
+ARTIFACT_STORE_ROOT = getenv("ARTIFACT_STORE_ROOT", "/var/lib/functionary/artifacts")
+ARTIFACT_THRESHOLD = int(getenv("RUNNER_ARTIFACT_THRESHOLD", 256 * 1024))
+
+# Directory inside of the package container that output files are collected from
+OUTPUT_DIR = "/tmp/functionary/output"
+OUTPUT_DIR_VARIABLE = "FUNCTIONARY_OUTPUT_DIR"
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore(ABC):
+    """Interface for the artifact store backends"""
+
+    @abstractmethod
+    def put(self, stream: BinaryIO) -> Tuple[str, int]:
+        """Store the content read from the stream
+
+        Returns:
+            A tuple of the sha256 digest and the size of the content
+        """
+
+    @abstractmethod
+    def open(self, digest: str) -> BinaryIO:
+        """Open the artifact with the digest for reading
+
+        Raises:
+            FileNotFoundError: No artifact exists for the digest
+        """
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Stores artifacts as files in a local directory, fanned out into
+    subdirectories by the leading characters of the digest
+
+    Attributes:
+        root: Directory in which the artifacts are stored
+    """
+
+    def __init__(self, root: str = ARTIFACT_STORE_ROOT) -> None:
+        self.root = root
+
+    def put(self, stream: BinaryIO) -> Tuple[str, int]:
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+
+        # Write to a temporary file first so that partially written content is never
+        # visible under a digest
+        with NamedTemporaryFile(dir=self.root, delete=False) as temp_file:
+            try:
+                while chunk := stream.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.remove(temp_file.name)
+                raise
+
+        digest = sha256.hexdigest()
+        path = self._path(digest)
+
+        if os.path.exists(path):
+            os.remove(temp_file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_file.name, path)
+
+        return digest, size
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self._path(digest), "rb")
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like wrapper around an iterable of byte chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+
+        return size
+
+
+def store_result(result: bytes, store: ArtifactStore) -> Optional[dict]:
+    """Store the result as an artifact if it exceeds ARTIFACT_THRESHOLD
+
+    Returns:
+        A reference to the stored result, or None if the result is small enough to
+        be sent inline
+    """
+    if len(result) <= ARTIFACT_THRESHOLD:
+        return None
+
+    digest, size = store.put(io.BytesIO(result))
+
+    return {"digest": digest, "size": size}
+
+
+def collect_output_files(container: Container, store: ArtifactStore) -> list[dict]:
+    """Store the files that the function wrote to OUTPUT_DIR in the container
+
+    Returns:
+        A list of references to the stored files, named by their path relative to
+        OUTPUT_DIR
+    """
+    try:
+        archive, _ = container.get_archive(OUTPUT_DIR)
+    except NotFound:
+        return []
+
+    artifacts = []
+
+    with tarfile.open(fileobj=_ChunkReader(archive), mode="r|") as tarball:
+        for member in tarball:
+            if not member.isfile():
+                continue
+
+            # The archive entries are prefixed with the name of OUTPUT_DIR itself
+            _, _, name = member.name.partition("/")
+            digest, size = store.put(tarball.extractfile(member))
+            artifacts.append({"name": name, "digest": digest, "size": size})
+
+    if artifacts:
+        logger.debug("Collected %d output files from %s", len(artifacts), container)
+
+    return artifacts
+
+
+def collect_directory_files(directory: str, store: ArtifactStore) -> list[dict]:
+    """Store the files that the function wrote to a local output directory
+
+    Returns:
+        A list of references to the stored files, named by their path relative to
+        the directory
+    """
+    artifacts = []
+
+    for parent, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            path = os.path.join(parent, filename)
+
+            if not os.path.isfile(path) or os.path.islink(path):
+                continue
+
+            with open(path, "rb") as output_file:
+                digest, size = store.put(output_file)
+
+            name = os.path.relpath(path, directory)
+            artifacts.append({"name": name, "digest": digest, "size": size})
+
+    return artifacts
+
+
+artifact_store = LocalArtifactStore()
@@ -29,7 +29,7 @@ WORKER_NAME = f"celery@{WORKER_HOSTNAME}"
 
 app = Celery(
     "runner",
-    include=["runner.handlers"],
+    include=["runner.handlers", "runner.slots"],
     broker=(
         f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}"
         f"@{RABBITMQ_HOST}:{RABBITMQ_PORT}/{RABBITMQ_VHOST}"
@@ -0,0 +1,240 @@
+"""Adaptive concurrency
+
+The number of tasks a runner can usefully execute at once depends on the functions it
+runs. Memory heavy functions can exhaust the host well before every CPU is busy, while
+I/O bound functions leave the CPUs idle at a concurrency of one task per CPU. Rather
+than fixing the concurrency, the ConcurrencyController adjusts it between
+RUNNER_MIN_CONCURRENCY and RUNNER_MAX_CONCURRENCY.
+
+Every RUNNER_CONCURRENCY_INTERVAL seconds, the controller samples the host's CPU and
+memory utilization and the number of tasks waiting in the runner's tasking queues. When
+either utilization is above its target, the concurrency is reduced. Otherwise, when
+every slot is busy and tasks are waiting, it is raised by one.
+
+The controller is disabled unless the maximum concurrency is greater than the minimum,
+in which case the runner keeps a fixed concurrency as before.
+"""
+import logging
+from os import getenv
+from threading import Event, Thread
+from typing import Callable, Optional
+
+from pika.exceptions import AMQPError
+
+from .messaging import build_connection
+
+MIN_CONCURRENCY = int(getenv("RUNNER_MIN_CONCURRENCY", 0))
+MAX_CONCURRENCY = int(getenv("RUNNER_MAX_CONCURRENCY", 0))
+CONCURRENCY_INTERVAL = float(getenv("RUNNER_CONCURRENCY_INTERVAL", 10))
+TARGET_CPU_UTILIZATION = float(getenv("RUNNER_TARGET_CPU_UTILIZATION", 0.85))
+TARGET_MEMORY_UTILIZATION = float(getenv("RUNNER_TARGET_MEMORY_UTILIZATION", 0.85))
+
+logger = logging.getLogger(__name__)
+
+
+def concurrency_limits(initial: int) -> tuple[int, int]:
+    """Returns the minimum and maximum concurrency, which default to the initial
+    concurrency when they are not configured"""
+    maximum = MAX_CONCURRENCY or max(initial, MIN_CONCURRENCY)
+    minimum = min(MIN_CONCURRENCY or initial, maximum)
+
+    return (max(minimum, 1), maximum)
+
+
+class HostUsage:
+    """Samples the CPU and memory utilization of the host from /proc
+
+    CPU utilization is measured over the time since the previous sample, so the first
+    sample only establishes the baseline.
+    """
+
+    def __init__(self, proc: str = "/proc") -> None:
+        self.proc = proc
+        self._cpu_times: Optional[tuple[int, int]] = None
+
+    def cpu(self) -> Optional[float]:
+        """The fraction of CPU time spent busy since the previous sample"""
+        try:
+            with open(f"{self.proc}/stat") as stat:
+                times = [int(value) for value in stat.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+
+        # The idle and iowait times are the fourth and fifth fields
+        idle, total = times[3] + times[4], sum(times)
+        previous, self._cpu_times = self._cpu_times, (idle, total)
+
+        if previous is None or total <= previous[1]:
+            return None
+
+        return 1 - (idle - previous[0]) / (total - previous[1])
+
+    def memory(self) -> Optional[float]:
+        """The fraction of memory that is unavailable to new processes"""
+        meminfo = {}
+
+        try:
+            with open(f"{self.proc}/meminfo") as meminfo_file:
+                for line in meminfo_file:
+                    name, _, value = line.partition(":")
+                    meminfo[name] = int(value.split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+
+        if not meminfo.get("MemTotal") or "MemAvailable" not in meminfo:
+            return None
+
+        return 1 - meminfo["MemAvailable"] / meminfo["MemTotal"]
+
+
+class QueueDepth:
+    """Counts the messages waiting in the runner's tasking queues
+
+    Attributes:
+        queues: The names of the queues to count the messages of
+    """
+
+    def __init__(self, queues: list[str]) -> None:
+        self.queues = queues
+        self._connection = None
+        self._channel = None
+
+    def __call__(self) -> Optional[int]:
+        try:
+            if self._connection is None or self._connection.is_closed:
+                self._connection = build_connection()
+                self._channel = self._connection.channel()
+
+            return sum(
+                self._channel.queue_declare(queue, passive=True).method.message_count
+                for queue in self.queues
+            )
+        except AMQPError as exc:
+            logger.debug("Unable to count queued tasks: %s", exc)
+            self.close()
+            return None
+
+    def close(self) -> None:
+        """Close the connection, if it is still open"""
+        connection, self._connection, self._channel = self._connection, None, None
+
+        try:
+            if connection is not None and connection.is_open:
+                connection.close()
+        except AMQPError as exc:
+            logger.debug("Unable to close queue depth connection: %s", exc)
+
+
+class ConcurrencyController:
+    """Adjusts the runner's concurrency from a background thread
+
+    Attributes:
+        concurrency: The current concurrency
+        minimum: The lowest concurrency to reduce to
+        maximum: The highest concurrency to raise to
+        free_slots: Returns the number of execution slots currently free
+        backlog: Returns the number of tasks waiting to be run, or None if unknown
+        on_change: Called with the new concurrency whenever it changes
+        interval: Seconds between adjustments
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        minimum: int,
+        maximum: int,
+        free_slots: Callable[[], int],
+        backlog: Callable[[], Optional[int]],
+        on_change: Callable[[int], None],
+        interval: float = CONCURRENCY_INTERVAL,
+        host: Optional[HostUsage] = None,
+    ) -> None:
+        self.concurrency = min(max(concurrency, minimum), maximum)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.free_slots = free_slots
+        self.backlog = backlog
+        self.on_change = on_change
+        self.interval = interval
+        self.host = host or HostUsage()
+        self.cpu: Optional[float] = None
+        self.memory: Optional[float] = None
+        self.queued: Optional[int] = None
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether there is any room to adjust the concurrency"""
+        return self.maximum > self.minimum
+
+    def start(self) -> None:
+        """Start adjusting the concurrency, if enabled"""
+        if not self.enabled:
+            return
+
+        logger.info(
+            "Adjusting concurrency between %s and %s", self.minimum, self.maximum
+        )
+        self._stopped.clear()
+        self.host.cpu()
+        self._thread = Thread(target=self._run, name="concurrency", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as exc:
+                logger.warning("Unable to adjust concurrency: %s", exc)
+
+    def adjust(self) -> int:
+        """Sample the host and the backlog and update the concurrency
+
+        Returns:
+            The new concurrency
+        """
+        self.cpu = self.host.cpu()
+        self.memory = self.host.memory()
+        self.queued = self.backlog()
+
+        current = concurrency = self.concurrency
+
+        if _above(self.cpu, TARGET_CPU_UTILIZATION) or _above(
+            self.memory, TARGET_MEMORY_UTILIZATION
+        ):
+            # Back off faster than we ramp up, as an overloaded host slows every task
+            concurrency -= max(current // 4, 1)
+        elif self.queued and self.free_slots() <= 0:
+            concurrency += 1
+
+        concurrency = min(max(concurrency, self.minimum), self.maximum)
+
+        if concurrency != current:
+            logger.info(
+                "Concurrency changed from %s to %s (cpu: %s, memory: %s, queued: %s)",
+                current,
+                concurrency,
+                _percent(self.cpu),
+                _percent(self.memory),
+                self.queued,
+            )
+            self.concurrency = concurrency
+            self.on_change(concurrency)
+
+        return concurrency
+
+
+def _above(utilization: Optional[float], target: float) -> bool:
+    return utilization is not None and utilization > target
+
+
+def _percent(utilization: Optional[float]) -> str:
+    return "unknown" if utilization is None else f"{utilization:.0%}"
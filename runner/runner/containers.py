@@ -0,0 +1,109 @@
+"""Tracking and reclamation of the containers the runner starts for tasks
+
+Every container the runner starts is labelled with the name of the runner, so that
+containers left behind by a worker that crashed or was killed can be found and
+removed when the runner next starts.
+"""
+import logging
+from os import getenv
+from socket import gethostname
+from threading import Event, Timer
+
+from docker.errors import DockerException
+from docker.models.containers import Container
+
+import docker
+
+RUNNER_NAME = getenv("RUNNER_NAME", gethostname())
+DEFAULT_TASK_TIMEOUT = int(getenv("RUNNER_DEFAULT_TASK_TIMEOUT", 3600))
+
+RUNNER_LABEL = "functionary.runner"
+TASK_LABEL = "functionary.task"
+WARM_CONTAINER_LABEL = "functionary.warm"
+
+# Status reported in the TASK_RESULT for tasks that exceeded their timeout
+TIMEOUT_STATUS = "TIMEOUT"
+
+logger = logging.getLogger(__name__)
+
+
+def timeout_message(timeout: float) -> str:
+    """Returns the output to report for a task that exceeded its timeout"""
+    return f"Function exceeded its timeout of {timeout}s and was stopped"
+
+
+def container_labels(**labels: str) -> dict:
+    """Returns the labels to apply to a container started by this runner"""
+    return {RUNNER_LABEL: RUNNER_NAME, **labels}
+
+
+class Deadline:
+    """Kills a container if it is still running once the timeout has passed
+
+    Use as a context manager around the code that waits on the container. Killing
+    the container ends its output stream, which unblocks whatever is waiting on it.
+
+    Attributes:
+        container: The container to kill
+        timeout: Seconds to allow the container to run for. No timeout is applied if
+                 this is None.
+    """
+
+    def __init__(self, container: Container, timeout: float) -> None:
+        self.container = container
+        self.timeout = timeout
+        self._expired = Event()
+        self._timer = None
+
+    @property
+    def expired(self) -> bool:
+        """Whether the timeout passed and the container was killed"""
+        return self._expired.is_set()
+
+    def __enter__(self) -> "Deadline":
+        if self.timeout is not None:
+            self._timer = Timer(self.timeout, self._kill)
+            self._timer.daemon = True
+            self._timer.start()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _kill(self) -> None:
+        logger.warning(
+            "Killing container %s after exceeding its timeout of %ss",
+            self.container.short_id,
+            self.timeout,
+        )
+        self._expired.set()
+
+        try:
+            self.container.kill()
+        except DockerException as exc:
+            logger.debug("Unable to kill container %s: %s", self.container, exc)
+
+
+def reap_containers() -> None:
+    """Remove any containers left behind by a previous run of this runner
+
+    This must only be called before the worker starts, as any containers belonging to
+    the runner at that point can not still be in use.
+    """
+    try:
+        containers = docker.from_env().containers.list(
+            all=True, filters={"label": f"{RUNNER_LABEL}={RUNNER_NAME}"}
+        )
+    except DockerException as exc:
+        logger.warning("Unable to list containers to reap: %s", exc)
+        return
+
+    for container in containers:
+        logger.info("Removing stale container %s", container.short_id)
+
+        try:
+            container.remove(force=True)
+        except DockerException as exc:
+            logger.warning("Unable to remove container %s: %s", container, exc)
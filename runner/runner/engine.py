@@ -0,0 +1,347 @@
+"""Asyncio runner engine
+
+An alternative to the Listener and Celery Worker processes, in which a single process
+consumes the tasking messages, runs the tasks and publishes their results. Rather than
+handing each task to a pool of worker processes through a chain of Celery tasks, the
+engine runs every task as a coroutine on one event loop, with the number of tasks
+running at once bounded by the concurrency.
+
+The docker and publishing calls are blocking, so they are made from the event loop's
+thread pool. Since those threads spend nearly all of their time waiting on the Docker
+Engine or the broker, this costs far less than a process per slot.
+
+Select the engine by setting RUNNER_ENGINE=asyncio.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+from time import monotonic
+from typing import Callable, Optional
+
+from docker.errors import DockerException
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.channel import Channel
+from pika.spec import Basic, BasicProperties
+
+from .celery import WORKER_CONCURRENCY
+from .concurrency import ConcurrencyController, QueueDepth, concurrency_limits
+from .handlers import execute_task, failed_result
+from .images import PULL_BACKLOG, image_cache, image_puller
+from .messaging import build_connection_parameters
+from .metrics import (
+    MetricsRegistry,
+    observe_phase,
+    record_locally,
+    register_concurrency_metrics,
+    register_image_cache_metrics,
+    register_slot_metrics,
+    register_spool_metrics,
+    start_metrics_server,
+    timed,
+)
+from .pool import warm_pool
+from .pools import declare_queues, serves_package, task_queues
+from .registration import Heartbeat
+from .spool import SpoolDrainer, result_spool
+
+ENGINE_CONCURRENCY = int(getenv("RUNNER_CONCURRENCY", WORKER_CONCURRENCY))
+
+RETRY_DELAY = 30
+MAX_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEngine:
+    """Consumes tasking messages and runs the tasks on an asyncio event loop
+
+    As with the Listener, the channel prefetch is set to the concurrency, raised by
+    the number of tasks waiting on a pull of their image up to the pull backlog, and
+    each TASK_PACKAGE message is only acknowledged once the task's result has been
+    written to the result spool, so the broker only delivers a task when there is
+    room to run it. The results are then published from the spool by the
+    SpoolDrainer.
+
+    Attributes:
+        concurrency: The maximum number of tasks to run at once, which is adjusted
+                     by the concurrency controller when it is enabled
+    """
+
+    def __init__(self, concurrency: int = ENGINE_CONCURRENCY) -> None:
+        self.concurrency = concurrency
+        self._slot_freed = asyncio.Condition()
+        self._drainer = SpoolDrainer(result_spool)
+        self._channel: Optional[Channel] = None
+        self._closed: Optional[asyncio.Future] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._queues: list[str] = []
+        self._in_flight = 0
+        self._pulling = 0
+        self._running = 0
+
+    async def run(self) -> None:
+        """Consume tasking messages until cancelled, reconnecting whenever the
+        connection to the broker is lost"""
+        loop = asyncio.get_running_loop()
+        controller = ConcurrencyController(
+            self.concurrency,
+            *concurrency_limits(self.concurrency),
+            free_slots=lambda: self.concurrency - self._running,
+            backlog=QueueDepth(task_queues()),
+            on_change=lambda concurrency: loop.call_soon_threadsafe(
+                self._resize, concurrency
+            ),
+        )
+        self.concurrency = controller.concurrency
+
+        loop.set_default_executor(
+            ThreadPoolExecutor(controller.maximum * 2, thread_name_prefix="engine")
+        )
+        self._start_metrics(controller)
+        self._queues = await asyncio.to_thread(declare_queues)
+
+        heartbeat = Heartbeat(
+            lambda: self.concurrency, lambda: self.concurrency - self._running
+        )
+        heartbeat.start()
+        controller.start()
+        self._drainer.start()
+
+        try:
+            while True:
+                self._closed = loop.create_future()
+
+                AsyncioConnection(
+                    build_connection_parameters(),
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_closed,
+                    on_close_callback=self._on_connection_closed,
+                    custom_ioloop=loop,
+                )
+
+                reason = await self._closed
+                logger.info("Connection lost: %s. Reconnecting in 5s.", reason)
+                await asyncio.sleep(5)
+        finally:
+            await asyncio.to_thread(controller.stop)
+            await asyncio.to_thread(self._drainer.stop)
+            heartbeat.stop()
+            warm_pool.clear()
+
+    def _start_metrics(self, controller: ConcurrencyController) -> None:
+        registry = MetricsRegistry()
+
+        record_locally(registry)
+        register_slot_metrics(
+            registry,
+            lambda: self.concurrency,
+            lambda: self._in_flight,
+            lambda: self.concurrency - self._running,
+        )
+        register_image_cache_metrics(registry, image_cache, image_puller)
+        register_concurrency_metrics(registry, controller)
+        register_spool_metrics(registry, result_spool)
+        start_metrics_server(registry)
+
+    def _resize(self, concurrency: int) -> None:
+        """Apply a change in concurrency to the slots and the channel prefetch"""
+        self.concurrency = concurrency
+        self._update_prefetch()
+        self._spawn(self._notify_slot_freed())
+
+    def _update_prefetch(self) -> None:
+        """Set the prefetch to the concurrency, plus the tasks waiting on a pull of
+        their image up to the pull backlog"""
+        if self._channel is not None and self._channel.is_open:
+            self._channel.basic_qos(
+                prefetch_count=self.concurrency + min(self._pulling, PULL_BACKLOG),
+                global_qos=True,
+            )
+
+    async def _notify_slot_freed(self) -> None:
+        async with self._slot_freed:
+            self._slot_freed.notify_all()
+
+    def _on_connection_open(self, connection: AsyncioConnection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_closed(self, connection: AsyncioConnection, reason) -> None:
+        self._channel = None
+
+        if not self._closed.done():
+            self._closed.set_result(reason)
+
+    def _on_channel_open(self, channel: Channel) -> None:
+        logger.info("Starting engine with concurrency %s", self.concurrency)
+        self._channel = channel
+
+        self._update_prefetch()
+        for queue in self._queues:
+            channel.basic_consume(queue, self._handle_delivery)
+
+    def _handle_delivery(
+        self,
+        channel: Channel,
+        method: Basic.Deliver,
+        properties: BasicProperties,
+        body: bytes,
+    ) -> None:
+        """Called when we receive a message from RabbitMQ"""
+        try:
+            msg_type = properties.headers.get("x-msg-type", "__NONE__")
+            msg_body = json.loads(body.decode())
+
+            logger.info("Received message %s", msg_type)
+
+            match msg_type:
+                case "PULL_IMAGE":
+                    self._spawn(self._pull_image(msg_body))
+                    channel.basic_ack(method.delivery_tag)
+                case "TASK_PACKAGE":
+                    self._spawn(self._run(msg_body, channel, method.delivery_tag))
+                case _:
+                    logger.error("Unrecognized message type: %s", msg_type)
+                    channel.basic_ack(method.delivery_tag)
+        except Exception as exc:
+            logger.error("Error handling received message: %s", exc)
+
+    def _spawn(self, coroutine) -> None:
+        """Run the coroutine in the background, keeping a reference to it until it
+        completes so that it is not garbage collected"""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _pull_image(self, task: dict) -> None:
+        """Pull the image in the background, without taking a slot, if the runner
+        serves its package"""
+        if not serves_package(task.get("environment"), task.get("runner_label")):
+            return
+
+        try:
+            await _retry(_fetch_image, task["package"], retry_on=DockerException)
+        except DockerException as exc:
+            logger.error("Unable to pull %s: %s", task["package"], exc)
+
+    async def _run(self, task: dict, channel: Channel, delivery_tag: int) -> None:
+        """Run the task and spool its result, then acknowledge the tasking message
+
+        Should the result not be spooled, the message is left unacknowledged so that
+        it is redelivered.
+        """
+        task_id = task["id"]
+        self._in_flight += 1
+
+        try:
+            result = await self._execute(task)
+
+            with timed("result_spool"):
+                await _retry(
+                    result_spool.put, result, retry_on=(sqlite3.Error, OSError)
+                )
+
+            self._drainer.wake()
+        except Exception as exc:
+            logger.error("Unable to spool the result of task %s: %s", task_id, exc)
+            return
+        finally:
+            self._in_flight -= 1
+
+        # The delivery tag is only valid on the channel that delivered the message.
+        # Should the connection have been lost, the message will be redelivered.
+        if channel is self._channel and channel.is_open:
+            channel.basic_ack(delivery_tag)
+
+        logger.debug("Task %s finished", task_id)
+
+    async def _execute(self, task: dict) -> dict:
+        """Fetch the image and run the task, returning its result
+
+        The task only waits for a slot once its image is present, so that slow pulls
+        do not hold up the tasks whose images are already present. Failures are
+        reported as a failed result, rather than leaving the task running in the core
+        once its message has been acknowledged.
+        """
+        task_id = task["id"]
+
+        try:
+            await _retry(self._fetch_image, task["package"], retry_on=DockerException)
+        except Exception as exc:
+            logger.error("Unable to fetch the image for task %s: %s", task_id, exc)
+            return failed_result(task, exc)
+
+        ready = monotonic()
+
+        async with self._slot_freed:
+            await self._slot_freed.wait_for(lambda: self._running < self.concurrency)
+            self._running += 1
+
+        observe_phase("queue_wait", monotonic() - ready)
+
+        try:
+            return await asyncio.to_thread(execute_task, task)
+        except Exception as exc:
+            logger.error("Unable to run task %s: %s", task_id, exc)
+            return failed_result(task, exc)
+        finally:
+            async with self._slot_freed:
+                self._running -= 1
+                self._slot_freed.notify_all()
+
+    async def _fetch_image(self, image: str) -> bool:
+        """Wait for the image puller to ensure that the image is present, raising the
+        prefetch while it is pulled"""
+        pull = image_puller.pull(image)
+
+        if pull.done():
+            return pull.result()
+
+        self._pulling += 1
+        self._update_prefetch()
+
+        try:
+            return await asyncio.wrap_future(pull)
+        finally:
+            self._pulling -= 1
+            self._update_prefetch()
+
+
+async def _fetch_image(image: str) -> bool:
+    """Wait for the image puller to ensure that the image is present"""
+    return await asyncio.wrap_future(image_puller.pull(image))
+
+
+async def _retry(
+    function: Callable,
+    *args,
+    retry_on=Exception,
+    retries: int = MAX_RETRIES,
+    delay: float = RETRY_DELAY,
+):
+    """Call the function, retrying it after a delay if it raises one of the retry_on
+    exceptions. Blocking functions are called from a thread."""
+    for attempt in range(retries + 1):
+        try:
+            if asyncio.iscoroutinefunction(function):
+                return await function(*args)
+
+            return await asyncio.to_thread(function, *args)
+        except retry_on as exc:
+            if attempt == retries:
+                raise
+
+            logger.warning(
+                "%s failed: %s. Retrying in %ss", function.__name__, exc, delay
+            )
+            await asyncio.sleep(delay)
+
+
+def start_engine() -> None:
+    """Run the asyncio engine until interrupted"""
+    try:
+        asyncio.run(AsyncEngine().run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,35 @@
+"""Entrypoint for running a function with the process executor
+
+This is copied into the unpacked package alongside functions.py and run with the
+package's virtualenv, in place of the main.py from the package's base image. It must
+only use the standard library.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import functions
+
+OUTPUT_SEPARATOR = "==== Output From Command ===="
+
+logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--function", help="the function to call")
+    parser.add_argument(
+        "-p",
+        "--parameters",
+        help="the parameters to pass to the function in JSON format",
+    )
+
+    args = parser.parse_args()
+
+    os.makedirs(os.environ["FUNCTIONARY_OUTPUT_DIR"], exist_ok=True)
+
+    result = getattr(functions, args.function)(**json.loads(args.parameters))
+    output = json.dumps(result, default=str)
+
+    print(f"{OUTPUT_SEPARATOR}\n{output}")
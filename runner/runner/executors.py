@@ -0,0 +1,444 @@
+"""Task executors
+
+An executor runs a function for a task and returns its exit status, output, result
+and output files. The DockerExecutor, which runs each task in a container started
+from the package image, is the default and the only executor that supports every
+package.
+
+For trusted, internally built Python packages, the ProcessExecutor avoids the cost
+of starting a container for each task. The package contents are unpacked once per
+build into a cached virtualenv, and each task then runs as a subprocess of the
+runner using that virtualenv. This offers none of the isolation of a container, so
+the executor must be enabled on the runner with RUNNER_EXECUTORS, in addition to
+being selected for the environment or package in the core. Tasks requesting an
+executor that the runner has not enabled, or that does not support the task, are run
+with the DockerExecutor.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tarfile
+import venv
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from os import getenv
+from os.path import dirname, exists, join
+from tempfile import mkdtemp
+from threading import Event, Timer
+from typing import Iterator, Optional, Tuple
+
+from docker.errors import DockerException
+
+import docker
+
+from .artifacts import (
+    OUTPUT_DIR,
+    OUTPUT_DIR_VARIABLE,
+    ArtifactStore,
+    artifact_store,
+    collect_directory_files,
+    collect_output_files,
+)
+from .containers import (
+    TASK_LABEL,
+    TIMEOUT_STATUS,
+    Deadline,
+    container_labels,
+    timeout_message,
+)
+from .images import RUNNER_DATA_DIR
+from .metrics import timed
+from .pool import ServerModeUnsupported, warm_pool
+from .resources import ResourceMonitor, empty_usage, rusage_usage
+from .streaming import LogStream, parse_function_output
+
+DOCKER_EXECUTOR = "docker"
+PROCESS_EXECUTOR = "process"
+
+ENABLED_EXECUTORS = [
+    executor.strip()
+    for executor in getenv("RUNNER_EXECUTORS", DOCKER_EXECUTOR).split(",")
+    if executor.strip()
+]
+VIRTUALENV_CACHE_SIZE = int(getenv("RUNNER_VIRTUALENV_CACHE_SIZE", 20))
+
+ENTRYPOINT = "__functionary_main__.py"
+READY_FILE = ".ready"
+
+logger = logging.getLogger(__name__)
+
+
+class Executor(ABC):
+    """Interface for the task executors"""
+
+    def supports(self, task: dict) -> bool:
+        """Whether the executor is able to run the task"""
+        return True
+
+    @abstractmethod
+    def run(self, task: dict, timeout: float) -> Tuple:
+        """Run the function for the task
+
+        Args:
+            task: The task to execute
+            timeout: Seconds to allow the function to run for before it is stopped
+
+        Returns:
+            A tuple of (exit_status, output, result, artifacts, resources), where
+            resources is the resource usage report for the task
+        """
+
+
+class DockerExecutor(Executor):
+    """Runs each task in a container started from the package image, or in a warm
+    container from the pool if the pool is enabled"""
+
+    def run(self, task: dict, timeout: float) -> Tuple:
+        package = task["package"]
+
+        if warm_pool.supports(package):
+            try:
+                return warm_pool.run(task, timeout)
+            except ServerModeUnsupported:
+                logger.info(
+                    "%s does not support server mode, using a new container", package
+                )
+            except DockerException as exc:
+                return _failed(exc)
+
+        docker_client = docker.from_env()
+        run_command = [
+            "--function",
+            task["function"],
+            "--parameters",
+            json.dumps(task["function_parameters"]),
+        ]
+
+        try:
+            with timed("container_start"):
+                container = docker_client.containers.run(
+                    package,
+                    auto_remove=False,
+                    detach=True,
+                    command=run_command,
+                    environment={
+                        **(task.get("variables") or {}),
+                        OUTPUT_DIR_VARIABLE: OUTPUT_DIR,
+                    },
+                    labels=container_labels(**{TASK_LABEL: task["id"]}),
+                )
+        except DockerException as exc:
+            return _failed(exc)
+
+        log_stream = LogStream(task["id"])
+
+        try:
+            with timed("execution"), Deadline(
+                container, timeout
+            ) as deadline, ResourceMonitor(container) as monitor:
+                output, result = parse_function_output(
+                    container.logs(stream=True), log_stream
+                )
+                exit_status = container.wait()["StatusCode"]
+
+            try:
+                with timed("output_collection"):
+                    artifacts = collect_output_files(container, artifact_store)
+            except (DockerException, OSError) as exc:
+                logger.warning(
+                    "Unable to collect output files for %s: %s", task["id"], exc
+                )
+                artifacts = []
+        finally:
+            with timed("container_remove"):
+                _remove_container(container)
+
+        if deadline.expired:
+            return _timed_out(output, timeout, artifacts, monitor.usage())
+
+        return (exit_status, output, result, artifacts, monitor.usage())
+
+
+class VirtualenvCache:
+    """Package contents unpacked into virtualenvs, keyed by build id
+
+    Each entry holds the unpacked package in app/ and its virtualenv in venv/. Entries
+    are prepared in a temporary directory and renamed into place once complete, with
+    a lock file preventing the runner's processes from preparing the same build at
+    once. Once there are more than size entries, the least recently used are removed.
+
+    Tasks hold a shared lock on the entry they run with, see use(), and entries that
+    are locked are never removed. The cache may exceed its size while they are in use.
+
+    Attributes:
+        root: Directory in which the virtualenvs are kept
+        store: Artifact store holding the package contents
+        size: The number of virtualenvs to keep
+    """
+
+    def __init__(
+        self,
+        root: str = join(RUNNER_DATA_DIR, "virtualenvs"),
+        store: ArtifactStore = artifact_store,
+        size: int = VIRTUALENV_CACHE_SIZE,
+    ) -> None:
+        self.root = root
+        self.store = store
+        self.size = size
+
+    @contextmanager
+    def use(self, build_id: str, source_digest: str) -> Iterator[str]:
+        """Prepare the entry for the build if needed, and keep it from being removed
+        for the duration of the context
+
+        Yields:
+            The path of the entry
+        """
+        os.makedirs(self.root, exist_ok=True)
+
+        with open(self._in_use_file(build_id), "w") as in_use_file:
+            fcntl.flock(in_use_file, fcntl.LOCK_SH)
+
+            yield self.get(build_id, source_digest)
+
+    def get(self, build_id: str, source_digest: str) -> str:
+        """Returns the path of the entry for the build, preparing it if needed. The
+        entry may be removed once returned unless it is held with use()."""
+        path = join(self.root, build_id)
+        ready_file = join(path, READY_FILE)
+
+        if not exists(ready_file):
+            os.makedirs(self.root, exist_ok=True)
+
+            with open(join(self.root, f".{build_id}.lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                if not exists(ready_file):
+                    with timed("virtualenv_create"):
+                        self._prepare(path, source_digest)
+
+            self.evict(keep=build_id)
+
+        os.utime(ready_file)
+
+        return path
+
+    def _prepare(self, path: str, source_digest: str) -> None:
+        logger.info("Preparing virtualenv for %s", os.path.basename(path))
+        temp_path = mkdtemp(dir=self.root, prefix=".prepare-")
+
+        try:
+            app_path = join(temp_path, "app")
+            venv_path = join(temp_path, "venv")
+
+            with self.store.open(source_digest) as source:
+                with tarfile.open(fileobj=source, mode="r") as tarball:
+                    tarball.extractall(app_path, filter="data")
+
+            shutil.copy(join(dirname(__file__), "entrypoint.py"), app_path)
+            os.rename(join(app_path, "entrypoint.py"), join(app_path, ENTRYPOINT))
+
+            requirements = join(app_path, "requirements.txt")
+            install = exists(requirements) and _has_requirements(requirements)
+
+            venv.create(venv_path, with_pip=install)
+
+            if install:
+                subprocess.run(
+                    [join(venv_path, "bin", "python"), "-m", "pip", "install"]
+                    + ["--quiet", "--requirement", requirements],
+                    check=True,
+                    capture_output=True,
+                )
+
+            open(join(temp_path, READY_FILE), "w").close()
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(temp_path, path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used virtualenvs beyond the cache size"""
+        entries = []
+
+        for name in os.listdir(self.root):
+            ready_file = join(self.root, name, READY_FILE)
+
+            if name != keep and exists(ready_file):
+                entries.append((os.path.getmtime(ready_file), name))
+
+        for _, name in sorted(entries)[: max(len(entries) + 1 - self.size, 0)]:
+            with open(self._in_use_file(name), "w") as in_use_file:
+                try:
+                    fcntl.flock(in_use_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.debug("Not removing virtualenv for %s while in use", name)
+                    continue
+
+                logger.info("Removing virtualenv for %s", name)
+                shutil.rmtree(join(self.root, name), ignore_errors=True)
+
+    def _in_use_file(self, build_id: str) -> str:
+        return join(self.root, f".{build_id}.in-use")
+
+
+class ProcessExecutor(Executor):
+    """Runs each task as a subprocess of the runner, using a cached virtualenv for
+    the package's build
+
+    Attributes:
+        cache: The cache of package virtualenvs
+    """
+
+    def __init__(self, cache: Optional[VirtualenvCache] = None) -> None:
+        self.cache = cache or VirtualenvCache()
+
+    def supports(self, task: dict) -> bool:
+        return task.get("language") == "python" and bool(task.get("source"))
+
+    def run(self, task: dict, timeout: float) -> Tuple:
+        # Package images are tagged with the id of the build that produced them
+        build_id = task["package"].rpartition(":")[2]
+
+        try:
+            with self.cache.use(build_id, task["source"]) as path:
+                return self._run(task, path, timeout)
+        except (OSError, tarfile.TarError, subprocess.CalledProcessError) as exc:
+            return _failed(exc)
+
+    def _run(self, task: dict, path: str, timeout: float) -> Tuple:
+        output_dir = mkdtemp(prefix="functionary-output-")
+        variables = {
+            name: str(value) for name, value in (task.get("variables") or {}).items()
+        }
+        environment = {
+            "PATH": f"{join(path, 'venv', 'bin')}:/usr/bin:/bin",
+            "HOME": output_dir,
+            "PYTHONUNBUFFERED": "1",
+            **variables,
+            OUTPUT_DIR_VARIABLE: output_dir,
+        }
+        command = [
+            join(path, "venv", "bin", "python"),
+            ENTRYPOINT,
+            "--function",
+            task["function"],
+            "--parameters",
+            json.dumps(task["function_parameters"]),
+        ]
+
+        try:
+            with timed("process_start"):
+                process = subprocess.Popen(
+                    command,
+                    cwd=join(path, "app"),
+                    env=environment,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    start_new_session=True,
+                )
+
+            log_stream = LogStream(task["id"])
+            expired = Event()
+            timer = Timer(timeout, _kill_process_group, args=(process, expired))
+            timer.daemon = True
+            timer.start()
+
+            try:
+                with timed("execution"):
+                    output, result = parse_function_output(
+                        iter(lambda: process.stdout.read1(65536), b""), log_stream
+                    )
+                    exit_status, resources = _wait(process)
+            finally:
+                timer.cancel()
+                process.stdout.close()
+
+            with timed("output_collection"):
+                artifacts = collect_directory_files(output_dir, artifact_store)
+        except OSError as exc:
+            return _failed(exc)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        if expired.is_set():
+            return _timed_out(output, timeout, artifacts, resources)
+
+        return (exit_status, output, result, artifacts, resources)
+
+
+def _has_requirements(requirements: str) -> bool:
+    with open(requirements) as requirements_file:
+        return any(
+            line.strip() and not line.strip().startswith("#")
+            for line in requirements_file
+        )
+
+
+def _kill_process_group(process: subprocess.Popen, expired: Event) -> None:
+    logger.warning("Killing process %s after exceeding its timeout", process.pid)
+    expired.set()
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _wait(process: subprocess.Popen) -> Tuple[int, dict]:
+    """Wait for the process to exit, returning its exit status and resource usage"""
+    _, wait_status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+    return (process.returncode, rusage_usage(rusage))
+
+
+def _remove_container(container) -> None:
+    try:
+        container.remove(force=True)
+    except DockerException as exc:
+        logger.warning("Unable to remove container %s: %s", container.short_id, exc)
+
+
+def _failed(exc: Exception) -> Tuple:
+    output = f"Unable to execute function. Encountered error: {exc}"
+
+    return (1, output, "null", [], empty_usage())
+
+
+def _timed_out(
+    output: bytes, timeout: float, artifacts: list, resources: dict
+) -> Tuple:
+    output = b"\n".join(filter(None, [output, timeout_message(timeout).encode()]))
+
+    return (TIMEOUT_STATUS, output, "null", artifacts, resources)
+
+
+EXECUTORS: dict[str, Executor] = {
+    DOCKER_EXECUTOR: DockerExecutor(),
+    PROCESS_EXECUTOR: ProcessExecutor(),
+}
+
+
+def get_executor(task: dict) -> Executor:
+    """Returns the executor to run the task with
+
+    The executor requested by the task is used if it is enabled on the runner and
+    supports the task. Otherwise the task is run with the DockerExecutor.
+    """
+    requested = task.get("executor") or DOCKER_EXECUTOR
+    executor = EXECUTORS.get(requested)
+
+    if requested not in ENABLED_EXECUTORS or executor is None:
+        return EXECUTORS[DOCKER_EXECUTOR]
+    elif not executor.supports(task):
+        logger.debug("%s executor does not support task %s", requested, task["id"])
+        return EXECUTORS[DOCKER_EXECUTOR]
+
+    return executor
@@ -1,15 +1,16 @@
-import itertools
-import json
 import logging
+import sqlite3
 
 from docker.errors import DockerException
 
-import docker
-
+from .artifacts import artifact_store, store_result
 from .celery import app
-from .messaging import send_message
-
-OUTPUT_SEPARATOR = b"==== Output From Command ====\n"
+from .containers import DEFAULT_TASK_TIMEOUT
+from .executors import get_executor
+from .images import image_cache
+from .metrics import count_task, timed
+from .resources import empty_usage
+from .spool import result_spool
 
 logger = logging.getLogger(__name__)
 
@@ -22,61 +23,77 @@ logger = logging.getLogger(__name__)
     autoretry_for=(DockerException,),
 )
 def pull_image(task) -> None:
+    """Ensure that the task's image is present. The listener has normally fetched it
+    through the image puller already, which recorded the cache hit or miss, so it is
+    only pulled here if it is missing from the cache."""
     package = task.get("package")
 
-    docker_client = docker.from_env()
-    docker_client.images.pull(package)
+    if image_cache.contains(package):
+        logger.debug(f"Using cached image {package}")
+        return
+
+    with timed("image_pull"):
+        image_cache.pull(package)
 
     logger.debug(f"Pulled {package}")
 
 
 @app.task()
 def run_task(_=None, task=None):
-    exit_status, output, result = _run_task(task)
+    return execute_task(task)
 
-    return {
+
+def execute_task(task: dict) -> dict:
+    """Run the task and build the TASK_RESULT message for it"""
+    with timed("task"):
+        exit_status, output, result, artifacts, resources = _run_task(task)
+
+    count_task(exit_status)
+    result = result.encode() if isinstance(result, str) else result
+
+    message = {
         "task_id": task["id"],
         "status": exit_status,
         "output": output.decode() if isinstance(output, bytes) else output,
-        "result": result.decode() if isinstance(result, bytes) else result,
+        "result": result.decode(),
+        "artifacts": artifacts,
+        "resources": resources,
     }
 
+    # Large results are passed by reference rather than through the message broker
+    if result_artifact := store_result(result, artifact_store):
+        message["result"] = None
+        message["result_artifact"] = result_artifact
 
-def _run_task(task):
-    package = task.get("package")
-    function = task.get("function")
-    parameters = json.dumps(task["function_parameters"])
-    variables = task.get("variables")
-    run_command = ["--function", function, "--parameters", parameters]
+    return message
 
-    logger.info("Running %s from package %s", function, package)
-    docker_client = docker.from_env()
-    try:
-        container = docker_client.containers.run(
-            package,
-            auto_remove=False,
-            detach=True,
-            command=run_command,
-            environment=variables,
-        )
-    except DockerException as exc:
-        return (1, f"Unable to execute function. Encountered error: {exc}", "null")
 
-    exit_status = container.wait()["StatusCode"]
-    output, result = _parse_container_logs(container.logs(stream=True))
+def failed_result(task: dict, exc: Exception) -> dict:
+    """Build the TASK_RESULT message for a task that could not be run"""
+    count_task(1)
 
-    container.remove()
+    return {
+        "task_id": task["id"],
+        "status": 1,
+        "output": f"Unable to execute function. Encountered error: {exc}",
+        "result": "null",
+        "artifacts": [],
+        "resources": empty_usage(),
+    }
 
-    return (exit_status, output, result)
 
+def _run_task(task):
+    timeout = task.get("timeout") or DEFAULT_TASK_TIMEOUT
+    executor = get_executor(task)
 
-def _parse_container_logs(logs):
-    output = b"".join(
-        itertools.takewhile(lambda x: x != OUTPUT_SEPARATOR, logs)
-    ).rstrip()
-    result = b"".join(logs).rstrip()
+    logger.info(
+        "Running %s from package %s with %s",
+        task.get("function"),
+        task.get("package"),
+        type(executor).__name__,
+    )
 
-    return output, result
+    return executor.run(task, timeout)
 
 
 @app.task(
@@ -84,9 +101,11 @@ def _parse_container_logs(logs):
     retry_kwargs={
         "max_retries": 3,
     },
-    autoretry_for=(Exception,),
+    autoretry_for=(sqlite3.Error, OSError),
 )
 def publish_result(result):
-    # TODO: The routing key should come from the configuration information received
-    #       during runner registration.
-    send_message("tasking.results", "TASK_RESULT", result)
+    """Write the result to the spool, from which the listener publishes it. This is
+    the final task of a TASK_PACKAGE chain, so the tasking message is acknowledged
+    only once the result is safely on disk."""
+    with timed("result_spool"):
+        result_spool.put(result)
@@ -0,0 +1,314 @@
+"""Local package image cache
+
+Package images are tagged with the id of the build that produced them, so a tag that
+is already present locally never needs to be pulled again. The ImageCache keeps an
+index of the package images the runner has pulled, along with their size and when
+they were last used, so that pulls can be skipped for images that are already
+present and the least recently used images can be removed once the images exceed the
+disk budget.
+
+The index is kept in a SQLite database in RUNNER_DATA_DIR so that it is shared by all
+of the runner's processes. Should an indexed image be removed by something other than
+the runner, the docker client will pull it when the container is created.
+
+Images that are not yet present are fetched by the ImagePuller, a stage ahead of task
+execution with a concurrency limit of its own, so that a task only takes an execution
+slot once its image is present.
+"""
+import logging
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from os import getenv, makedirs
+from os.path import dirname, join
+from tempfile import gettempdir
+from threading import Lock
+from time import time
+from typing import Optional
+
+from docker.errors import APIError, ImageNotFound
+
+import docker
+
+from .metrics import timed
+
+RUNNER_DATA_DIR = getenv("RUNNER_DATA_DIR", join(gettempdir(), "functionary-runner"))
+IMAGE_CACHE_BUDGET = int(getenv("RUNNER_IMAGE_CACHE_BUDGET_MB", 10240)) * 1024 * 1024
+PULL_CONCURRENCY = int(getenv("RUNNER_PULL_CONCURRENCY", 2))
+
+# The number of tasks that may be held waiting on their image, beyond those that
+# occupy an execution slot
+PULL_BACKLOG = int(getenv("RUNNER_PULL_BACKLOG", 16))
+
+MUTABLE_TAGS = ["latest"]
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """Index of the package images present on the runner
+
+    Attributes:
+        path: Path to the SQLite database holding the index
+        budget: Maximum total size, in bytes, of the indexed images. Images are
+                evicted, least recently used first, once this is exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str = join(RUNNER_DATA_DIR, "images.sqlite3"),
+        budget: int = IMAGE_CACHE_BUDGET,
+    ) -> None:
+        self.path = path
+        self.budget = budget
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            makedirs(dirname(self.path), exist_ok=True)
+
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+        if not self._initialized:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """
+            )
+            self._initialized = True
+
+        return connection
+
+    def pull(self, image: str) -> bool:
+        """Ensure that the image is present locally, pulling it only if needed
+
+        Args:
+            image: Full name of the image, including the tag
+
+        Returns:
+            True if the image was already present, False if it had to be pulled
+        """
+        if self.hit(image):
+            return True
+
+        self._increment("misses")
+
+        docker.from_env().images.pull(image)
+
+        self.add(image)
+        self.evict(keep=image)
+
+        return False
+
+    def hit(self, image: str) -> bool:
+        """Record a use of the image if it is in the index, counting it as a cache
+        hit and marking it as having just been used
+
+        Returns:
+            True if the image is in the index, otherwise False
+        """
+        if not self.contains(image):
+            return False
+
+        self._increment("hits")
+        self.touch(image)
+
+        return True
+
+    def contains(self, image: str) -> bool:
+        """Whether the image is in the index. Images with a mutable tag are never
+        considered cached, since the tag may now refer to a different image."""
+        if _get_tag(image) in MUTABLE_TAGS:
+            return False
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM images WHERE name = ?", (image,)
+            ).fetchone()
+
+        return row is not None
+
+    def add(self, image: str) -> None:
+        """Add a locally present image to the index"""
+        try:
+            size = docker.from_env().images.get(image).attrs.get("Size", 0)
+        except ImageNotFound:
+            return
+
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO images (name, size, last_used) "
+                "VALUES (?, ?, ?)",
+                (image, size, time()),
+            )
+
+    def touch(self, image: str) -> None:
+        """Mark the image as having just been used"""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE images SET last_used = ? WHERE name = ?", (time(), image)
+            )
+
+    def discard(self, image: str) -> None:
+        """Remove the image from the index"""
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM images WHERE name = ?", (image,))
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used images until the total size of the indexed
+        images is within the budget. Images that are in use by a container can not be
+        removed and are skipped.
+
+        Args:
+            keep: An image that should not be evicted, such as one that is about to be
+                  used
+        """
+        with closing(self._connect()) as connection:
+            images = connection.execute(
+                "SELECT name, size FROM images ORDER BY last_used"
+            ).fetchall()
+
+        total_size = sum(size for _, size in images)
+        docker_client = docker.from_env()
+
+        for name, size in images:
+            if total_size <= self.budget:
+                break
+            elif name == keep:
+                continue
+
+            try:
+                docker_client.images.remove(name)
+            except ImageNotFound:
+                pass
+            except APIError as exc:
+                logger.debug("Unable to evict image %s: %s", name, exc)
+                continue
+
+            logger.info("Evicted image %s from the image cache", name)
+            self.discard(name)
+            self._increment("evictions")
+            total_size -= size
+
+    def sync(self) -> None:
+        """Drop any images from the index that are no longer present locally"""
+        names = self.images()
+
+        present = set()
+        for image in docker.from_env().images.list():
+            present.update(image.tags)
+
+        for name in names:
+            if name not in present:
+                self.discard(name)
+
+    def images(self) -> list[str]:
+        """Names of the images in the index"""
+        with closing(self._connect()) as connection:
+            return [row[0] for row in connection.execute("SELECT name FROM images")]
+
+    def stats(self) -> dict:
+        """Cache counters and current usage"""
+        with closing(self._connect()) as connection:
+            counters = dict(connection.execute("SELECT name, value FROM counters"))
+            count, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+            ).fetchone()
+
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "images": count,
+            "size": size,
+            "budget": self.budget,
+        }
+
+    def _increment(self, counter: str) -> None:
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (counter,),
+            )
+
+
+class ImagePuller:
+    """Fetches images for tasks ahead of their execution
+
+    Pulls run on a pool of threads with a concurrency limit of their own, separate
+    from the execution slots. Concurrent requests for an image that is already being
+    pulled share that pull, and are all completed when it finishes.
+
+    Attributes:
+        cache: The image cache that pulled images are added to
+        concurrency: The maximum number of images to pull at once
+    """
+
+    def __init__(self, cache: ImageCache, concurrency: int = PULL_CONCURRENCY) -> None:
+        self.cache = cache
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="pull")
+        self._pulls: dict[str, Future] = {}
+        self._lock = Lock()
+
+    @property
+    def pulling(self) -> int:
+        """The number of images being pulled or waiting to be pulled"""
+        return len(self._pulls)
+
+    def pull(self, image: str) -> Future:
+        """Ensure that the image is present locally
+
+        Returns:
+            A Future that completes once the image is present, or fails with the
+            error raised by the pull. Images that are already cached return a
+            completed Future, without waiting behind any pulls in progress.
+        """
+        if self.cache.hit(image):
+            future = Future()
+            future.set_result(True)
+
+            return future
+
+        with self._lock:
+            if (future := self._pulls.get(image)) is not None:
+                logger.debug("Waiting on pull already in progress for %s", image)
+                return future
+
+            future = self._executor.submit(self._pull, image)
+            self._pulls[image] = future
+
+        future.add_done_callback(lambda _: self._forget(image))
+
+        return future
+
+    def _pull(self, image: str) -> bool:
+        with timed("image_pull"):
+            return self.cache.pull(image)
+
+    def _forget(self, image: str) -> None:
+        with self._lock:
+            self._pulls.pop(image, None)
+
+
+def _get_tag(image: str) -> str:
+    """Returns the tag portion of the image name, which is latest if unspecified"""
+    name, _, tag = image.rpartition(":")
+
+    if not name or "/" in tag:
+        return "latest"
+
+    return tag
+
+
+image_cache = ImageCache()
+image_puller = ImagePuller(image_cache)
@@ -1,45 +1,141 @@
+from concurrent.futures import Future
+from functools import partial
 from json import loads
 from logging import getLogger
 from logging.config import dictConfig
-from time import sleep
+from threading import Thread
 
 from celery import chain
-from celery.app.control import Inspect
-from pika.channel import Channel
+from pika.adapters.blocking_connection import BlockingChannel, BlockingConnection
 from pika.spec import Basic, BasicProperties
 
-from .celery import WORKER_CONCURRENCY, WORKER_NAME, app
+from .celery import WORKER_CONCURRENCY
+from .concurrency import ConcurrencyController, QueueDepth, concurrency_limits
 from .handlers import publish_result, pull_image, run_task
+from .images import PULL_BACKLOG, image_cache, image_puller
 from .logging_configs import LISTENER_LOGGING
 from .messaging import build_connection
+from .metrics import (
+    MetricsRegistry,
+    register_concurrency_metrics,
+    register_image_cache_metrics,
+    register_slot_metrics,
+    register_spool_metrics,
+    start_metrics_server,
+)
+from .pools import declare_queues, serves_package, task_queues
+from .registration import Heartbeat
+from .slots import SlotTracker, task_events
+from .spool import SpoolDrainer, result_spool
 
 logger = getLogger(__name__)
 dictConfig(LISTENER_LOGGING)
 
-WAIT_FOR_AVAILABLE_WORKER_DELAY = 2
-WAIT_FOR_MESSAGE_DELAY = 0.5
-
 
 def start_listening():
+    """Consume tasking messages, handing them off to the worker as slots free up
+
+    Each task's image is fetched by the image puller before the task takes a slot,
+    so that slow pulls do not hold up the worker. Once the image is present, the task
+    waits for a free slot and is then handed off to the worker.
+
+    TASK_PACKAGE messages are only acknowledged once the worker reports that the task
+    has finished, which is once its result has been written to the result spool. The
+    results are then published from the spool by the SpoolDrainer.
+
+    The channel prefetch, which is shared across the queues of the pools the runner
+    serves, is set to the concurrency, so the broker only pushes a new task when there
+    is room for it, and tasks are otherwise left in the queues where the pools can
+    expire them. While tasks are held waiting on the pull of their image, the prefetch
+    is raised by one for each of them, up to the pull backlog, so that tasks whose
+    images are present are not held up behind them. The prefetch is updated whenever
+    the concurrency controller adjusts the concurrency.
+    """
     logger.info("Starting listener")
     connection = build_connection()
     channel = connection.channel()
+    slots = SlotTracker(WORKER_CONCURRENCY)
+    registry = MetricsRegistry()
+
+    controller = ConcurrencyController(
+        WORKER_CONCURRENCY,
+        *concurrency_limits(WORKER_CONCURRENCY),
+        free_slots=lambda: slots.free_slots,
+        backlog=partial(_backlog, QueueDepth(task_queues()), slots),
+        on_change=lambda concurrency: connection.add_callback_threadsafe(
+            partial(_resize, channel, slots, concurrency)
+        ),
+    )
+    slots.concurrency = controller.concurrency
+
+    register_slot_metrics(
+        registry,
+        lambda: slots.concurrency,
+        lambda: slots.in_flight,
+        lambda: slots.free_slots,
+    )
+    register_image_cache_metrics(registry, image_cache, image_puller)
+    register_concurrency_metrics(registry, controller)
+    register_spool_metrics(registry, result_spool)
+    start_metrics_server(registry)
+
+    drainer = SpoolDrainer(result_spool)
+    drainer.start()
+
+    heartbeat = Heartbeat(lambda: slots.concurrency, lambda: slots.free_slots)
+    heartbeat.start()
+    controller.start()
+
+    _update_prefetch(channel, slots)
+    for queue in declare_queues():
+        channel.basic_consume(queue, partial(_handle_delivery, slots=slots))
+
+    Thread(
+        target=_watch_task_events,
+        args=(connection, channel, slots, registry, drainer),
+        name="task events",
+        daemon=True,
+    ).start()
 
-    inspect = _get_inspect()
+    try:
+        channel.start_consuming()
+    except KeyboardInterrupt:
+        channel.stop_consuming()
+        connection.close()
+    finally:
+        controller.stop()
+        heartbeat.stop()
+        drainer.stop()
 
-    while True:
-        method, properties, body = channel.basic_get("public")
 
-        if method is None:
-            sleep(WAIT_FOR_MESSAGE_DELAY)
-            continue
+def _backlog(queue_depth: QueueDepth, slots: SlotTracker) -> int:
+    """The tasks waiting in the runner's queues or for a slot on the runner"""
+    return (queue_depth() or 0) + slots.waiting
+
+
+def _resize(channel: BlockingChannel, slots: SlotTracker, concurrency: int) -> None:
+    """Apply a change in concurrency to the slots and the channel prefetch"""
+    slots.concurrency = concurrency
+    _update_prefetch(channel, slots)
+
+    _dispatch_ready(slots)
+
 
-        _handle_delivery(channel, method, properties, body)
-        _wait_for_available_worker(inspect)
+def _update_prefetch(channel: BlockingChannel, slots: SlotTracker) -> None:
+    """Set the prefetch to the concurrency, plus the tasks waiting on a pull of their
+    image up to the pull backlog"""
+    channel.basic_qos(
+        prefetch_count=slots.concurrency + min(slots.pulling, PULL_BACKLOG),
+        global_qos=True,
+    )
 
 
 def _handle_delivery(
-    channel: Channel, method: Basic.GetOk, properties: BasicProperties, body: bytes
+    channel: BlockingChannel,
+    method: Basic.Deliver,
+    properties: BasicProperties,
+    body: bytes,
+    slots: SlotTracker,
 ):
     """Called when we receive a message from RabbitMQ"""
 
@@ -52,68 +148,134 @@ def _handle_delivery(
 
         match msg_type:
             case "PULL_IMAGE":
-                pull_image.delay(**msg_body)
+                _prewarm_image(msg_body)
+                channel.basic_ack(method.delivery_tag)
             case "TASK_PACKAGE":
-                pull_image_s = pull_image.s(msg_body)
-                run_task_s = run_task.s(task=msg_body)
-                publish_task_s = publish_result.s()
-
-                chain(pull_image_s, run_task_s, publish_task_s).delay()
+                _fetch_image(channel, msg_body, method.delivery_tag, slots)
             case _:
                 logger.error("Unrecognized message type: %s", msg_type)
-
-        channel.basic_ack(method.delivery_tag)
+                channel.basic_ack(method.delivery_tag)
     except Exception as exc:
         logger.error("Error handling received message: %s", exc)
 
 
-def _get_inspect() -> Inspect:
-    """Return Celery Inspect object after connection to Celery Workers is established"""
-    inspect = Inspect(app=app)
-    while inspect.ping() is None:
-        logger.info("Waiting for connection to Celery workers to be established.")
-        sleep(1)
+def _prewarm_image(message: dict) -> None:
+    """Pull the image in the background, if the runner serves its package"""
+    if not serves_package(message.get("environment"), message.get("runner_label")):
+        logger.debug("Not pre-warming %s for another pool", message["package"])
+        return
 
-    logger.info("Connection to Celery workers has been established.")
-    return inspect
+    image_puller.pull(message["package"]).add_done_callback(
+        partial(_log_prewarm_failure, message["package"])
+    )
 
 
-def _get_current_worker_tasks(inspect: Inspect) -> list[dict]:
-    """Get the number of tasks that the Celery worker is processing
+def _log_prewarm_failure(image: str, pull: Future) -> None:
+    if (exc := pull.exception()) is not None:
+        logger.warning("Unable to pre-warm %s: %s", image, exc)
 
-    Returns a dictionary containing the number of tasks the worker
-    is currently processing.
 
-    Args:
-        None
+def _fetch_image(
+    channel: BlockingChannel, task: dict, delivery_tag: int, slots: SlotTracker
+) -> None:
+    """Pull the task's image, if it is not already present, and then queue the task
+    for a free slot. Tasks whose image has to be pulled are held without counting
+    against the prefetch."""
+    pull = image_puller.pull(task["package"])
 
-    Returns:
-        values: A list of of tasks the worker is processing
-    """
-    return inspect.active()[WORKER_NAME]
+    if not pull.done():
+        slots.hold(task["id"])
+        _update_prefetch(channel, slots)
 
+    pull.add_done_callback(
+        lambda pull: channel.connection.add_callback_threadsafe(
+            partial(_image_ready, channel, task, delivery_tag, slots, pull)
+        )
+    )
 
-def _get_worker_concurrency() -> int:
-    """Return the concurrency amount for the workers"""
-    return WORKER_CONCURRENCY
 
+def _image_ready(
+    channel: BlockingChannel,
+    task: dict,
+    delivery_tag: int,
+    slots: SlotTracker,
+    pull: Future,
+) -> None:
+    """Queue the task for a slot now that its image has been fetched. Should the pull
+    have failed, the worker will retry it when the task runs."""
+    if (exc := pull.exception()) is not None:
+        logger.warning("Unable to pull image for task %s: %s", task["id"], exc)
 
-def _has_available_worker(inspect: Inspect) -> bool:
-    """Check if there are any available worker processes"""
-    worker_tasks = _get_current_worker_tasks(inspect)
-    worker_concurrency = _get_worker_concurrency()
+    pulling = slots.pulling
+    slots.wait(task, delivery_tag)
 
-    logger.debug(f"List of worker tasks: {worker_tasks}")
-    logger.debug(f"Worker's concurrency amount: {worker_concurrency}")
+    if slots.pulling != pulling:
+        _update_prefetch(channel, slots)
 
-    return True if len(worker_tasks) < worker_concurrency else False
+    _dispatch_ready(slots)
 
 
-def _wait_for_available_worker(inspect: Inspect) -> None:
-    """Wait for an available worker process before consuming another message"""
-    while not _has_available_worker(inspect):
-        logger.info(
-            "No available worker processes. "
-            f"Checking again in {WAIT_FOR_AVAILABLE_WORKER_DELAY} seconds."
-        )
-        sleep(WAIT_FOR_AVAILABLE_WORKER_DELAY)
+def _dispatch_ready(slots: SlotTracker) -> None:
+    """Hand off queued tasks to the worker for as long as there are free slots"""
+    while (ready := slots.next_ready()) is not None:
+        _dispatch_task(*ready, slots)
+
+
+def _dispatch_task(task: dict, delivery_tag: int, slots: SlotTracker) -> None:
+    """Hand the task off to the worker and occupy a slot until it finishes"""
+    task_id = task["id"]
+
+    pull_image_s = pull_image.s(task).set(task_id=task_id)
+    run_task_s = run_task.s(task=task)
+    publish_task_s = publish_result.s()
+
+    slots.acquire(task_id, delivery_tag)
+    chain(pull_image_s, run_task_s, publish_task_s).delay()
+
+    logger.debug("Dispatched task %s. Free slots: %s", task_id, slots.free_slots)
+
+
+def _watch_task_events(
+    connection: BlockingConnection,
+    channel: BlockingChannel,
+    slots: SlotTracker,
+    registry: MetricsRegistry,
+    drainer: SpoolDrainer,
+) -> None:
+    """Relay the task events reported by the worker to the connection thread, and
+    record the measurements reported along with them. Finished tasks have spooled
+    their result, so the drainer is woken to publish it."""
+    while True:
+        event, payload = task_events.get()
+
+        match event:
+            case "TASK_STARTED":
+                handler = partial(_start_task, slots, registry, payload)
+            case "TASK_FINISHED":
+                drainer.wake()
+                handler = partial(_release_slot, channel, slots, payload)
+            case _:
+                registry.record(event, payload)
+                continue
+
+        # pika connections are not thread safe, so all channel and slot updates are
+        # scheduled to run on the thread that is consuming
+        connection.add_callback_threadsafe(handler)
+
+
+def _start_task(slots: SlotTracker, registry: MetricsRegistry, task_id: str) -> None:
+    """Mark the task as started, recording how long it waited for the worker"""
+    if (waited := slots.start(task_id)) is not None:
+        registry.observe_phase("queue_wait", waited)
+
+
+def _release_slot(channel: BlockingChannel, slots: SlotTracker, task_id: str) -> None:
+    """Free the slot held by the task and acknowledge its tasking message"""
+    if (delivery_tag := slots.release(task_id)) is None:
+        return
+
+    channel.basic_ack(delivery_tag)
+
+    logger.debug("Task %s finished. Free slots: %s", task_id, slots.free_slots)
+
+    _dispatch_ready(slots)
@@ -2,10 +2,26 @@ import json
 import logging
 import os
 import ssl
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+from itertools import takewhile
+from queue import Empty, Queue
+from threading import Lock, Thread
 from time import sleep
+from typing import Iterable, Optional, Tuple
+from uuid import uuid4
 
 import pika
-from pika.exceptions import AMQPConnectionError, UnroutableError
+from pika.exceptions import AMQPConnectionError, NackError, UnroutableError
+from pika.spec import Basic
+
+PUBLISH_BATCH_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BATCH_SIZE", 100))
+PUBLISH_LINGER_MS = int(os.getenv("RABBITMQ_PUBLISH_LINGER_MS", 0))
+PUBLISH_TIMEOUT = int(os.getenv("RABBITMQ_PUBLISH_TIMEOUT", 30))
+
+# Task output and results are not sent again once the broker has confirmed them, so
+# they are persisted to survive a restart of the broker
+PERSISTENT_MESSAGE_TYPES = ("TASK_RESULT", "TASK_LOG")
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +44,26 @@ def build_connection(ca=None, cert=None, key=None, open_callback=None):
       A pika.SelectConnection if open_callback is populated, otherwise
       a pika.BlockingConnection.
     """
+    parameters = build_connection_parameters(ca, cert, key)
+
+    if open_callback:
+        return pika.SelectConnection(parameters, on_open_callback=open_callback)
+    else:
+        return pika.BlockingConnection(parameters)
+
+
+def build_connection_parameters(ca=None, cert=None, key=None):
+    """Creates the parameters for connecting to RabbitMQ, for use with connection
+    adapters other than those returned by build_connection.
+
+    Args:
+      ca: The path to the CA file for the SSL context
+      cert: The path to the user certifcate
+      key: The path to the keyfile for the given certificate
+
+    Returns:
+      pika.ConnectionParameters
+    """
     host = os.getenv("RABBITMQ_HOST", "localhost")
     port = os.getenv("RABBITMQ_PORT", 5672)
     credentials = None
@@ -43,58 +79,283 @@ def build_connection(ca=None, cert=None, key=None, open_callback=None):
             os.getenv("RABBITMQ_PASSWORD", "password"),
         )
 
-    parameters = pika.ConnectionParameters(
+    return pika.ConnectionParameters(
         host=host, port=port, credentials=credentials, ssl_options=ssl_options
     )
 
-    if open_callback:
-        return pika.SelectConnection(parameters, on_open_callback=open_callback)
-    else:
-        return pika.BlockingConnection(parameters)
+
+def _publish_properties(msg_type: Optional[str]) -> pika.BasicProperties:
+    headers = {"x-msg-type": msg_type} if msg_type else {}
+
+    return pika.BasicProperties(
+        content_type="application/json",
+        content_encoding="utf-8",
+        headers=headers,
+        delivery_mode=2 if msg_type in PERSISTENT_MESSAGE_TYPES else 1,
+    )
 
 
 def send_message(routing_key, msg_type, message):
     """Sends a JSON message to the specified queue.
 
     Sends the given message to the queue. If msg_type is populated, it
-    sets the x-msg-type header to that value.
+    sets the x-msg-type header to that value. This blocks until the broker
+    has confirmed the message.
 
     Args:
-      queue: The name of the queue to send to
+      routing_key: The name of the queue to send to
       msg_type: The value of x-msg-type to set in the header, or None
       message: The message to send, must be valid JSON.
 
     Raises:
       pika.exceptions.UnroutableError: if unable to publish the message
     """
+    send_messages([(routing_key, msg_type, message)])
 
-    headers = {"x-msg-type": msg_type} if msg_type else {}
-    # TODO Update this to use a persistent connection to the queue
-    publish_props = pika.BasicProperties(
-        content_type="application/json",
-        content_encoding="utf-8",
-        headers=headers,
-        delivery_mode=1,
-    )
 
-    connection = build_connection()
-    channel = connection.channel()
-    channel.confirm_delivery()
+def send_messages(messages: Iterable[Tuple[str, Optional[str], dict]]):
+    """Sends a batch of JSON messages.
 
-    try:
-        channel.basic_publish(
-            exchange="",
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=publish_props,
-            mandatory=True,
+    All of the messages are published before waiting on any of the confirms,
+    so the cost of a batch is close to that of a single message.
+
+    Args:
+      messages: Iterable of (routing_key, msg_type, message) tuples
+
+    Raises:
+      pika.exceptions.UnroutableError: if unable to publish any of the messages
+      pika.exceptions.NackError: if the broker rejected any of the messages
+      pika.exceptions.AMQPConnectionError: if the connection was lost before
+        all of the messages were confirmed
+      concurrent.futures.TimeoutError: if a message was not confirmed within
+        PUBLISH_TIMEOUT seconds. Any of the messages that were still queued are
+        not published.
+    """
+    publisher = get_publisher()
+    futures = [
+        publisher.publish(
+            "", routing_key, json.dumps(message).encode(), _publish_properties(msg_type)
         )
-    except UnroutableError as ue:
-        # TODO revisit this and handle exceptions better. Currently used for retry logic
-        logger.error("Failed to send message")
-        raise ue
-    finally:
-        connection.close()
+        for routing_key, msg_type, message in messages
+    ]
+
+    for future in futures:
+        try:
+            future.result(timeout=PUBLISH_TIMEOUT)
+        except UnroutableError as ue:
+            # TODO revisit this and handle exceptions better. Currently used for retry
+            #      logic
+            logger.error("Failed to send message")
+            raise ue
+        except TimeoutError:
+            cancel_pending(futures)
+            raise
+
+
+def cancel_pending(futures: Iterable[Future]) -> None:
+    """Cancel the publishing of any of the messages that are still queued. Messages
+    that have already been published are unaffected."""
+    for future in futures:
+        future.cancel()
+
+
+class Publisher:
+    """Publishes messages over a long-lived connection to the message broker
+
+    The connection is owned by a background thread, which publishes any queued
+    messages in batches and collects the publisher confirms for them asynchronously.
+    Each call to publish() returns a Future that is resolved once the broker confirms
+    the message, allowing callers to publish a burst of messages and then wait on the
+    confirms for all of them together. If the connection is lost, any unconfirmed
+    messages are failed and the connection is re-established for the messages that
+    remain queued.
+
+    Use get_publisher() rather than instantiating this directly, so that there is one
+    Publisher per process.
+
+    The runner and the core are packaged separately, so this class is duplicated in
+    runner/messaging.py and core/utils/messaging.py. Keep the two in step.
+
+    Attributes:
+        batch_size: The maximum number of messages to publish per batch
+        linger: Seconds to wait for more messages to arrive before publishing a batch
+    """
+
+    def __init__(self, batch_size: int = 100, linger: float = 0) -> None:
+        self.batch_size = batch_size
+        self.linger = linger
+        self._messages: Queue = Queue()
+        self._connection = None
+        self._channel = None
+        self._drain_scheduled = False
+        self._unconfirmed: OrderedDict[int, Tuple[str, Future]] = OrderedDict()
+        self._returned: set[str] = set()
+        self._delivery_tag = 0
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: pika.BasicProperties,
+        mandatory: bool = True,
+    ) -> Future:
+        """Queue a message to be published
+
+        Returns:
+            A Future that resolves to None once the broker has confirmed the message.
+            The Future raises UnroutableError if the message could not be routed,
+            NackError if the broker rejected it, or AMQPConnectionError if the
+            connection was lost before it was confirmed.
+        """
+        self._ensure_started()
+
+        future = Future()
+        properties.message_id = properties.message_id or str(uuid4())
+        self._messages.put(
+            (future, (exchange, routing_key, body, properties, mandatory))
+        )
+
+        if (connection := self._connection) is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._schedule_drain)
+            except Exception:
+                # The connection is closing. The message will be published once
+                # it has been re-established.
+                pass
+
+        return future
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(
+                    target=self._run, name="message publisher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Maintain the connection to the broker, reconnecting whenever it is lost"""
+        while True:
+            connection = build_connection(open_callback=self._on_connection_open)
+            connection.add_on_open_error_callback(self._on_connection_closed)
+            connection.add_on_close_callback(self._on_connection_closed)
+            self._connection = connection
+
+            connection.ioloop.start()
+
+            logger.info("Publisher connection lost. Reconnecting in 5s.")
+            sleep(5)
+
+    def _on_connection_open(self, connection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel) -> None:
+        channel.add_on_return_callback(self._on_message_returned)
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_delivery_confirmation)
+
+        self._delivery_tag = 0
+        self._channel = channel
+        self._schedule_drain()
+
+    def _on_channel_closed(self, channel, reason) -> None:
+        logger.warning("Publisher channel closed: %s", reason)
+        self._channel = None
+
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_connection_closed(self, connection, reason) -> None:
+        self._connection = None
+        self._channel = None
+        self._drain_scheduled = False
+
+        for _, future in self._unconfirmed.values():
+            future.set_exception(AMQPConnectionError(reason))
+
+        self._unconfirmed.clear()
+        self._returned.clear()
+        connection.ioloop.stop()
+
+    def _schedule_drain(self) -> None:
+        """Publish the queued messages, after waiting linger seconds for more to
+        arrive"""
+        if self._drain_scheduled:
+            return
+
+        self._drain_scheduled = True
+        self._connection.ioloop.call_later(self.linger, self._drain)
+
+    def _drain(self) -> None:
+        self._drain_scheduled = False
+
+        if self._channel is None:
+            return
+
+        for _ in range(self.batch_size):
+            try:
+                future, message = self._messages.get_nowait()
+            except Empty:
+                return
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self._channel.basic_publish(*message)
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = (message[3].message_id, future)
+
+        # Batch size was reached with messages still queued
+        self._schedule_drain()
+
+    def _on_message_returned(self, channel, method, properties, body) -> None:
+        """Called for mandatory messages that could not be routed. The confirm for
+        the message follows, at which point its Future is failed."""
+        self._returned.add(properties.message_id)
+
+    def _on_delivery_confirmation(self, frame) -> None:
+        """Resolve the Futures of the messages covered by the confirm"""
+        method = frame.method
+        confirmed = (
+            list(takewhile(lambda tag: tag <= method.delivery_tag, self._unconfirmed))
+            if method.multiple
+            else [method.delivery_tag]
+        )
+
+        for tag in confirmed:
+            if (unconfirmed := self._unconfirmed.pop(tag, None)) is None:
+                continue
+
+            message_id, future = unconfirmed
+
+            if isinstance(method, Basic.Nack):
+                future.set_exception(NackError([message_id]))
+            elif message_id in self._returned:
+                self._returned.discard(message_id)
+                future.set_exception(UnroutableError([message_id]))
+            else:
+                future.set_result(None)
+
+
+def get_publisher() -> Publisher:
+    """Returns the Publisher for the current process"""
+    global _publisher, _publisher_pid
+
+    # Connections can not be shared with forked processes, such as celery workers
+    if _publisher is None or _publisher_pid != os.getpid():
+        _publisher = Publisher(
+            batch_size=PUBLISH_BATCH_SIZE, linger=PUBLISH_LINGER_MS / 1000
+        )
+        _publisher_pid = os.getpid()
+
+    return _publisher
+
+
+_publisher: Optional[Publisher] = None
+_publisher_pid: Optional[int] = None
 
 
 def connection_ready() -> bool:
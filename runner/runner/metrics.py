@@ -0,0 +1,297 @@
+"""Runner metrics
+
+The runner records how long each phase of a task takes, along with counts of the
+tasks it has completed, and serves them alongside the current slot usage on a local
+HTTP endpoint in the Prometheus text format.
+
+Tasks are executed in the worker processes while the slots are tracked by the
+listener, so the worker processes report their measurements to the listener by way
+of task_events and the listener holds the registry that is served. The asyncio engine
+runs everything in one process and records its measurements directly.
+"""
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import getenv
+from threading import Lock, Thread
+from time import monotonic
+from typing import Callable, Optional
+
+from .slots import task_events
+
+METRICS_ADDRESS = getenv("RUNNER_METRICS_ADDRESS", "127.0.0.1")
+METRICS_PORT = int(getenv("RUNNER_METRICS_PORT", 9180))
+
+PHASE_OBSERVED = "PHASE_OBSERVED"
+TASK_COMPLETED = "TASK_COMPLETED"
+
+PHASE_SECONDS = "functionary_runner_task_phase_seconds"
+TASKS_TOTAL = "functionary_runner_tasks_total"
+
+PHASE_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+    float("inf"),
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative histogram of observed values"""
+
+    def __init__(self, buckets: tuple = PHASE_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index in range(bisect_left(self.buckets, value), len(self.buckets)):
+            self.counts[index] += 1
+
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Holds the runner's metrics and renders them in the Prometheus text format"""
+
+    def __init__(self) -> None:
+        self._phases: dict[str, Histogram] = {}
+        self._tasks: dict[str, int] = {}
+        self._gauges: dict[str, tuple[str, str, Callable[[], float]]] = {}
+        self._lock = Lock()
+
+    def observe_phase(self, phase: str, seconds: float) -> None:
+        """Record the time taken by a phase of a task"""
+        with self._lock:
+            self._phases.setdefault(phase, Histogram()).observe(seconds)
+
+    def count_task(self, status: str) -> None:
+        """Count a task that finished with the given status"""
+        with self._lock:
+            self._tasks[status] = self._tasks.get(status, 0) + 1
+
+    def gauge(
+        self,
+        name: str,
+        description: str,
+        callback: Callable[[], float],
+        metric_type: str = "gauge",
+    ) -> None:
+        """Register a metric whose value is read from the callback when rendered"""
+        self._gauges[name] = (description, metric_type, callback)
+
+    def record(self, event: str, payload) -> None:
+        """Record a measurement reported through task_events"""
+        match event:
+            case "PHASE_OBSERVED":
+                self.observe_phase(*payload)
+            case "TASK_COMPLETED":
+                self.count_task(payload)
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {PHASE_SECONDS} Time taken by each phase of a task",
+            f"# TYPE {PHASE_SECONDS} histogram",
+        ]
+
+        with self._lock:
+            for phase, histogram in sorted(self._phases.items()):
+                for bucket, count in zip(histogram.buckets, histogram.counts):
+                    le = "+Inf" if bucket == float("inf") else repr(float(bucket))
+                    lines.append(
+                        f'{PHASE_SECONDS}_bucket{{phase="{phase}",le="{le}"}} {count}'
+                    )
+                lines.append(f'{PHASE_SECONDS}_sum{{phase="{phase}"}} {histogram.sum}')
+                lines.append(
+                    f'{PHASE_SECONDS}_count{{phase="{phase}"}} {histogram.count}'
+                )
+
+            lines.append(f"# HELP {TASKS_TOTAL} Tasks completed, by result status")
+            lines.append(f"# TYPE {TASKS_TOTAL} counter")
+            for status, count in sorted(self._tasks.items()):
+                lines.append(f'{TASKS_TOTAL}{{status="{status}"}} {count}')
+
+        for name, (description, metric_type, callback) in self._gauges.items():
+            try:
+                value = callback()
+            except Exception as exc:
+                logger.debug("Unable to collect %s: %s", name, exc)
+                continue
+
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def register_slot_metrics(
+    registry: MetricsRegistry,
+    concurrency: Callable[[], int],
+    in_flight: Callable[[], int],
+    free_slots: Callable[[], int],
+) -> None:
+    """Register the gauges describing the runner's execution slots"""
+    registry.gauge(
+        "functionary_runner_concurrency",
+        "Number of tasks the runner can execute at once",
+        concurrency,
+    )
+    registry.gauge(
+        "functionary_runner_tasks_in_flight",
+        "Tasks received that have not yet finished",
+        in_flight,
+    )
+    registry.gauge(
+        "functionary_runner_free_slots", "Execution slots not in use", free_slots
+    )
+
+
+def register_image_cache_metrics(
+    registry: MetricsRegistry, image_cache, image_puller
+) -> None:
+    """Register the metrics describing the image cache and the image puller"""
+    for counter in ["hits", "misses", "evictions"]:
+        registry.gauge(
+            f"functionary_runner_image_cache_{counter}_total",
+            f"Image cache {counter}",
+            lambda counter=counter: image_cache.stats()[counter],
+            metric_type="counter",
+        )
+
+    registry.gauge(
+        "functionary_runner_image_cache_bytes",
+        "Total size of the cached images",
+        lambda: image_cache.stats()["size"],
+    )
+    registry.gauge(
+        "functionary_runner_image_pulls",
+        "Images being pulled or waiting to be pulled",
+        lambda: image_puller.pulling,
+    )
+
+
+def register_concurrency_metrics(registry: MetricsRegistry, controller) -> None:
+    """Register the measurements the concurrency controller last adjusted on"""
+    for name, description, attribute in [
+        ("host_cpu_utilization", "Fraction of the host CPU time in use", "cpu"),
+        ("host_memory_utilization", "Fraction of the host memory in use", "memory"),
+        ("queued_tasks", "Tasks waiting in the runner's queues", "queued"),
+    ]:
+        registry.gauge(
+            f"functionary_runner_{name}",
+            description,
+            lambda attribute=attribute: _known(getattr(controller, attribute)),
+        )
+
+
+def register_spool_metrics(registry: MetricsRegistry, spool) -> None:
+    """Register the metrics describing the result spool"""
+    registry.gauge(
+        "functionary_runner_spooled_results",
+        "Results waiting in the spool to be published",
+        lambda: len(spool),
+    )
+
+
+def _known(value):
+    if value is None:
+        raise ValueError("Not yet measured")
+
+    return value
+
+
+def _report_to_listener(event: str, payload) -> None:
+    task_events.put((event, payload))
+
+
+_report: Callable[[str, object], None] = _report_to_listener
+
+
+def record_locally(registry: MetricsRegistry) -> None:
+    """Record measurements taken in this process directly in the registry, rather
+    than reporting them to the listener"""
+    global _report
+    _report = registry.record
+
+
+def observe_phase(phase: str, seconds: float) -> None:
+    """Report the time taken by a phase of a task"""
+    _report(PHASE_OBSERVED, (phase, seconds))
+
+
+def count_task(exit_status) -> None:
+    """Report a task that has finished with the given exit status"""
+    match exit_status:
+        case 0:
+            status = "success"
+        case "TIMEOUT":
+            status = "timeout"
+        case _:
+            status = "error"
+
+    _report(TASK_COMPLETED, status)
+
+
+@contextmanager
+def timed(phase: str):
+    """Report the time taken by the wrapped block as a phase of a task"""
+    start = monotonic()
+
+    try:
+        yield
+    finally:
+        observe_phase(phase, monotonic() - start)
+
+
+def start_metrics_server(
+    registry: MetricsRegistry,
+    address: str = METRICS_ADDRESS,
+    port: int = METRICS_PORT,
+) -> Optional[ThreadingHTTPServer]:
+    """Serve the metrics at /metrics from a background thread. The server is not
+    started if the port is 0."""
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = registry.render().encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+    logger.info("Serving metrics on %s:%s", address, port)
+
+    return server
@@ -0,0 +1,386 @@
+"""Warm container pool
+
+Rather than starting a fresh container for every task, the pool keeps long-lived
+containers running the package image in server mode (main.py --server) and sends
+function calls to them over the container's stdin. Each call is answered with a
+single response line on stdout, prefixed with RESPONSE_MARKER.
+
+Containers are reused for up to WARM_POOL_MAX_INVOCATIONS calls and are removed once
+they have been idle for WARM_POOL_IDLE_TIMEOUT seconds. When the pool is full, the
+least recently used idle container is evicted to make room. Reusing a container means
+that consecutive tasks share a process, so this mode trades some isolation between
+tasks for lower latency.
+
+The output of a call is only read once the function server responds, so output from
+tasks run in the pool is not streamed as TASK_LOG messages, and is instead sent in
+full with the task's result.
+"""
+import json
+import logging
+from collections import OrderedDict
+from os import getenv
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Optional, Tuple
+
+from celery.signals import worker_process_shutdown
+from docker.errors import DockerException
+from docker.models.containers import Container
+from docker.utils.socket import STDOUT, next_frame_header, read_exactly
+
+import docker
+
+from .artifacts import (
+    OUTPUT_DIR,
+    OUTPUT_DIR_VARIABLE,
+    artifact_store,
+    collect_output_files,
+)
+from .containers import (
+    TIMEOUT_STATUS,
+    WARM_CONTAINER_LABEL,
+    Deadline,
+    container_labels,
+    timeout_message,
+)
+from .metrics import timed
+from .resources import ResourceMonitor, empty_usage
+
+RESPONSE_MARKER = b"==== Function Response ===="
+READY_MARKER = b"==== Function Server Ready ===="
+
+WARM_POOL_SIZE = int(getenv("RUNNER_WARM_POOL_SIZE", 0))
+WARM_POOL_IDLE_TIMEOUT = int(getenv("RUNNER_WARM_POOL_IDLE_TIMEOUT", 300))
+WARM_POOL_MAX_INVOCATIONS = int(getenv("RUNNER_WARM_POOL_MAX_INVOCATIONS", 100))
+
+logger = logging.getLogger(__name__)
+
+
+class WarmContainerError(Exception):
+    """The warm container could not complete the request"""
+
+    pass
+
+
+class ServerModeUnsupported(WarmContainerError):
+    """The package image was built from a template without server mode support"""
+
+    pass
+
+
+def _raw_socket(attached):
+    """Returns the socket underlying the stream returned by attach_socket
+
+    On unix sockets, docker-py wraps the connection in a read-only SocketIO, so
+    requests are written to the socket it wraps. Other transports return the socket
+    itself.
+    """
+    return getattr(attached, "_sock", attached)
+
+
+class WarmContainer:
+    """A long-lived package container running in server mode
+
+    Attributes:
+        image: The package image the container was started from
+        container: The docker container
+        invocations: The number of function calls made to the container
+        last_used: monotonic timestamp of when the container was last released
+    """
+
+    def __init__(self, image: str, container: Container) -> None:
+        self.image = image
+        self.container = container
+        self.invocations = 0
+        self.last_used = monotonic()
+        self._socket = container.attach_socket(
+            params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+        )
+        self._writer = _raw_socket(self._socket)
+        self._buffer = b""
+
+    def wait_until_ready(self) -> None:
+        """Wait for the function server in the container to start
+
+        Raises:
+            ServerModeUnsupported: The container exited without starting the server
+        """
+        try:
+            self._read_marked_line(READY_MARKER)
+        except WarmContainerError:
+            raise ServerModeUnsupported(f"{self.image} does not support server mode")
+
+    def invoke(
+        self, function: str, parameters: dict, variables: dict
+    ) -> Tuple[int, str, str]:
+        """Call the function in the container and wait for the response
+
+        Returns:
+            A tuple of (exit_status, output, result)
+
+        Raises:
+            WarmContainerError: The container exited before responding
+        """
+        request = {
+            "function": function,
+            "parameters": parameters,
+            "variables": variables or {},
+        }
+
+        self.invocations += 1
+        self._writer.sendall(json.dumps(request).encode() + b"\n")
+
+        extra_output, response_line = self._read_marked_line(RESPONSE_MARKER)
+        response = json.loads(response_line)
+
+        output = (extra_output + response["output"].encode()).decode().rstrip()
+
+        return (response["status"], output, response["result"])
+
+    def _read_marked_line(self, marker: bytes) -> Tuple[bytes, bytes]:
+        """Read the container output until a line starting with marker is found
+
+        Returns:
+            A tuple containing any output that was read ahead of the marked line, and
+            the remainder of the marked line following the marker.
+
+        Raises:
+            WarmContainerError: The container output ended before the marker was found
+        """
+        extra_output = b""
+
+        while True:
+            while b"\n" in self._buffer:
+                line, self._buffer = self._buffer.split(b"\n", 1)
+
+                if line.startswith(marker):
+                    return (extra_output, line.removeprefix(marker))
+
+                extra_output += line + b"\n"
+
+            stream, size = next_frame_header(self._socket)
+
+            if size < 0:
+                raise WarmContainerError("Container exited before responding")
+
+            frame = read_exactly(self._socket, size)
+
+            if stream == STDOUT:
+                self._buffer += frame
+            else:
+                extra_output += frame
+
+    def remove(self) -> None:
+        """Stop and remove the container"""
+        try:
+            self._socket.close()
+            self.container.remove(force=True)
+        except DockerException as exc:
+            logger.warning("Unable to remove warm container %s: %s", self, exc)
+
+    def __str__(self):
+        return f"{self.image} ({self.container.short_id})"
+
+
+class ContainerPool:
+    """A bounded pool of warm containers, keyed by package image
+
+    Attributes:
+        size: Maximum number of containers to keep, across all images. Each worker
+              process has its own pool, so a worker keeps up to size times its
+              concurrency warm containers. A size of 0 disables the pool.
+        idle_timeout: Seconds a container can sit unused before it is removed
+        max_invocations: Number of calls after which a container is replaced
+    """
+
+    def __init__(
+        self,
+        size: int = WARM_POOL_SIZE,
+        idle_timeout: int = WARM_POOL_IDLE_TIMEOUT,
+        max_invocations: int = WARM_POOL_MAX_INVOCATIONS,
+    ) -> None:
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_invocations = max_invocations
+        self._idle: OrderedDict[int, WarmContainer] = OrderedDict()
+        self._busy = 0
+        self._unsupported_images: set[str] = set()
+        self._lock = Lock()
+        self._reaper = None
+        self._stopped = Event()
+
+    def supports(self, image: str) -> bool:
+        """Whether tasks for the image can be run using the pool"""
+        return self.size > 0 and image not in self._unsupported_images
+
+    def run(self, task: dict, timeout: Optional[float] = None) -> Tuple:
+        """Execute the task in a warm container for the task's package
+
+        Args:
+            task: The task to execute
+            timeout: Seconds to allow the function to run for. The container is
+                     killed if the function is still running after this.
+
+        Returns:
+            A tuple of (exit_status, output, result, artifacts, resources)
+
+        Raises:
+            DockerException: A container could not be started for the package
+            ServerModeUnsupported: The package image does not support server mode
+        """
+        with timed("container_start"):
+            warm_container = self._acquire(task["package"])
+
+        try:
+            with timed("execution"), Deadline(
+                warm_container.container, timeout
+            ) as deadline, ResourceMonitor(
+                warm_container.container, relative=True
+            ) as monitor:
+                exit_status, output, result = warm_container.invoke(
+                    task["function"], task["function_parameters"], task.get("variables")
+                )
+
+            with timed("output_collection"):
+                artifacts = collect_output_files(
+                    warm_container.container, artifact_store
+                )
+        except (WarmContainerError, DockerException, OSError) as exc:
+            logger.warning("Discarding warm container %s: %s", warm_container, exc)
+            self._discard(warm_container)
+
+            if deadline.expired:
+                return (
+                    TIMEOUT_STATUS,
+                    timeout_message(timeout),
+                    "null",
+                    [],
+                    monitor.usage(),
+                )
+
+            return (
+                1,
+                f"Warm container failed to execute function: {exc}",
+                "null",
+                [],
+                empty_usage(),
+            )
+
+        self._release(warm_container)
+
+        return (exit_status, output, result, artifacts, monitor.usage())
+
+    def _acquire(self, image: str) -> WarmContainer:
+        """Take an idle container for the image out of the pool, starting a new one
+        if none are available"""
+        with self._lock:
+            # Prefer the most recently used container, as it is the least likely to
+            # be reaped for being idle
+            for key, warm_container in reversed(self._idle.items()):
+                if warm_container.image == image:
+                    del self._idle[key]
+                    self._busy += 1
+
+                    return warm_container
+
+            # Make room for the new container by evicting the least recently used
+            while self._idle and len(self._idle) + self._busy >= self.size:
+                _, evicted = self._idle.popitem(last=False)
+                logger.debug("Evicting warm container %s", evicted)
+                evicted.remove()
+
+            self._busy += 1
+
+        try:
+            return self._start(image)
+        except (DockerException, WarmContainerError):
+            with self._lock:
+                self._busy -= 1
+            raise
+
+    def _release(self, warm_container: WarmContainer) -> None:
+        """Return the container to the pool, or remove it if it has been used up"""
+        with self._lock:
+            self._busy -= 1
+
+            if warm_container.invocations >= self.max_invocations:
+                warm_container.remove()
+            else:
+                warm_container.last_used = monotonic()
+                self._idle[id(warm_container)] = warm_container
+
+    def _discard(self, warm_container: WarmContainer) -> None:
+        """Remove a container that is no longer usable"""
+        with self._lock:
+            self._busy -= 1
+
+        warm_container.remove()
+
+    def _start(self, image: str) -> WarmContainer:
+        """Start a new container for the image in server mode"""
+        self._start_reaper()
+
+        container = docker.from_env().containers.run(
+            image,
+            command=["--server"],
+            auto_remove=False,
+            detach=True,
+            stdin_open=True,
+            environment={OUTPUT_DIR_VARIABLE: OUTPUT_DIR},
+            labels=container_labels(**{WARM_CONTAINER_LABEL: "true"}),
+        )
+        warm_container = WarmContainer(image, container)
+
+        try:
+            warm_container.wait_until_ready()
+        except ServerModeUnsupported:
+            self._unsupported_images.add(image)
+            warm_container.remove()
+            raise
+
+        logger.debug("Started warm container %s", warm_container)
+
+        return warm_container
+
+    def _start_reaper(self) -> None:
+        """Start the thread that removes idle containers, if it isn't running yet.
+        This happens lazily so that the thread is started in the process that uses
+        the pool rather than the one that imported it."""
+        if self._reaper is None:
+            self._reaper = Thread(
+                target=self._reap_idle, name="warm pool reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_idle(self) -> None:
+        """Periodically remove containers that have exceeded the idle timeout"""
+        while not self._stopped.wait(max(self.idle_timeout / 2, 1)):
+            with self._lock:
+                self._remove_expired()
+
+    def _remove_expired(self) -> None:
+        """Remove containers that have been idle for longer than the idle timeout"""
+        now = monotonic()
+
+        for key, warm_container in list(self._idle.items()):
+            if now - warm_container.last_used >= self.idle_timeout:
+                del self._idle[key]
+                logger.debug("Removing idle warm container %s", warm_container)
+                warm_container.remove()
+
+    def clear(self) -> None:
+        """Remove all idle containers and stop reaping"""
+        self._stopped.set()
+
+        with self._lock:
+            while self._idle:
+                _, warm_container = self._idle.popitem()
+                warm_container.remove()
+
+
+warm_pool = ContainerPool()
+
+
+@worker_process_shutdown.connect
+def _clear_warm_pool(**kwargs):
+    warm_pool.clear()
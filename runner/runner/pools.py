@@ -0,0 +1,138 @@
+"""Runner pools
+
+Tasks are routed by the core to pools of runners, each with its own queue: the public
+pool, which every runner serves by default, a pool per environment and a pool per
+runner label. A runner serves the pools for the environments and labels it is
+configured with. The runner also has a queue of its own, through which the core sends
+it tasks for packages whose image it already has. Tasks that the runner does not pick
+up from its own queue within the affinity timeout are dead lettered back to the pool
+they were routed from, so that another runner can run them.
+
+The runner declares the queues that it consumes, so that a pool for an environment or
+label created after the core initialized messaging exists before any task is routed
+to it. This includes a queue bound to the broadcast exchange, through which the core
+sends messages meant for every runner.
+"""
+import re
+from os import getenv
+from typing import Optional
+
+from pika.adapters.blocking_connection import BlockingChannel
+from pika.exchange_type import ExchangeType
+
+from .containers import RUNNER_NAME
+from .messaging import build_connection
+
+RUNNER_LABELS = [
+    label.strip() for label in getenv("RUNNER_LABELS", "").split(",") if label.strip()
+]
+RUNNER_ENVIRONMENTS = [
+    environment.strip()
+    for environment in getenv("RUNNER_ENVIRONMENTS", "").split(",")
+    if environment.strip()
+]
+RUNNER_PUBLIC_POOL = getenv("RUNNER_PUBLIC_POOL", "true").lower() in ["true", "1"]
+AFFINITY_TIMEOUT = int(getenv("RUNNER_AFFINITY_TIMEOUT", 30))
+
+PUBLIC_QUEUE = "public"
+RUNNERS_EXCHANGE = "runners.pools"
+RUNNERS_FALLBACK_EXCHANGE = "runners.fallback"
+RUNNERS_BROADCAST_EXCHANGE = "runners.broadcast"
+
+# Broadcasts are only of use while they are recent, so any the runner has not consumed
+# within this many seconds are discarded
+BROADCAST_TTL = 300
+
+
+def routing_word(value: str) -> str:
+    """Make the value safe to use as a single word of a topic routing key"""
+    return re.sub(r"[^\w-]", "-", value)
+
+
+def runner_pools() -> list[str]:
+    """The names of the pools that the runner serves"""
+    pools = [PUBLIC_QUEUE] if RUNNER_PUBLIC_POOL else []
+    pools += [f"environment.{environment}" for environment in RUNNER_ENVIRONMENTS]
+    pools += [f"label.{routing_word(label)}" for label in RUNNER_LABELS]
+
+    return pools
+
+
+def serves_package(environment: Optional[str], runner_label: Optional[str]) -> bool:
+    """Whether tasks for a package in the environment, with the runner label, can be
+    routed to this runner"""
+    if runner_label:
+        return runner_label in RUNNER_LABELS
+
+    return RUNNER_PUBLIC_POOL or environment in RUNNER_ENVIRONMENTS
+
+
+def runner_queue() -> str:
+    """The name of the runner's own queue"""
+    return f"runner.{routing_word(RUNNER_NAME)}"
+
+
+def task_queues() -> list[str]:
+    """The names of the queues that tasks for the runner wait in"""
+    return [runner_queue()] + runner_pools()
+
+
+def declare_queues() -> list[str]:
+    """Declare the queues for the runner and the pools it serves
+
+    Returns:
+        The names of the queues to consume tasking messages from
+    """
+    connection = build_connection()
+
+    try:
+        channel = connection.channel()
+        _declare_exchanges(channel)
+
+        for pool in runner_pools():
+            channel.queue_declare(pool, durable=True, auto_delete=False)
+            channel.queue_bind(pool, RUNNERS_EXCHANGE, routing_key=f"pool.{pool}")
+            channel.queue_bind(
+                pool, RUNNERS_FALLBACK_EXCHANGE, routing_key=f"runner.*.{pool}"
+            )
+
+        queue = runner_queue()
+        channel.queue_declare(
+            queue,
+            durable=True,
+            auto_delete=False,
+            arguments={
+                "x-message-ttl": AFFINITY_TIMEOUT * 1000,
+                "x-dead-letter-exchange": RUNNERS_FALLBACK_EXCHANGE,
+            },
+        )
+        channel.queue_bind(queue, RUNNERS_EXCHANGE, routing_key=f"{queue}.#")
+
+        broadcast_queue = f"{queue}.broadcast"
+        channel.queue_declare(
+            broadcast_queue,
+            auto_delete=True,
+            arguments={"x-message-ttl": BROADCAST_TTL * 1000},
+        )
+        channel.queue_bind(broadcast_queue, RUNNERS_BROADCAST_EXCHANGE)
+    finally:
+        connection.close()
+
+    return [queue, broadcast_queue] + runner_pools()
+
+
+def _declare_exchanges(channel: BlockingChannel) -> None:
+    for exchange in [RUNNERS_EXCHANGE, RUNNERS_FALLBACK_EXCHANGE]:
+        channel.exchange_declare(
+            exchange,
+            exchange_type=ExchangeType.topic,
+            durable=True,
+            auto_delete=False,
+        )
+
+    channel.exchange_declare(
+        RUNNERS_BROADCAST_EXCHANGE,
+        exchange_type=ExchangeType.fanout,
+        durable=True,
+        auto_delete=False,
+    )
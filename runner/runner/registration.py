@@ -0,0 +1,91 @@
+"""Runner registration and heartbeats
+
+When it starts, the runner registers with the core by sending a RUNNER_REGISTER
+message describing its capacity, the package images it already has, the labels it
+was configured with and the pools it serves. The same status is then sent
+periodically as a RUNNER_HEARTBEAT, and the runner is considered gone by the core once
+its heartbeats stop arriving. On a clean shutdown, a RUNNER_UNREGISTER message removes
+it straight away.
+"""
+import logging
+from os import getenv
+from threading import Event, Thread
+from typing import Callable, Optional
+
+from .containers import RUNNER_NAME
+from .images import image_cache
+from .messaging import send_message
+from .pools import RUNNER_LABELS, runner_pools
+
+HEARTBEAT_INTERVAL = float(getenv("RUNNER_HEARTBEAT_INTERVAL", 15))
+
+RUNNER_STATUS_QUEUE = "runners.status"
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Registers the runner and then reports its status from a background thread
+
+    Attributes:
+        concurrency: Returns the number of tasks the runner can execute at once
+        free_slots: Returns the number of execution slots currently free
+        interval: Seconds between heartbeats
+    """
+
+    def __init__(
+        self,
+        concurrency: Callable[[], int],
+        free_slots: Callable[[], int],
+        interval: float = HEARTBEAT_INTERVAL,
+    ) -> None:
+        self.concurrency = concurrency
+        self.free_slots = free_slots
+        self.interval = interval
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def status(self) -> dict:
+        """The status of the runner, as reported to the core"""
+        try:
+            images = image_cache.images()
+        except Exception as exc:
+            logger.debug("Unable to list cached images: %s", exc)
+            images = []
+
+        return {
+            "name": RUNNER_NAME,
+            "concurrency": self.concurrency(),
+            "free_slots": self.free_slots(),
+            "images": images,
+            "labels": RUNNER_LABELS,
+            "pools": runner_pools(),
+        }
+
+    def start(self) -> None:
+        """Register the runner and start sending heartbeats"""
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sending heartbeats and unregister the runner"""
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self._send("RUNNER_UNREGISTER", {"name": RUNNER_NAME})
+
+    def _run(self) -> None:
+        self._send("RUNNER_REGISTER", self.status())
+
+        while not self._stopped.wait(self.interval):
+            self._send("RUNNER_HEARTBEAT", self.status())
+
+    def _send(self, msg_type: str, message: dict) -> None:
+        try:
+            send_message(RUNNER_STATUS_QUEUE, msg_type, message)
+        except Exception as exc:
+            logger.warning("Unable to send %s: %s", msg_type, exc)
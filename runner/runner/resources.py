@@ -0,0 +1,173 @@
+"""Resource usage of tasks
+
+The runner reports the resources used by each task in its TASK_RESULT, so that the
+core can build a profile of the cost of each function. Tasks run in containers are
+measured by sampling the container's stats from the Docker Engine while the task
+runs. Tasks run by the process executor are measured from the resource usage the
+kernel reports for the process once it exits.
+
+The Docker Engine produces a stats sample about once a second, so the usage of tasks
+that finish faster than that is only approximate, and may be missing altogether.
+"""
+import logging
+from resource import struct_rusage
+from threading import Lock, Thread
+from typing import Optional
+
+from docker.errors import DockerException
+from docker.models.containers import Container
+
+RESOURCE_FIELDS = (
+    "cpu_seconds",
+    "memory_peak_bytes",
+    "network_rx_bytes",
+    "network_tx_bytes",
+    "block_read_bytes",
+    "block_write_bytes",
+)
+
+# The block counts reported in rusage are in units of 512 bytes
+RUSAGE_BLOCK_SIZE = 512
+
+logger = logging.getLogger(__name__)
+
+
+def empty_usage() -> dict:
+    """Returns a resource usage report with no measurements"""
+    return dict.fromkeys(RESOURCE_FIELDS)
+
+
+class ResourceMonitor:
+    """Samples a container's stats from a background thread while a task runs
+
+    Use as a context manager around the code that waits on the container. The usage
+    is available from usage() once the block has exited.
+
+    Attributes:
+        container: The container to monitor
+        relative: Whether to report the usage relative to the first sample, for
+                  containers that were already running before the task started
+    """
+
+    def __init__(self, container: Container, relative: bool = False) -> None:
+        self.container = container
+        self.relative = relative
+        self._baseline: Optional[dict] = None
+        self._totals = dict.fromkeys(
+            ["cpu_ns", "network_rx", "network_tx", "block_read", "block_write"]
+        )
+        self._memory_peak: Optional[int] = None
+        self._stopped = False
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._thread = Thread(target=self._sample, name="resources", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # The stats stream blocks until the next sample, so rather than waiting on the
+        # thread, stop recording and let it exit once that sample arrives
+        with self._lock:
+            self._stopped = True
+
+    def _sample(self) -> None:
+        try:
+            stats = self.container.client.api.stats(
+                self.container.id, stream=True, decode=True
+            )
+
+            for sample in stats:
+                with self._lock:
+                    if self._stopped:
+                        break
+
+                    self._record(sample)
+        except DockerException as exc:
+            logger.debug("Stats for %s unavailable: %s", self.container.id, exc)
+        except Exception as exc:
+            # The stream is cut off when the container is removed
+            logger.debug("Stats for %s ended: %s", self.container.id, exc)
+
+    def _record(self, sample: dict) -> None:
+        counters = _read_counters(sample)
+
+        # Samples taken after the container has exited are empty
+        if counters["cpu_ns"] is None:
+            return
+
+        if self._baseline is None:
+            self._baseline = (
+                counters if self.relative else dict.fromkeys(counters.keys(), 0)
+            )
+
+        for name, value in counters.items():
+            if value is not None:
+                total = value - (self._baseline.get(name) or 0)
+                self._totals[name] = max(total, self._totals[name] or 0)
+
+        memory = sample.get("memory_stats") or {}
+        peaks = [memory.get("usage")]
+
+        # max_usage covers the container's whole life, so it is only of use when the
+        # container was started for the task. It is not reported under cgroup v2.
+        if not self.relative:
+            peaks.append(memory.get("max_usage"))
+
+        for peak in filter(None, peaks):
+            self._memory_peak = max(peak, self._memory_peak or 0)
+
+    def usage(self) -> dict:
+        """Returns the resource usage report for the task"""
+        with self._lock:
+            cpu_ns = self._totals["cpu_ns"]
+
+            return {
+                "cpu_seconds": None if cpu_ns is None else cpu_ns / 1e9,
+                "memory_peak_bytes": self._memory_peak,
+                "network_rx_bytes": self._totals["network_rx"],
+                "network_tx_bytes": self._totals["network_tx"],
+                "block_read_bytes": self._totals["block_read"],
+                "block_write_bytes": self._totals["block_write"],
+            }
+
+
+def _read_counters(sample: dict) -> dict:
+    """Extract the cumulative counters from a container stats sample"""
+    cpu_ns = ((sample.get("cpu_stats") or {}).get("cpu_usage") or {}).get("total_usage")
+    networks = sample.get("networks")
+    block_io = (sample.get("blkio_stats") or {}).get("io_service_bytes_recursive")
+
+    counters = {
+        "cpu_ns": cpu_ns or None,
+        "network_rx": None,
+        "network_tx": None,
+        "block_read": None,
+        "block_write": None,
+    }
+
+    if networks:
+        counters["network_rx"] = sum(n.get("rx_bytes", 0) for n in networks.values())
+        counters["network_tx"] = sum(n.get("tx_bytes", 0) for n in networks.values())
+
+    if block_io is not None:
+        # Operations are capitalized under cgroup v1 and lowercase under cgroup v2
+        operations = [(entry["op"].lower(), entry["value"]) for entry in block_io]
+        counters["block_read"] = sum(v for op, v in operations if op == "read")
+        counters["block_write"] = sum(v for op, v in operations if op == "write")
+
+    return counters
+
+
+def rusage_usage(rusage: struct_rusage) -> dict:
+    """Returns the resource usage report for a process from its rusage"""
+    return {
+        **empty_usage(),
+        "cpu_seconds": rusage.ru_utime + rusage.ru_stime,
+        # ru_maxrss is reported in kilobytes on Linux
+        "memory_peak_bytes": rusage.ru_maxrss * 1024,
+        "block_read_bytes": rusage.ru_inblock * RUSAGE_BLOCK_SIZE,
+        "block_write_bytes": rusage.ru_oublock * RUSAGE_BLOCK_SIZE,
+    }
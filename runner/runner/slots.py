@@ -0,0 +1,141 @@
+"""Execution slot tracking
+
+The listener and the worker run as separate processes. The worker reports when the
+tasks it executes start and finish by way of task_events, a queue that is created
+before either process is forked, and the listener uses those reports to keep a local
+count of the free execution slots.
+
+Tasks only take a slot once their image is present. Until then they are held by the
+listener, and once their image has been pulled they wait in the SlotTracker for a slot
+to free up.
+"""
+from collections import deque
+from logging import getLogger
+from multiprocessing import Queue
+from time import monotonic
+from typing import Optional
+
+from celery.signals import task_postrun, task_prerun
+
+logger = getLogger(__name__)
+
+TASK_STARTED = "TASK_STARTED"
+TASK_FINISHED = "TASK_FINISHED"
+
+# The task that marks the end of a TASK_PACKAGE chain
+FINAL_TASK_NAME = "runner.handlers.publish_result"
+TERMINAL_STATES = ["SUCCESS", "FAILURE"]
+
+task_events = Queue()
+
+
+class SlotTracker:
+    """Tracks the execution slots that are in use by the worker
+
+    Each tasking message that is handed to the worker occupies a slot until the
+    worker reports that it has finished. The message is only acknowledged at that
+    point, so the number of unacknowledged messages on the channel always matches
+    the number of occupied slots.
+
+    Attributes:
+        concurrency: The total number of execution slots. This may be changed while
+                     tasks are running, in which case tasks holding slots beyond
+                     the new concurrency keep them until they finish.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self._pending: dict[str, int] = {}
+        self._pending_since: dict[str, float] = {}
+        self._running: dict[str, int] = {}
+        self._ready: deque[tuple[dict, int]] = deque()
+        self._pulling: set[str] = set()
+
+    @property
+    def free_slots(self) -> int:
+        """The number of slots not currently occupied by a task"""
+        return max(self.concurrency - len(self._pending) - len(self._running), 0)
+
+    @property
+    def waiting(self) -> int:
+        """The number of tasks whose image is present that are waiting for a slot"""
+        return len(self._ready)
+
+    @property
+    def pulling(self) -> int:
+        """The number of tasks held while their image is pulled"""
+        return len(self._pulling)
+
+    @property
+    def in_flight(self) -> int:
+        """The number of tasks that are ready, waiting to start or running"""
+        return len(self._ready) + len(self._pending) + len(self._running)
+
+    def hold(self, task_id: str) -> None:
+        """Hold the task while its image is pulled"""
+        self._pulling.add(task_id)
+
+    def wait(self, task: dict, delivery_tag: int) -> None:
+        """Queue the task, whose image is present, until a slot is free"""
+        self._pulling.discard(task["id"])
+        self._ready.append((task, delivery_tag))
+
+    def next_ready(self) -> Optional[tuple[dict, int]]:
+        """Returns the next queued task and its delivery tag if there is a free slot
+        for it, otherwise None"""
+        if not self._ready or not self.free_slots:
+            return None
+
+        return self._ready.popleft()
+
+    def acquire(self, task_id: str, delivery_tag: int) -> None:
+        """Occupy a slot for the task received with delivery_tag"""
+        self._pending[task_id] = delivery_tag
+        self._pending_since[task_id] = monotonic()
+
+    def start(self, task_id: str) -> Optional[float]:
+        """Mark the task as having been picked up by the worker
+
+        Returns:
+            The seconds the task waited for the worker, or None if the task was not
+            waiting to start.
+        """
+        if (delivery_tag := self._pending.pop(task_id, None)) is None:
+            return None
+
+        self._running[task_id] = delivery_tag
+
+        return monotonic() - self._pending_since.pop(task_id)
+
+    def release(self, task_id: str) -> Optional[int]:
+        """Free the slot held by the task
+
+        Returns:
+            The delivery tag of the message that the task was received in, or None
+            if the task was not holding a slot.
+        """
+        delivery_tag = self._running.pop(task_id, None)
+
+        if delivery_tag is None:
+            delivery_tag = self._pending.pop(task_id, None)
+            self._pending_since.pop(task_id, None)
+
+        return delivery_tag
+
+
+@task_prerun.connect
+def _report_task_started(sender=None, task=None, **kwargs):
+    """Report the start of the first task in a TASK_PACKAGE chain"""
+    if task.request.id == task.request.root_id:
+        task_events.put((TASK_STARTED, task.request.root_id))
+
+
+@task_postrun.connect
+def _report_task_finished(sender=None, task=None, state=None, **kwargs):
+    """Report the end of a TASK_PACKAGE chain, either because the final task completed
+    or because one of the tasks along the way failed for good"""
+    if task.request.root_id is None or state not in TERMINAL_STATES:
+        return
+
+    if task.name == FINAL_TASK_NAME or state == "FAILURE":
+        task_events.put((TASK_FINISHED, task.request.root_id))
@@ -0,0 +1,194 @@
+"""Store-and-forward of task results
+
+Rather than publishing the TASK_RESULT for a task directly, the runner writes it to a
+spool on disk before the task's tasking message is acknowledged. A drainer then
+publishes the spooled results in batches from a background thread, removing each
+once the broker has confirmed it. Results survive the broker being unavailable for any
+length of time, as well as the runner restarting, and once the broker is reachable
+again the backlog is published as fast as the broker confirms it.
+
+The spool is a SQLite database, so that it can be written to by the worker processes
+and drained by the listener at the same time. Should the runner stop after a result
+was published but before it was removed from the spool, the result is published again
+when the runner restarts.
+"""
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from os import getenv, makedirs
+from os.path import dirname, join
+from threading import Event, Thread
+from time import time
+from typing import Optional
+
+from .images import RUNNER_DATA_DIR
+from .messaging import PUBLISH_BATCH_SIZE, send_messages
+from .metrics import timed
+
+RESULT_SPOOL = getenv("RUNNER_RESULT_SPOOL", join(RUNNER_DATA_DIR, "results.db"))
+SPOOL_DRAIN_INTERVAL = float(getenv("RUNNER_SPOOL_DRAIN_INTERVAL", 1))
+SPOOL_MAX_BACKOFF = 30
+
+# TODO: The routing key should come from the configuration information received
+#       during runner registration.
+RESULTS_QUEUE = "tasking.results"
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSpool:
+    """The TASK_RESULT messages waiting to be published, held in a SQLite database
+
+    Attributes:
+        path: Path of the SQLite database
+    """
+
+    def __init__(self, path: str = RESULT_SPOOL) -> None:
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            makedirs(dirname(self.path) or ".", exist_ok=True)
+
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA synchronous=FULL")
+
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "message TEXT NOT NULL, "
+                "spooled_at REAL NOT NULL)"
+            )
+            self._initialized = True
+
+        return connection
+
+    def put(self, message: dict) -> None:
+        """Write the message to the spool, returning once it is on disk"""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO results (message, spooled_at) VALUES (?, ?)",
+                (json.dumps(message), time()),
+            )
+
+    def peek(self, limit: int) -> list[tuple[int, dict]]:
+        """Returns up to limit of the oldest spooled messages, along with their ids"""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT id, message FROM results ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+        return [(entry_id, json.loads(message)) for entry_id, message in rows]
+
+    def delete(self, entry_ids: list[int]) -> None:
+        """Remove the messages with the given ids from the spool"""
+        with closing(self._connect()) as connection:
+            connection.executemany(
+                "DELETE FROM results WHERE id = ?",
+                [(entry_id,) for entry_id in entry_ids],
+            )
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class SpoolDrainer:
+    """Publishes the spooled results from a background thread
+
+    Results are published in batches, and removed from the spool once the broker has
+    confirmed them. If publishing fails, the drainer backs off before trying again,
+    up to SPOOL_MAX_BACKOFF seconds.
+
+    Attributes:
+        spool: The spool to drain
+        batch_size: The maximum number of results to publish at once
+        interval: Seconds to wait for new results when the spool is empty, unless
+                  woken sooner by wake()
+    """
+
+    def __init__(
+        self,
+        spool: ResultSpool,
+        batch_size: int = PUBLISH_BATCH_SIZE,
+        interval: float = SPOOL_DRAIN_INTERVAL,
+    ) -> None:
+        self.spool = spool
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = Event()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """Start draining the spool"""
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="result spool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self) -> None:
+        """Drain the spool now, rather than waiting for the interval to pass"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        backoff = 0
+
+        while not self._stopped.is_set():
+            self._wake.clear()
+
+            try:
+                published = self.drain()
+                backoff = 0
+            except Exception as exc:
+                backoff = min(backoff * 2 or 1, SPOOL_MAX_BACKOFF)
+                logger.warning(
+                    "Unable to publish spooled results: %s. Retrying in %ss.",
+                    exc,
+                    backoff,
+                )
+                self._stopped.wait(backoff)
+                continue
+
+            # Keep going while the batches are full, as more results are waiting
+            if published < self.batch_size:
+                self._wake.wait(self.interval)
+
+    def drain(self) -> int:
+        """Publish a batch of spooled results
+
+        Returns:
+            The number of results published
+
+        Raises:
+            Exception: The results could not be published, in which case they remain
+                       in the spool
+        """
+        entries = self.spool.peek(self.batch_size)
+
+        if not entries:
+            return 0
+
+        with timed("result_publish"):
+            send_messages(
+                (RESULTS_QUEUE, "TASK_RESULT", message) for _, message in entries
+            )
+        self.spool.delete([entry_id for entry_id, _ in entries])
+
+        logger.debug("Published %s spooled results", len(entries))
+
+        return len(entries)
+
+
+result_spool = ResultSpool()
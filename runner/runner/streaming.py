@@ -0,0 +1,150 @@
+"""Streaming of task output to the core while the task is running"""
+import logging
+from concurrent.futures import TimeoutError
+from os import getenv
+from time import monotonic
+from typing import Callable, Iterable, Iterator
+
+from pika.exceptions import AMQPError
+
+from .messaging import send_message
+
+LOG_CHUNK_SIZE = int(getenv("RUNNER_LOG_CHUNK_SIZE", 64 * 1024))
+LOG_FLUSH_INTERVAL = float(getenv("RUNNER_LOG_FLUSH_INTERVAL", 1))
+
+OUTPUT_SEPARATOR = b"==== Output From Command ====\n"
+
+logger = logging.getLogger(__name__)
+
+
+def publish_log(message: dict) -> None:
+    # TODO: The routing key should come from the configuration information received
+    #       during runner registration.
+    send_message("tasking.results", "TASK_LOG", message)
+
+
+class LogStream:
+    """Buffers task output and sends it on to the core as TASK_LOG messages
+
+    Output is sent whenever the buffer reaches LOG_CHUNK_SIZE bytes, or when new
+    output arrives more than LOG_FLUSH_INTERVAL seconds after the last chunk was sent.
+    Output is only ever split on line boundaries. Whatever remains in the buffer once
+    the task has finished is not sent as a TASK_LOG, but is instead included in the
+    TASK_RESULT message, so short tasks produce no TASK_LOG messages at all.
+
+    If a TASK_LOG message can not be sent, streaming stops for the rest of the task,
+    and all of the output that has not been sent is included in the TASK_RESULT.
+
+    Attributes:
+        task_id: ID of the task the output belongs to
+        sent: Number of TASK_LOG messages sent so far
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        publish: Callable[[dict], None] = publish_log,
+        chunk_size: int = LOG_CHUNK_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+    ) -> None:
+        self.task_id = task_id
+        self.sent = 0
+        self._publish = publish
+        self._chunk_size = chunk_size
+        self._flush_interval = flush_interval
+        self._buffer = bytearray()
+        self._last_flush = monotonic()
+        self._streaming = True
+
+    def write(self, line: bytes) -> None:
+        """Add a line of output, sending the buffered output if it is due"""
+        self._buffer += line
+
+        if self._streaming and (
+            len(self._buffer) >= self._chunk_size
+            or monotonic() - self._last_flush >= self._flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Send the buffered output as a TASK_LOG message"""
+        if self._buffer:
+            try:
+                self._publish(
+                    {
+                        "task_id": self.task_id,
+                        "sequence": self.sent,
+                        "output": self._buffer.decode(errors="replace"),
+                    }
+                )
+            except (AMQPError, TimeoutError) as exc:
+                logger.warning(
+                    "Unable to stream output for task %s, it will be sent with the "
+                    "result: %s",
+                    self.task_id,
+                    exc,
+                )
+                self._streaming = False
+                return
+
+            self.sent += 1
+            self._buffer.clear()
+
+        self._last_flush = monotonic()
+
+    def remainder(self) -> bytes:
+        """Returns the output that has not been sent"""
+        return bytes(self._buffer)
+
+
+def iter_lines(
+    chunks: Iterable[bytes], max_length: int = LOG_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Regroup a stream of arbitrarily sized chunks into lines, including the line
+    endings
+
+    Lines longer than max_length are yielded in pieces of max_length bytes, so that
+    output without line breaks is never held in memory in full.
+    """
+    partial = b""
+
+    for chunk in chunks:
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+
+        for line in lines:
+            yield from _split(line + b"\n", max_length)
+
+        whole = len(partial) - len(partial) % max_length
+        yield from _split(partial[:whole], max_length)
+        partial = partial[whole:]
+
+    if partial:
+        yield partial
+
+
+def _split(data: bytes, max_length: int) -> Iterator[bytes]:
+    for start in range(0, len(data), max_length):
+        end = start + max_length
+        yield data[start:end]
+
+
+def parse_function_output(chunks: Iterable[bytes], log_stream: LogStream):
+    """Follow the output of a function call until it exits, streaming the output as
+    it arrives.
+
+    Returns:
+        A tuple of the output that was not streamed and the function result
+    """
+    lines = iter_lines(chunks)
+
+    for line in lines:
+        if line == OUTPUT_SEPARATOR:
+            break
+
+        log_stream.write(line)
+
+    output = log_stream.remainder().rstrip()
+    result = b"".join(lines).rstrip()
+
+    return output, result
@@ -0,0 +1,59 @@
+import io
+import tarfile
+from unittest.mock import Mock
+
+import pytest
+
+from runner.artifacts import LocalArtifactStore, collect_output_files, store_result
+
+
+@pytest.fixture
+def store(tmp_path) -> LocalArtifactStore:
+    return LocalArtifactStore(root=str(tmp_path))
+
+
+def _archive(files: dict) -> bytes:
+    archive = io.BytesIO()
+
+    with tarfile.open(fileobj=archive, mode="w") as tarball:
+        directory = tarfile.TarInfo("output")
+        directory.type = tarfile.DIRTYPE
+        tarball.addfile(directory)
+
+        for name, content in files.items():
+            info = tarfile.TarInfo(f"output/{name}")
+            info.size = len(content)
+            tarball.addfile(info, io.BytesIO(content))
+
+    return archive.getvalue()
+
+
+def test_identical_content_stored_once(store, tmp_path):
+    first = store.put(io.BytesIO(b"content"))
+    second = store.put(io.BytesIO(b"content"))
+
+    assert first == second
+    assert first[1] == len(b"content")
+    assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 1
+
+
+def test_small_result_sent_inline(store, mocker):
+    mocker.patch("runner.artifacts.ARTIFACT_THRESHOLD", 8)
+
+    assert store_result(b"12345678", store) is None
+    assert store_result(b"123456789", store)["size"] == 9
+
+
+def test_collect_output_files(store):
+    archive = io.BytesIO(_archive({"report.csv": b"a,b\n", "logs/run.log": b"done\n"}))
+    container = Mock()
+    # Deliver the archive in chunks, as the docker client does
+    container.get_archive.return_value = (iter(lambda: archive.read(1000), b""), {})
+
+    artifacts = collect_output_files(container, store)
+
+    assert [artifact["name"] for artifact in artifacts] == [
+        "report.csv",
+        "logs/run.log",
+    ]
+    assert artifacts[0]["size"] == 4
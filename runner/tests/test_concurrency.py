@@ -0,0 +1,77 @@
+from unittest.mock import Mock
+
+import pytest
+from pika.exceptions import ChannelClosedByBroker
+
+from runner.concurrency import ConcurrencyController, HostUsage, QueueDepth
+
+
+@pytest.fixture
+def host() -> Mock:
+    return Mock(cpu=Mock(return_value=0.5), memory=Mock(return_value=0.5))
+
+
+def _controller(host: Mock, free_slots: int, backlog: int) -> ConcurrencyController:
+    return ConcurrencyController(
+        4,
+        minimum=2,
+        maximum=8,
+        free_slots=lambda: free_slots,
+        backlog=lambda: backlog,
+        on_change=Mock(),
+        host=host,
+    )
+
+
+def test_concurrency_raised_when_busy_with_backlog(host):
+    controller = _controller(host, free_slots=0, backlog=3)
+
+    assert controller.adjust() == 5
+    controller.on_change.assert_called_once_with(5)
+
+
+def test_concurrency_held_without_backlog(host):
+    controller = _controller(host, free_slots=0, backlog=0)
+
+    assert controller.adjust() == 4
+    controller.on_change.assert_not_called()
+
+
+def test_concurrency_reduced_under_memory_pressure(host):
+    """Host pressure takes priority over the backlog, down to the minimum"""
+    host.memory.return_value = 0.95
+    controller = _controller(host, free_slots=0, backlog=3)
+
+    assert controller.adjust() == 3
+    assert controller.adjust() == 2
+    assert controller.adjust() == 2
+
+
+def test_host_usage(tmp_path):
+    (tmp_path / "meminfo").write_text(
+        "MemTotal:       1000 kB\nMemFree:         100 kB\nMemAvailable:    250 kB\n"
+    )
+    stat = tmp_path / "stat"
+    stat.write_text("cpu  100 0 100 700 100 0 0 0 0 0\n")
+    host = HostUsage(proc=str(tmp_path))
+
+    assert host.cpu() is None
+
+    stat.write_text("cpu  150 0 150 750 150 0 0 0 0 0\n")
+
+    assert host.cpu() == 0.5
+    assert host.memory() == 0.75
+
+
+def test_queue_depth_closes_connection_on_error(mocker):
+    """A connection left open after a failed count is closed rather than leaked"""
+    connection = mocker.patch("runner.concurrency.build_connection").return_value
+    connection.is_closed = False
+    connection.is_open = True
+    connection.channel.return_value.queue_declare.side_effect = ChannelClosedByBroker(
+        404, "NOT_FOUND"
+    )
+    queue_depth = QueueDepth(["pool.public"])
+
+    assert queue_depth() is None
+    connection.close.assert_called_once()
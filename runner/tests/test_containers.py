@@ -0,0 +1,37 @@
+from time import sleep
+from unittest.mock import Mock
+
+from runner.containers import RUNNER_LABEL, RUNNER_NAME, Deadline, reap_containers
+
+
+def test_container_killed_after_timeout():
+    container = Mock()
+
+    with Deadline(container, 0.01) as deadline:
+        sleep(0.1)
+
+    assert deadline.expired
+    container.kill.assert_called_once()
+
+
+def test_container_not_killed_within_timeout():
+    container = Mock()
+
+    with Deadline(container, 10) as deadline:
+        pass
+
+    assert not deadline.expired
+    container.kill.assert_not_called()
+
+
+def test_reap_removes_containers_for_this_runner(mocker):
+    stale = Mock()
+    client = mocker.patch("runner.containers.docker.from_env").return_value
+    client.containers.list.return_value = [stale]
+
+    reap_containers()
+
+    client.containers.list.assert_called_once_with(
+        all=True, filters={"label": f"{RUNNER_LABEL}={RUNNER_NAME}"}
+    )
+    stale.remove.assert_called_once_with(force=True)
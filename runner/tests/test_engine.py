@@ -0,0 +1,139 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import Future
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from docker.errors import DockerException
+
+from runner import engine as engine_module
+from runner.engine import AsyncEngine
+
+
+@pytest.fixture
+def engine(mocker) -> AsyncEngine:
+    image_puller = mocker.patch("runner.engine.image_puller")
+    image_puller.pull.side_effect = lambda image: _completed(True)
+    mocker.patch("runner.engine.result_spool")
+
+    return AsyncEngine(concurrency=2)
+
+
+def _completed(result) -> Future:
+    future = Future()
+    future.set_result(result)
+
+    return future
+
+
+def _deliver(engine: AsyncEngine, channel: Mock, delivery_tag: int) -> None:
+    properties = Mock(headers={"x-msg-type": "TASK_PACKAGE"})
+    body = json.dumps({"id": f"task{delivery_tag}", "package": "package:1"})
+
+    engine._handle_delivery(
+        channel, Mock(delivery_tag=delivery_tag), properties, body.encode()
+    )
+
+
+def test_tasks_bounded_by_concurrency(engine, mocker):
+    """No more than concurrency tasks run at once, and each tasking message is
+    acknowledged once its result has been published"""
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def execute_task(task):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        release.wait(1)
+        with lock:
+            running -= 1
+        return {"task_id": task["id"]}
+
+    mocker.patch("runner.engine.execute_task", side_effect=execute_task)
+
+    async def run():
+        channel = engine._channel = Mock(is_open=True)
+
+        for delivery_tag in range(1, 5):
+            _deliver(engine, channel, delivery_tag)
+
+        await asyncio.sleep(0.1)
+        assert channel.basic_ack.call_count == 0
+
+        release.set()
+        await asyncio.gather(*engine._tasks)
+
+        return channel
+
+    channel = asyncio.run(run())
+
+    assert peak == 2
+    assert channel.basic_ack.call_count == 4
+
+
+def test_failed_task_reported(engine, mocker):
+    """A task that raises is reported as failed before its message is acknowledged"""
+    mocker.patch("runner.engine.execute_task", side_effect=RuntimeError("broken"))
+
+    async def run():
+        channel = engine._channel = Mock(is_open=True)
+        _deliver(engine, channel, 1)
+        await asyncio.gather(*engine._tasks)
+
+        return channel
+
+    channel = asyncio.run(run())
+    result = engine_module.result_spool.put.call_args.args[0]
+
+    assert result["task_id"] == "task1"
+    assert result["status"] == 1
+    assert "broken" in result["output"]
+    channel.basic_ack.assert_called_once_with(1)
+
+
+def test_failed_pull_reported(engine, mocker):
+    """A task whose image cannot be pulled is reported as failed without being run"""
+    mocker.patch("asyncio.sleep", new=AsyncMock())
+    execute_task = mocker.patch("runner.engine.execute_task")
+    engine_module.image_puller.pull.side_effect = DockerException("not found")
+
+    async def run():
+        channel = engine._channel = Mock(is_open=True)
+        _deliver(engine, channel, 1)
+        await asyncio.gather(*engine._tasks)
+
+        return channel
+
+    channel = asyncio.run(run())
+    result = engine_module.result_spool.put.call_args.args[0]
+
+    execute_task.assert_not_called()
+    assert result["task_id"] == "task1"
+    assert result["status"] == 1
+    assert "not found" in result["output"]
+    channel.basic_ack.assert_called_once_with(1)
+
+
+def test_unspooled_result_not_acknowledged(engine, mocker):
+    """A message whose result cannot be spooled is left to be redelivered"""
+    mocker.patch("asyncio.sleep", new=AsyncMock())
+    mocker.patch("runner.engine.execute_task", return_value={"task_id": "task1"})
+    engine_module.result_spool.put.side_effect = sqlite3.OperationalError("locked")
+
+    async def run():
+        channel = engine._channel = Mock(is_open=True)
+        _deliver(engine, channel, 1)
+        await asyncio.gather(*engine._tasks)
+
+        return channel
+
+    channel = asyncio.run(run())
+
+    assert engine._in_flight == 0
+    channel.basic_ack.assert_not_called()
@@ -0,0 +1,148 @@
+import io
+import json
+import tarfile
+
+import pytest
+from docker.errors import DockerException
+
+from runner.artifacts import LocalArtifactStore
+from runner.containers import TIMEOUT_STATUS
+from runner.executors import (
+    DockerExecutor,
+    ProcessExecutor,
+    VirtualenvCache,
+    get_executor,
+)
+
+FUNCTIONS = b"""
+import os
+import time
+
+
+def hello(name):
+    print(f"hello {name}")
+
+    with open(os.path.join(os.environ["FUNCTIONARY_OUTPUT_DIR"], "out.txt"), "w") as f:
+        f.write(os.environ["GREETING"])
+
+    return {"name": name}
+
+
+def sleep():
+    time.sleep(30)
+"""
+
+
+@pytest.fixture
+def store(tmp_path) -> LocalArtifactStore:
+    return LocalArtifactStore(str(tmp_path / "artifacts"))
+
+
+@pytest.fixture
+def source(store) -> str:
+    buffer = io.BytesIO()
+
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tarball:
+        info = tarfile.TarInfo("functions.py")
+        info.size = len(FUNCTIONS)
+        tarball.addfile(info, io.BytesIO(FUNCTIONS))
+
+    buffer.seek(0)
+    digest, _ = store.put(buffer)
+
+    return digest
+
+
+@pytest.fixture
+def executor(mocker, tmp_path, store) -> ProcessExecutor:
+    mocker.patch("runner.executors.artifact_store", store)
+    mocker.patch("runner.executors.LogStream").return_value.remainder.return_value = b""
+    cache = VirtualenvCache(root=str(tmp_path / "virtualenvs"), store=store, size=1)
+
+    return ProcessExecutor(cache)
+
+
+def _task(source: str, function: str, parameters: dict) -> dict:
+    return {
+        "id": "task",
+        "package": "localhost:5000/env/package:build1",
+        "function": function,
+        "function_parameters": parameters,
+        "variables": {"GREETING": "hi"},
+        "executor": "process",
+        "language": "python",
+        "source": source,
+    }
+
+
+def test_process_executor(executor, source, store):
+    """The function runs in the package's virtualenv without a docker daemon"""
+    status, _, result, artifacts, resources = executor.run(
+        _task(source, "hello", {"name": "world"}), timeout=30
+    )
+
+    assert status == 0
+    assert json.loads(result) == {"name": "world"}
+    assert resources["cpu_seconds"] > 0
+    assert resources["memory_peak_bytes"] > 0
+    assert [artifact["name"] for artifact in artifacts] == ["out.txt"]
+
+    with store.open(artifacts[0]["digest"]) as output_file:
+        assert output_file.read() == b"hi"
+
+
+def test_process_executor_timeout(executor, source):
+    status, output, _, _, _ = executor.run(_task(source, "sleep", {}), timeout=0.5)
+
+    assert status == TIMEOUT_STATUS
+    assert b"timeout" in output
+
+
+def test_virtualenv_cache_eviction(executor, source, tmp_path):
+    """Virtualenvs are reused for a build and evicted beyond the cache size"""
+    first = executor.cache.get("build1", source)
+
+    assert executor.cache.get("build1", source) == first
+
+    executor.cache.get("build2", source)
+
+    assert not (tmp_path / "virtualenvs" / "build1").exists()
+
+
+def test_virtualenv_in_use_not_evicted(executor, source, tmp_path):
+    with executor.cache.use("build1", source):
+        executor.cache.get("build2", source)
+
+        assert (tmp_path / "virtualenvs" / "build1").exists()
+
+    executor.cache.get("build3", source)
+
+    assert not (tmp_path / "virtualenvs" / "build1").exists()
+
+
+def test_unsupported_task_uses_docker(mocker, source):
+    mocker.patch("runner.executors.ENABLED_EXECUTORS", ["docker", "process"])
+
+    assert isinstance(get_executor(_task(source, "hello", {})), ProcessExecutor)
+    assert isinstance(
+        get_executor({**_task(source, "hello", {}), "language": "javascript"}),
+        DockerExecutor,
+    )
+
+    mocker.patch("runner.executors.ENABLED_EXECUTORS", ["docker"])
+
+    assert isinstance(get_executor(_task(source, "hello", {})), DockerExecutor)
+
+
+def test_docker_container_removed_on_error(mocker):
+    """The task's container is removed even if following its output fails"""
+    mocker.patch("runner.executors.warm_pool.size", 0)
+    container = mocker.patch("docker.from_env").return_value.containers.run.return_value
+    container.logs.side_effect = DockerException("connection aborted")
+    mocker.patch("runner.executors.Deadline")
+    mocker.patch("runner.executors.ResourceMonitor")
+
+    with pytest.raises(DockerException):
+        DockerExecutor().run(_task(None, "hello", {}), timeout=10)
+
+    container.remove.assert_called_once_with(force=True)
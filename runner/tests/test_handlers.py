@@ -0,0 +1,20 @@
+from runner.handlers import pull_image
+
+
+def test_pull_image_skips_cached_image(mocker):
+    """Images already fetched by the image puller are not pulled or counted again"""
+    image_cache = mocker.patch("runner.handlers.image_cache")
+    image_cache.contains.return_value = True
+
+    pull_image({"package": "localhost:5000/env/package:build"})
+
+    image_cache.pull.assert_not_called()
+
+
+def test_pull_image_pulls_missing_image(mocker):
+    image_cache = mocker.patch("runner.handlers.image_cache")
+    image_cache.contains.return_value = False
+
+    pull_image({"package": "localhost:5000/env/package:build"})
+
+    image_cache.pull.assert_called_once_with("localhost:5000/env/package:build")
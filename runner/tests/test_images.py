@@ -0,0 +1,94 @@
+from contextlib import closing
+from threading import Event
+from unittest.mock import Mock
+
+import pytest
+
+from runner.images import ImageCache, ImagePuller
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def docker_client(mocker):
+    client = Mock()
+    client.images.get.return_value.attrs = {"Size": 40 * MB}
+    mocker.patch("runner.images.docker.from_env", return_value=client)
+
+    return client
+
+
+@pytest.fixture
+def image_cache(tmp_path) -> ImageCache:
+    return ImageCache(path=str(tmp_path / "images.sqlite3"), budget=100 * MB)
+
+
+def test_pull_skipped_for_cached_image(docker_client, image_cache):
+    image = "registry:5000/env/package:build1"
+
+    assert not image_cache.pull(image)
+    assert image_cache.pull(image)
+    assert docker_client.images.pull.call_count == 1
+    assert image_cache.stats()["hits"] == 1
+    assert image_cache.stats()["misses"] == 1
+
+
+def test_cached_pull_through_puller_recorded(docker_client, image_cache, mocker):
+    """Images the puller finds in the cache are counted as hits and marked as used"""
+    image = "registry:5000/env/package:build1"
+    image_puller = ImagePuller(image_cache, concurrency=1)
+    image_puller.pull(image).result(timeout=1)
+    mocker.patch("runner.images.time", return_value=4102444800)
+
+    for _ in range(3):
+        assert image_puller.pull(image).result(timeout=1)
+
+    with closing(image_cache._connect()) as connection:
+        (last_used,) = connection.execute(
+            "SELECT last_used FROM images WHERE name = ?", (image,)
+        ).fetchone()
+
+    assert image_cache.stats()["hits"] == 3
+    assert image_cache.stats()["misses"] == 1
+    assert last_used == 4102444800
+
+
+def test_latest_tag_always_pulled(docker_client, image_cache):
+    image = "registry:5000/env/package"
+
+    image_cache.pull(image)
+    image_cache.pull(image)
+
+    assert docker_client.images.pull.call_count == 2
+
+
+def test_least_recently_used_evicted_over_budget(docker_client, image_cache):
+    image_cache.pull("registry:5000/env/package:build1")
+    image_cache.pull("registry:5000/env/package:build2")
+    image_cache.pull("registry:5000/env/package:build1")
+    image_cache.pull("registry:5000/env/package:build3")
+
+    docker_client.images.remove.assert_called_once_with(
+        "registry:5000/env/package:build2"
+    )
+    assert image_cache.stats()["images"] == 2
+
+
+def test_concurrent_pulls_deduplicated(docker_client, image_cache):
+    """Requests for an image that is already being pulled wait on that pull"""
+    image = "registry:5000/env/package:build1"
+    release = Event()
+    docker_client.images.pull.side_effect = lambda image: release.wait(1)
+    image_puller = ImagePuller(image_cache, concurrency=2)
+
+    first = image_puller.pull(image)
+    second = image_puller.pull(image)
+
+    assert second is first
+    assert image_puller.pulling == 1
+
+    release.set()
+    first.result(timeout=1)
+
+    assert docker_client.images.pull.call_count == 1
+    assert image_puller.pull(image).done()
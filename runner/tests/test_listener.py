@@ -1,59 +1,162 @@
+import json
+from concurrent.futures import Future
+from unittest.mock import Mock
+
 import pytest
-from celery.app.control import Inspect
+from pika.spec import BasicProperties
+
+from runner.listener import _handle_delivery, _release_slot, _resize
+from runner.slots import SlotTracker
+
+
+@pytest.fixture
+def slots() -> SlotTracker:
+    return SlotTracker(concurrency=4)
+
 
-from runner.listener import _has_available_worker
+@pytest.fixture
+def task_package() -> dict:
+    return {
+        "id": "3d2a9a38-9d4b-4bde-a05b-7cb2e6fd64b3",
+        "package": "localhost:5000/env/package:build",
+        "function": "hello",
+        "function_parameters": {},
+        "variables": {},
+    }
 
 
 @pytest.fixture
-def get_inspect() -> Inspect:
-    """Return empty Inspect object"""
-    return Inspect()
+def image_puller(mocker) -> Mock:
+    image_puller = mocker.patch("runner.listener.image_puller")
+    image_puller.pull.side_effect = lambda image: _completed(True)
+
+    return image_puller
+
+
+def _completed(result) -> Future:
+    future = Future()
+    future.set_result(result)
+
+    return future
+
+
+def _channel() -> Mock:
+    """A channel whose connection runs threadsafe callbacks immediately"""
+    channel = Mock()
+    channel.connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+
+    return channel
+
+
+def _properties(msg_type: str) -> BasicProperties:
+    return BasicProperties(headers={"x-msg-type": msg_type})
+
+
+@pytest.mark.usefixtures("image_puller")
+def test_task_package_holds_slot_until_finished(mocker, slots, task_package):
+    """TASK_PACKAGE messages are acked only once the task finishes"""
+    mocker.patch("runner.listener.chain")
+    channel = _channel()
+    method = Mock(delivery_tag=7)
+
+    _handle_delivery(
+        channel,
+        method,
+        _properties("TASK_PACKAGE"),
+        json.dumps(task_package).encode(),
+        slots=slots,
+    )
+
+    assert slots.free_slots == 3
+    channel.basic_ack.assert_not_called()
+
+    _release_slot(channel, slots, task_package["id"])
+
+    assert slots.free_slots == 4
+    channel.basic_ack.assert_called_once_with(7)
+
+
+def test_pull_image_does_not_hold_slot(image_puller, slots):
+    """PULL_IMAGE broadcasts are pulled in the background and acked straight away,
+    without occupying a slot"""
+    channel = Mock()
+    method = Mock(delivery_tag=3)
+    message = {"package": "localhost:5000/package:1", "environment": "env"}
 
+    _handle_delivery(
+        channel,
+        method,
+        _properties("PULL_IMAGE"),
+        json.dumps(message).encode(),
+        slots=slots,
+    )
 
-def test_has_all_available_workers(mocker, get_inspect):
-    def mock_worker_tasks(inspect: Inspect = get_inspect):
-        return []
+    image_puller.pull.assert_called_once_with("localhost:5000/package:1")
+    channel.basic_ack.assert_called_once_with(3)
+    assert slots.free_slots == 4
 
-    def mock_worker_concurrency():
-        return 4
 
-    mocker.patch("runner.listener._get_current_worker_tasks", mock_worker_tasks)
-    mocker.patch("runner.listener._get_worker_concurrency", mock_worker_concurrency)
+def test_pull_image_ignored_for_other_pools(image_puller, slots):
+    message = {"package": "localhost:5000/package:1", "runner_label": "gpu"}
 
-    assert _has_available_worker(get_inspect)
+    _handle_delivery(
+        Mock(),
+        Mock(delivery_tag=3),
+        _properties("PULL_IMAGE"),
+        json.dumps(message).encode(),
+        slots=slots,
+    )
 
-    worker_tasks = mock_worker_tasks()
-    worker_concurrency = mock_worker_concurrency()
-    assert len(worker_tasks) < worker_concurrency
+    image_puller.pull.assert_not_called()
 
 
-def test_has_some_available_workers(mocker, get_inspect):
-    def mock_worker_tasks(inspect: Inspect = get_inspect):
-        return [1, 2]
+def test_task_takes_slot_once_image_present(mocker, image_puller, task_package):
+    """Tasks wait for their image without a slot, raising the prefetch while they
+    do, and then wait for a free slot"""
+    chain = mocker.patch("runner.listener.chain")
+    slots = SlotTracker(concurrency=1)
+    channel = _channel()
+    pull = Future()
+    image_puller.pull.side_effect = lambda image: pull
+    second_task = {**task_package, "id": "second"}
 
-    def mock_worker_concurrency():
-        return 4
+    for delivery_tag, task in enumerate([task_package, second_task], start=1):
+        _handle_delivery(
+            channel,
+            Mock(delivery_tag=delivery_tag),
+            _properties("TASK_PACKAGE"),
+            json.dumps(task).encode(),
+            slots=slots,
+        )
 
-    mocker.patch("runner.listener._get_current_worker_tasks", mock_worker_tasks)
-    mocker.patch("runner.listener._get_worker_concurrency", mock_worker_concurrency)
-    assert _has_available_worker(get_inspect)
+    assert slots.free_slots == 1
+    chain.assert_not_called()
+    channel.basic_qos.assert_called_with(prefetch_count=3, global_qos=True)
 
-    worker_tasks = mock_worker_tasks()
-    worker_concurrency = mock_worker_concurrency()
-    assert len(worker_tasks) < worker_concurrency
+    pull.set_result(False)
 
+    assert slots.free_slots == 0
+    assert slots.in_flight == 2
+    assert chain.call_count == 1
+    channel.basic_qos.assert_called_with(prefetch_count=1, global_qos=True)
 
-def test_has_no_available_workers(mocker, get_inspect):
-    def mock_worker_tasks(inspect: Inspect = get_inspect):
-        return [1, 2, 3, 4]
+    _release_slot(channel, slots, task_package["id"])
 
-    def mock_worker_concurrency():
-        return 4
+    assert slots.free_slots == 0
+    assert chain.call_count == 2
 
-    mocker.patch("runner.listener._get_current_worker_tasks", mock_worker_tasks)
-    mocker.patch("runner.listener._get_worker_concurrency", mock_worker_concurrency)
-    assert not _has_available_worker(get_inspect)
 
-    worker_tasks = mock_worker_tasks()
-    worker_concurrency = mock_worker_concurrency()
-    assert len(worker_tasks) == worker_concurrency
+def test_raised_concurrency_dispatches_waiting_tasks(mocker, task_package):
+    """Waiting tasks are handed off as soon as the concurrency is raised"""
+    chain = mocker.patch("runner.listener.chain")
+    slots = SlotTracker(concurrency=1)
+    channel = _channel()
+
+    slots.acquire("running", 1)
+    slots.wait(task_package, 2)
+
+    _resize(channel, slots, 2)
+
+    assert chain.call_count == 1
+    assert slots.waiting == 0
+    channel.basic_qos.assert_called_once_with(prefetch_count=2, global_qos=True)
@@ -0,0 +1,95 @@
+from unittest.mock import Mock
+
+import pika
+import pytest
+from pika.exceptions import AMQPConnectionError, NackError, UnroutableError
+from pika.spec import Basic
+
+from runner.messaging import Publisher, _publish_properties, send_messages
+
+
+@pytest.fixture
+def publisher(mocker) -> Publisher:
+    mocker.patch.object(Publisher, "_ensure_started")
+
+    publisher = Publisher(batch_size=2)
+    publisher._connection = Mock()
+    publisher._channel = Mock()
+
+    return publisher
+
+
+def _publish(publisher: Publisher, count: int) -> list:
+    futures = [
+        publisher.publish("", "tasking.results", b"{}", pika.BasicProperties())
+        for _ in range(count)
+    ]
+    publisher._drain()
+
+    return futures
+
+
+def _confirm(publisher: Publisher, method) -> None:
+    publisher._on_delivery_confirmation(Mock(method=method))
+
+
+def test_publish_in_batches(publisher):
+    _publish(publisher, 3)
+
+    assert publisher._channel.basic_publish.call_count == 2
+    publisher._connection.ioloop.call_later.assert_called_with(0, publisher._drain)
+
+    publisher._drain()
+
+    assert publisher._channel.basic_publish.call_count == 3
+
+
+def test_multiple_ack_resolves_all_confirmed(publisher):
+    publisher.batch_size = 3
+    futures = _publish(publisher, 3)
+
+    _confirm(publisher, Basic.Ack(delivery_tag=2, multiple=True))
+
+    assert [future.done() for future in futures] == [True, True, False]
+    assert futures[0].result() is None
+
+
+def test_returned_and_nacked_messages_fail(publisher):
+    futures = _publish(publisher, 2)
+    properties = publisher._channel.basic_publish.call_args_list[0].args[3]
+
+    publisher._on_message_returned(None, None, properties, b"{}")
+    _confirm(publisher, Basic.Ack(delivery_tag=1))
+    _confirm(publisher, Basic.Nack(delivery_tag=2))
+
+    with pytest.raises(UnroutableError):
+        futures[0].result()
+    with pytest.raises(NackError):
+        futures[1].result()
+
+
+def test_connection_loss_fails_unconfirmed(publisher):
+    futures = _publish(publisher, 1)
+
+    publisher._on_connection_closed(Mock(), "closed")
+
+    with pytest.raises(AMQPConnectionError):
+        futures[0].result()
+
+
+def test_timeout_cancels_queued_messages(mocker, publisher):
+    """Messages that are still queued when sending times out are not published"""
+    mocker.patch("runner.messaging.get_publisher", return_value=publisher)
+    mocker.patch("runner.messaging.PUBLISH_TIMEOUT", 0)
+
+    with pytest.raises(TimeoutError):
+        send_messages([("tasking.results", "TASK_RESULT", {})] * 2)
+
+    publisher._drain()
+
+    publisher._channel.basic_publish.assert_not_called()
+
+
+def test_results_are_persistent():
+    assert _publish_properties("TASK_RESULT").delivery_mode == 2
+    assert _publish_properties("RUNNER_HEARTBEAT").delivery_mode == 1
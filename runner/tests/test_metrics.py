@@ -0,0 +1,28 @@
+from runner.metrics import PHASE_SECONDS, TASKS_TOTAL, MetricsRegistry
+
+
+def test_render_phase_histogram():
+    registry = MetricsRegistry()
+
+    registry.record("PHASE_OBSERVED", ("image_pull", 0.2))
+    registry.record("PHASE_OBSERVED", ("image_pull", 3))
+    rendered = registry.render().splitlines()
+
+    assert f'{PHASE_SECONDS}_bucket{{phase="image_pull",le="0.1"}} 0' in rendered
+    assert f'{PHASE_SECONDS}_bucket{{phase="image_pull",le="0.25"}} 1' in rendered
+    assert f'{PHASE_SECONDS}_bucket{{phase="image_pull",le="+Inf"}} 2' in rendered
+    assert f'{PHASE_SECONDS}_count{{phase="image_pull"}} 2' in rendered
+
+
+def test_render_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.gauge("functionary_runner_free_slots", "Free slots", lambda: 3)
+
+    registry.record("TASK_COMPLETED", "success")
+    registry.record("TASK_COMPLETED", "success")
+    registry.record("TASK_COMPLETED", "timeout")
+    rendered = registry.render().splitlines()
+
+    assert f'{TASKS_TOTAL}{{status="success"}} 2' in rendered
+    assert f'{TASKS_TOTAL}{{status="timeout"}} 1' in rendered
+    assert "functionary_runner_free_slots 3" in rendered
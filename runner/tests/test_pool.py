@@ -0,0 +1,53 @@
+from unittest.mock import Mock
+
+import pytest
+
+from runner.pool import ContainerPool
+
+
+@pytest.fixture
+def pool(mocker) -> ContainerPool:
+    pool = ContainerPool(size=2, idle_timeout=300, max_invocations=2)
+
+    def start(image):
+        warm_container = Mock(image=image, invocations=0)
+        warm_container.invoke.side_effect = lambda *args: _invoke(warm_container)
+        return warm_container
+
+    def _invoke(warm_container):
+        warm_container.invocations += 1
+        return (0, "output", "null")
+
+    mocker.patch.object(pool, "_start", side_effect=start)
+    mocker.patch("runner.pool.collect_output_files", return_value=[])
+
+    return pool
+
+
+def _task(image: str) -> dict:
+    return {"package": image, "function": "hello", "function_parameters": {}}
+
+
+def test_container_is_reused(pool):
+    pool.run(_task("image1"))
+    pool.run(_task("image1"))
+
+    assert pool._start.call_count == 1
+
+
+def test_container_replaced_after_max_invocations(pool):
+    for _ in range(3):
+        pool.run(_task("image1"))
+
+    assert pool._start.call_count == 2
+
+
+def test_least_recently_used_is_evicted(pool):
+    pool.run(_task("image1"))
+    pool.run(_task("image2"))
+    first = next(iter(pool._idle.values()))
+
+    pool.run(_task("image3"))
+
+    first.remove.assert_called_once()
+    assert {c.image for c in pool._idle.values()} == {"image2", "image3"}
@@ -0,0 +1,41 @@
+from itertools import chain, repeat
+from unittest.mock import MagicMock, patch
+
+from runner.containers import RUNNER_NAME
+from runner.registration import RUNNER_STATUS_QUEUE, Heartbeat
+
+
+@patch("runner.registration.image_cache")
+@patch("runner.registration.send_message")
+def test_register_heartbeat_and_unregister(send_message: MagicMock, image_cache):
+    image_cache.images.return_value = ["registry/package:1"]
+    free_slots = chain([4], repeat(2))
+    heartbeat = Heartbeat(lambda: 4, lambda: next(free_slots), interval=0.01)
+
+    heartbeat.start()
+    while send_message.call_count < 2:
+        pass
+    heartbeat.stop()
+
+    calls = [call.args for call in send_message.call_args_list]
+    register, beat, unregister = calls[0], calls[1], calls[-1]
+
+    assert register == (
+        RUNNER_STATUS_QUEUE,
+        "RUNNER_REGISTER",
+        {
+            "name": RUNNER_NAME,
+            "concurrency": 4,
+            "free_slots": 4,
+            "images": ["registry/package:1"],
+            "labels": [],
+            "pools": ["public"],
+        },
+    )
+    assert beat[1] == "RUNNER_HEARTBEAT"
+    assert beat[2]["free_slots"] == 2
+    assert unregister == (
+        RUNNER_STATUS_QUEUE,
+        "RUNNER_UNREGISTER",
+        {"name": RUNNER_NAME},
+    )
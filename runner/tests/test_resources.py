@@ -0,0 +1,65 @@
+from unittest.mock import Mock
+
+from runner.resources import ResourceMonitor
+
+
+def _sample(cpu_ns: int, memory: int, rx: int, read: int) -> dict:
+    return {
+        "cpu_stats": {"cpu_usage": {"total_usage": cpu_ns}},
+        "memory_stats": {"usage": memory},
+        "networks": {"eth0": {"rx_bytes": rx, "tx_bytes": 10}},
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"op": "Read", "value": read},
+                {"op": "Write", "value": 5},
+            ]
+        },
+    }
+
+
+def _monitor(samples: list, relative: bool = False) -> ResourceMonitor:
+    container = Mock(id="container")
+    container.client.api.stats.return_value = iter(samples)
+
+    with ResourceMonitor(container, relative=relative) as monitor:
+        monitor._thread.join()
+
+    return monitor
+
+
+def test_resource_usage_is_sampled():
+    monitor = _monitor(
+        [
+            _sample(cpu_ns=1_000_000_000, memory=300, rx=100, read=50),
+            _sample(cpu_ns=3_000_000_000, memory=200, rx=400, read=90),
+            # Samples taken once the container has exited are empty
+            {"cpu_stats": {}, "memory_stats": {}},
+        ]
+    )
+
+    assert monitor.usage() == {
+        "cpu_seconds": 3.0,
+        "memory_peak_bytes": 300,
+        "network_rx_bytes": 400,
+        "network_tx_bytes": 10,
+        "block_read_bytes": 90,
+        "block_write_bytes": 5,
+    }
+
+
+def test_warm_container_usage_is_relative():
+    """Usage of an already running container is measured from the first sample"""
+    monitor = _monitor(
+        [
+            _sample(cpu_ns=5_000_000_000, memory=100, rx=1000, read=500),
+            _sample(cpu_ns=7_000_000_000, memory=150, rx=1200, read=500),
+        ],
+        relative=True,
+    )
+
+    usage = monitor.usage()
+
+    assert usage["cpu_seconds"] == 2.0
+    assert usage["memory_peak_bytes"] == 150
+    assert usage["network_rx_bytes"] == 200
+    assert usage["block_read_bytes"] == 0
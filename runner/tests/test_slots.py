@@ -0,0 +1,38 @@
+import pytest
+
+from runner.slots import SlotTracker
+
+
+@pytest.fixture
+def slots() -> SlotTracker:
+    return SlotTracker(concurrency=2)
+
+
+def test_acquire_occupies_slot(slots):
+    slots.acquire("task1", 1)
+
+    assert slots.free_slots == 1
+    assert slots.in_flight == 1
+
+
+def test_started_task_still_occupies_slot(slots):
+    slots.acquire("task1", 1)
+    slots.start("task1")
+
+    assert slots.free_slots == 1
+
+
+def test_release_returns_delivery_tag(slots):
+    slots.acquire("task1", 1)
+    slots.acquire("task2", 2)
+    slots.start("task2")
+
+    assert slots.free_slots == 0
+    assert slots.release("task1") == 1
+    assert slots.release("task2") == 2
+    assert slots.free_slots == 2
+
+
+def test_release_unknown_task(slots):
+    assert slots.release("unknown") is None
+    assert slots.free_slots == 2
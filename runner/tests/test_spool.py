@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pika.exceptions import AMQPConnectionError
+
+from runner.spool import ResultSpool, SpoolDrainer
+
+
+@pytest.fixture
+def spool(tmp_path) -> ResultSpool:
+    return ResultSpool(str(tmp_path / "spool" / "results.db"))
+
+
+def test_spooled_results_are_drained_in_batches(spool):
+    for task_id in range(5):
+        spool.put({"task_id": task_id})
+
+    drainer = SpoolDrainer(spool, batch_size=2)
+
+    with patch("runner.spool.send_messages") as send_messages:
+        assert drainer.drain() == 2
+        assert [message for _, _, message in send_messages.call_args.args[0]] == [
+            {"task_id": 0},
+            {"task_id": 1},
+        ]
+
+        while drainer.drain():
+            pass
+
+    assert send_messages.call_count == 3
+    assert len(spool) == 0
+
+
+@patch("runner.spool.send_messages")
+def test_results_kept_until_published(send_messages: MagicMock, spool):
+    """Results remain in the spool when the broker can not be reached"""
+    spool.put({"task_id": 1})
+    send_messages.side_effect = AMQPConnectionError("broker unavailable")
+
+    with pytest.raises(AMQPConnectionError):
+        SpoolDrainer(spool).drain()
+
+    assert spool.peek(10) == [(1, {"task_id": 1})]
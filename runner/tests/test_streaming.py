@@ -0,0 +1,59 @@
+from pika.exceptions import AMQPConnectionError
+
+from runner.streaming import LogStream, iter_lines, parse_function_output
+
+
+def test_output_streamed_in_chunks():
+    """Output is sent on line boundaries once the chunk size is reached, and the
+    remainder is returned along with the result"""
+    sent = []
+    log_stream = LogStream("task", publish=sent.append, chunk_size=10)
+    logs = iter(
+        [
+            b"first li",
+            b"ne\nsecond line\nla",
+            b"st\n",
+            b"==== Output From Command ====\n",
+        ]
+        + [b'{"a": ', b"1}\n"]
+    )
+
+    output, result = parse_function_output(logs, log_stream)
+
+    assert [message["output"] for message in sent] == ["first line\n", "second line\n"]
+    assert [message["sequence"] for message in sent] == [0, 1]
+    assert output == b"last"
+    assert result == b'{"a": 1}'
+
+
+def test_short_output_not_streamed():
+    sent = []
+    log_stream = LogStream("task", publish=sent.append, flush_interval=60)
+    logs = iter([b"hello\n", b"==== Output From Command ====\n", b"null\n"])
+
+    output, result = parse_function_output(logs, log_stream)
+
+    assert sent == []
+    assert output == b"hello"
+    assert result == b"null"
+
+
+def test_unsent_output_included_in_result():
+    """Output that could not be streamed is kept and returned with the result"""
+
+    def publish(message):
+        raise AMQPConnectionError("connection lost")
+
+    log_stream = LogStream("task", publish=publish, chunk_size=10)
+    logs = iter([b"first line\n", b"second line\n", b"==== Output From Command ====\n"])
+
+    output, _ = parse_function_output(logs, log_stream)
+
+    assert log_stream.sent == 0
+    assert output == b"first line\nsecond line"
+
+
+def test_long_lines_split():
+    lines = list(iter_lines([b"abcdefg", b"hij\nkl"], max_length=4))
+
+    assert lines == [b"abcd", b"efgh", b"ij\n", b"kl"]
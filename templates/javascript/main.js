@@ -1,20 +1,87 @@
 import * as functions from './functions.js'
+import * as fs from 'fs'
+import * as readline from 'readline'
+import { format } from 'util'
+
+const OUTPUT_SEPARATOR = "==== Output From Command ===="
+const RESPONSE_MARKER = "==== Function Response ===="
+const READY_MARKER = "==== Function Server Ready ===="
+
+// Files written to this directory are collected as task artifacts
+const OUTPUT_DIR = process.env.FUNCTIONARY_OUTPUT_DIR || "/tmp/functionary/output"
 
 const validParams = ["--function", "--parameters"]
 const args = process.argv.slice(2, )
 
-if (args.length != 4 || !validParams.includes(args[0]) || !validParams.includes(args[2])) {
-  console.log(
-    "Invalid commandline, --function <function_name> --parameters <parameters in JSON format>"
-  )
-  console.log(`Got: ${args}`)
-  process.exit(1)
+// Read function calls from stdin, one JSON request per line, and write a single
+// response line beginning with RESPONSE_MARKER once each call has completed
+function serve() {
+  const input = readline.createInterface({ input: process.stdin, terminal: false })
+  const consoleMethods = ["log", "info", "warn", "error", "debug"]
+  const originalConsole = Object.fromEntries(consoleMethods.map((m) => [m, console[m]]))
+  const originalEnv = { ...process.env }
+
+  input.on("line", (line) => {
+    if (!line.trim()) {
+      return
+    }
+
+    const request = JSON.parse(line)
+    const output = []
+    let status = 0
+    let result = "null"
+
+    Object.assign(process.env, request.variables || {})
+    fs.rmSync(OUTPUT_DIR, { recursive: true, force: true })
+    fs.mkdirSync(OUTPUT_DIR, { recursive: true })
+    consoleMethods.forEach((m) => {
+      console[m] = (...messages) => output.push(format(...messages))
+    })
+
+    try {
+      const retVal = functions[request.function].apply(null, [request.parameters])
+      result = JSON.stringify(retVal === undefined ? null : retVal)
+    } catch (err) {
+      status = 1
+      output.push(err.stack || String(err))
+    } finally {
+      consoleMethods.forEach((m) => {
+        console[m] = originalConsole[m]
+      })
+      Object.keys(process.env).forEach((key) => {
+        if (!(key in originalEnv)) {
+          delete process.env[key]
+        }
+      })
+      Object.assign(process.env, originalEnv)
+    }
+
+    const response = { status: status, output: output.join("\n"), result: result }
+    process.stdout.write(`${RESPONSE_MARKER}${JSON.stringify(response)}\n`)
+  })
+
+  process.stdout.write(`${READY_MARKER}\n`)
 }
 
-const toCall = args[0] === "--function" ? args[1] : args[3]
-const parameters = args[2] === "--parameters" ? args[3] : args[1]
+fs.mkdirSync(OUTPUT_DIR, { recursive: true })
+
+if (args.length == 1 && args[0] === "--server") {
+  serve()
+} else {
+  if (args.length != 4 || !validParams.includes(args[0]) || !validParams.includes(args[2])) {
+    console.log(
+      "Invalid commandline, --function <function_name> --parameters <parameters in JSON format>"
+    )
+    console.log("  or: --server")
+    console.log(`Got: ${args}`)
+    process.exit(1)
+  }
 
-const retVal = functions[toCall].apply(null, [JSON.parse(parameters)])
+  const toCall = args[0] === "--function" ? args[1] : args[3]
+  const parameters = args[2] === "--parameters" ? args[3] : args[1]
 
-console.log("==== Output From Command ====")
-console.log(JSON.stringify(retVal))
+  const retVal = functions[toCall].apply(null, [JSON.parse(parameters)])
+
+  console.log(OUTPUT_SEPARATOR)
+  console.log(JSON.stringify(retVal))
+}
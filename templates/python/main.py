@@ -1,12 +1,75 @@
 import argparse
+import io
 import json
 import logging
+import os
+import shutil
 import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
 
 import functions
 
+OUTPUT_SEPARATOR = "==== Output From Command ===="
+RESPONSE_MARKER = "==== Function Response ===="
+READY_MARKER = "==== Function Server Ready ===="
+
+# Files written to this directory are collected as task artifacts
+OUTPUT_DIR = os.environ.get("FUNCTIONARY_OUTPUT_DIR", "/tmp/functionary/output")
+
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
+
+def serve():
+    """Run functions on request until stdin is closed
+
+    Each request is a single line of JSON containing the function, parameters and
+    variables for the call. Once the call has completed, a single response line is
+    written to stdout. The response line begins with RESPONSE_MARKER and is followed
+    by JSON containing the exit status, the captured output and the result.
+    """
+    root_logger = logging.getLogger()
+
+    sys.__stdout__.write(f"{READY_MARKER}\n")
+    sys.__stdout__.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        request = json.loads(line)
+        original_environ = os.environ.copy()
+        output = io.StringIO()
+        status = 0
+        result = "null"
+
+        os.environ.update(request.get("variables") or {})
+        shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+        for handler in root_logger.handlers:
+            handler.setStream(output)
+
+        try:
+            with redirect_stdout(output), redirect_stderr(output):
+                function = getattr(functions, request["function"])
+                result = json.dumps(function(**request["parameters"]), default=str)
+        except Exception:
+            status = 1
+            output.write(traceback.format_exc())
+        finally:
+            for handler in root_logger.handlers:
+                handler.setStream(sys.__stdout__)
+
+            os.environ.clear()
+            os.environ.update(original_environ)
+
+        response = {"status": status, "output": output.getvalue(), "result": result}
+
+        sys.__stdout__.write(f"{RESPONSE_MARKER}{json.dumps(response)}\n")
+        sys.__stdout__.flush()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--function", help="the function to call")
@@ -15,10 +78,22 @@ if __name__ == "__main__":
         "--parameters",
         help="the parameters to pass to the function in JSON format",
     )
+    parser.add_argument(
+        "-s",
+        "--server",
+        action="store_true",
+        help="read function calls from stdin rather than the command line",
+    )
 
     args = parser.parse_args()
 
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    if args.server:
+        serve()
+        sys.exit(0)
+
     result = getattr(functions, args.function)(**json.loads(args.parameters))
     output = json.dumps(result, default=str)
 
-    print(f"==== Output From Command ====\n{output}")
+    print(f"{OUTPUT_SEPARATOR}\n{output}")